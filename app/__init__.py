@@ -8,6 +8,9 @@ from celery import Celery
 from flask_moment import Moment
 from flask_ckeditor import CKEditor
 from flask_babel import Babel
+from app.recent_posts import RecentPosts
+from app.search import Search
+from app import json_provider
 
 # Create instance of packages
 db = SQLAlchemy()
@@ -17,6 +20,8 @@ mail = Mail()
 moment = Moment()
 ckeditor = CKEditor()
 babel = Babel()
+recent_posts_index = RecentPosts()
+search_index = Search()
 
 
 # Initialize Celery
@@ -41,6 +46,9 @@ def create_app(config_name):
     moment.init_app(app)
     ckeditor.init_app(app)
     babel.init_app(app)
+    recent_posts_index.init_app(app)
+    search_index.init_app(app)
+    json_provider.init_app(app)
     celery.conf.update(app.config)
     
     from models import MyAdminIndexView
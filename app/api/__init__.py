@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api = Blueprint('api', __name__)
 
-from app.api import authentication, comments, posts, users, errors
\ No newline at end of file
+from app.api import authentication, caching, comments, export, posts, search, tags, users, errors
\ No newline at end of file
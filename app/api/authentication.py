@@ -1,8 +1,10 @@
-from flask import g, jsonify
+from flask import g, jsonify, request, current_app
 from flask_httpauth import HTTPBasicAuth
 from app.api import api
 from models import User
 from app.api.errors import unauthorized, forbidden
+from app import tokens
+from app.api.credentials import get_verifier
 
 auth = HTTPBasicAuth()
 
@@ -12,7 +14,9 @@ def verify_password(email_or_token, password):
     if email_or_token == '':
         return False
     if password == "":
-        g.current_user = User.verify_auth_token(email_or_token)
+        # Refresh tokens are only accepted to issue new access tokens
+        kind = 'refresh' if request.endpoint == 'api.refresh_token' else 'access'
+        g.current_user = User.verify_auth_token(email_or_token, kind=kind)
         g.token_used = True
         return g.current_user is not None
     user = User.query.filter_by(email=email_or_token).first()
@@ -20,7 +24,7 @@ def verify_password(email_or_token, password):
         return False
     g.current_user = user
     g.token_used = False
-    return user.verify_password(password)
+    return get_verifier().verify(user, email_or_token, password)
 
 # flask-httpauth error handler
 @auth.error_handler
@@ -39,7 +43,25 @@ def before_request():
 def get_token():
     if g.current_user.is_anonymous or g.token_used:
         return unauthorized('Invalid credentials')
-    return jsonify({'token': g.current_user.generate_auth_token(expiration=3600),
-                    'expiration':3600})
+    expiration = current_app.config['API_TOKEN_EXPIRATION']
+    refresh_expiration = current_app.config['API_REFRESH_TOKEN_EXPIRATION']
+    return jsonify({'token': g.current_user.generate_auth_token(expiration=expiration),
+                    'expiration': expiration,
+                    'refresh_token': g.current_user.generate_auth_token(expiration=refresh_expiration,
+                                                                        kind='refresh'),
+                    'refresh_expiration': refresh_expiration})
 
-    
\ No newline at end of file
+# exchange a refresh token for a new access token
+@api.route('/tokens/refresh', methods=['POST'])
+def refresh_token():
+    if g.current_user.is_anonymous or not g.token_used:
+        return unauthorized('Invalid credentials')
+    expiration = current_app.config['API_TOKEN_EXPIRATION']
+    return jsonify({'token': g.current_user.generate_auth_token(expiration=expiration),
+                    'expiration': expiration})
+
+# revoke every token of the current user
+@api.route('/tokens/', methods=['DELETE'])
+def revoke_tokens():
+    tokens.revoke(g.current_user.id)
+    return '', 204
@@ -0,0 +1,95 @@
+import hashlib
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, request, make_response
+from app import db
+from app.api import api
+from app.user_loader import user_loader
+from app.api.serializers import wants_author
+
+# Cache validators of a representation: ETag, whether it is weak and the
+# optional Last-Modified date
+Validator = namedtuple('Validator', ['etag', 'weak', 'last_modified'])
+
+
+# Tags cover the row versions a representation is built from, the fields
+# asked for and the JSON encoder, whose output for the same data may differ
+# byte for byte
+def make_etag(*parts):
+    parts = (type(current_app.json).__name__, request.args.get('fields'), request.args.get('expand')) + parts
+    return hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+# Answer GET requests whose validators still match with 304, without
+# running render; otherwise render and attach the validators
+def conditional_response(validator, render):
+    if validator is not None and request.method in ('GET', 'HEAD'):
+        probe = current_app.response_class()
+        set_validators(probe, validator)
+        probe.make_conditional(request)
+        if probe.status_code == 304:
+            return probe
+    response = make_response(render())
+    if validator is not None and response.status_code == 200:
+        set_validators(response, validator)
+    return response
+
+def set_validators(response, validator):
+    response.set_etag(validator.etag, weak=validator.weak)
+    if validator.last_modified is not None:
+        response.last_modified = validator.last_modified
+
+
+# Decorator form for single resources: validator takes the view arguments
+# and returns None when the resource does not exist, leaving the 404 to
+# the view
+def conditional(validator):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return conditional_response(validator(*args, **kwargs), lambda: f(*args, **kwargs))
+        return decorated_function
+    return decorator
+
+
+# Validators read from the version columns only
+def post_validator(id):
+    from models import User, Post
+    row = db.session.query(Post.version, Post.updated_at, User.version, User.updated_at).\
+            outerjoin(User, User.id == Post.author_id).filter(Post.id == id).first()
+    if row is None:
+        return None
+    post_version, post_updated, author_version, author_updated = row
+    dates = [date for date in (post_updated, author_updated) if date is not None]
+    return Validator(make_etag('post', id, post_version, author_version), False,
+                     max(dates) if dates else None)
+
+def user_validator(id):
+    from models import User
+    row = db.session.query(User.version, User.updated_at).filter(User.id == id).first()
+    if row is None:
+        return None
+    return Validator(make_etag('user', id, row[0]), False, row[1])
+
+
+# Weak validator of a page of posts, from the already loaded rows and
+# authors, so a 304 skips the serialization
+def posts_page_validator(posts, fieldset, prev, next, *extra):
+    if wants_author(fieldset):
+        authors = user_loader().load_many(post.author_id for post in posts)
+        parts = [(post.id, post.version, author.version if author is not None else None)
+                 for post, author in zip(posts, authors)]
+    else:
+        parts = [(post.id, post.version) for post in posts]
+    return Validator(make_etag('posts', parts, prev, next, *extra), True, None)
+
+
+# Cache-Control of GET responses, per endpoint
+@api.after_request
+def set_cache_control(response):
+    if request.method in ('GET', 'HEAD') and 'Cache-Control' not in response.headers:
+        policies = current_app.config['API_CACHE_CONTROL']
+        policy = policies.get(request.endpoint, current_app.config['API_CACHE_CONTROL_DEFAULT'])
+        if policy:
+            response.headers['Cache-Control'] = policy
+    return response
@@ -3,65 +3,114 @@ from app import db
 from models import Post, Permission, Comment
 from app.api import api
 from app.api.decorators import permission_required
+from app.api.errors import bad_request
+from app.api.serializers import comments_to_json, threads_to_json
+from app.comment_threads import MAX_DEPTH, thread_page, subtree, reply_parent
+from app.exceptions import ValidationError
+from app.pagination import paginate_keyset, page_urls
 
 
+def can_moderate():
+    return g.current_user.can(Permission.MODERATE)
+
+
+# Reply levels asked for with ?depth=, up to the deepest one stored
+def thread_depth():
+    depth = request.args.get('depth', current_app.config['COMMENT_THREAD_DEPTH'], type=int)
+    return max(0, min(depth, MAX_DEPTH))
+
+
+# Latest comments across all posts, newest first
 @api.route('/comments/')
 def get_comments():
-    page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
-    comments = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_comments', page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_comments', page=page+1)
+    pagination = paginate_keyset(Comment.query, (Comment.comment_date, Comment.id),
+                                 per_page=current_app.config['API_COMMENTS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'))
+    prev, next = page_urls(pagination, 'api.get_comments')
     return jsonify({
-        'comments': [comment.to_json() for comment in comments],
+        'comments': comments_to_json(pagination.items, can_moderate()),
         'prev': prev,
-        'next': next,
-        'count': pagination.total
+        'next': next
     })
 
 
 @api.route('/comments/<int:id>')
 def get_comment(id):
     comment = Comment.query.get_or_404(id)
-    return jsonify(comment.to_json())
+    return jsonify(comment.to_json(can_moderate()))
 
 
+# Comments of a post in the order they were written, seeking on the
+# (post_id, comment_date, id) index
 @api.route('/posts/<int:id>/comments/')
 def get_post_comments(id):
     post = Post.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = post.comments.order_by(Comment.timestamp.asc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
-    comments = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_post_comments', id=id, page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_post_comments', id=id, page=page+1)
+    pagination = paginate_keyset(Comment.query.filter(Comment.post_id == id), (Comment.comment_date, Comment.id),
+                                 per_page=current_app.config['API_COMMENTS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'),
+                                 descending=False)
+    prev, next = page_urls(pagination, 'api.get_post_comments', id=id)
     return jsonify({
-        'comments': [comment.to_json() for comment in comments],
+        'comments': comments_to_json(pagination.items, can_moderate()),
         'prev': prev,
         'next': next,
-        'count': pagination.total
+        'count': post.comment_count
     })
 
 
+# Newest threads of a post, each top-level comment with its replies nested
+# down to ?depth= levels
+@api.route('/posts/<int:id>/threads/')
+def get_post_threads(id):
+    post = Post.query.get_or_404(id)
+    depth = thread_depth()
+    pagination = thread_page(id, current_app.config['API_THREADS_PER_PAGE'], depth,
+                             after=request.args.get('after'), before=request.args.get('before'))
+    prev, next = page_urls(pagination, 'api.get_post_threads', id=id, depth=depth)
+    return jsonify({
+        'threads': threads_to_json(pagination.comments, can_moderate()),
+        'prev': prev,
+        'next': next,
+        'count': post.comment_count
+    })
+
+
+# A comment with its replies nested down to ?depth= levels below it
+@api.route('/comments/<int:id>/replies/')
+def get_comment_replies(id):
+    comment = Comment.query.get_or_404(id)
+    return jsonify(threads_to_json(subtree(comment, thread_depth()), can_moderate())[0])
+
+
 @api.route('/posts/<int:id>/comments/', methods=['POST'])
 @permission_required(Permission.COMMENT)
 def new_post_comment(id):
     post = Post.query.get_or_404(id)
     comment = Comment.from_json(request.json)
+    parent_id = request.json.get('parent_id')
+    if parent_id is not None:
+        if not isinstance(parent_id, int) or isinstance(parent_id, bool):
+            raise ValidationError('parent_id must be a comment id')
+        parent = Comment.query.filter_by(id=parent_id, post_id=post.id).first()
+        if parent is None:
+            raise ValidationError('parent_id is not a comment of this post')
+        comment.parent = reply_parent(parent)
     comment.author = g.current_user
     comment.post = post
     db.session.add(comment)
     db.session.commit()
-    return jsonify(comment.to_json()), 201, \
-        {'Location': url_for('api.get_comment', id=comment.id)}
\ No newline at end of file
+    return jsonify(comment.to_json(can_moderate())), 201, \
+        {'Location': url_for('api.get_comment', id=comment.id)}
+
+
+# Enable or disable a comment
+@api.route('/comments/<int:id>', methods=['PUT'])
+@permission_required(Permission.MODERATE)
+def moderate_comment(id):
+    comment = Comment.query.get_or_404(id)
+    disabled = (request.json or {}).get('disabled')
+    if not isinstance(disabled, bool):
+        return bad_request('disabled must be true or false')
+    comment.disabled = disabled
+    db.session.commit()
+    return jsonify(comment.to_json(True))
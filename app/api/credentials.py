@@ -0,0 +1,76 @@
+import contextvars
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app, request
+from app import db, passwords
+from app.exceptions import ServiceBusy
+from app.principals import LRUCache
+
+
+# Verification of HTTP Basic credentials for the API.
+# Successful checks are remembered for a short time under an HMAC of
+# (email, password, password hash): the plain password is never stored and
+# a password change alters the hash, so old entries can no longer match.
+# Misses go through the password service like web sign ins: they take a
+# login slot, are hashed on a bounded pool and upgrade outdated hashes. When
+# the pool is full the request is rejected instead of queueing more CPU work
+# behind the request threads.
+class CredentialVerifier:
+    def __init__(self, app):
+        self.secret = app.config['SECRET_KEY'].encode()
+        self.ttl = app.config['API_CREDENTIAL_CACHE_TIMEOUT']
+        self.timeout = app.config['API_PASSWORD_HASH_TIMEOUT']
+        self.cache = LRUCache(app.config['API_CREDENTIAL_CACHE_SIZE'])
+        workers = app.config['API_PASSWORD_HASH_WORKERS']
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + app.config['API_PASSWORD_HASH_QUEUE'])
+
+    def key(self, email, password, password_hash):
+        message = '\0'.join((email, password, password_hash)).encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, user, email, password):
+        if not user.password_hash:
+            return False
+        key = self.key(email, password, user.password_hash)
+        expires = self.cache.get(key)
+        if expires is not None and expires > time.time():
+            return True
+        with passwords.login_slot(request.remote_addr, email):
+            verified = self.check(user.password_hash, password)
+        if verified:
+            if user.rehash_password(password):
+                db.session.commit()
+                key = self.key(email, password, user.password_hash)
+            self.cache.set(key, time.time() + self.ttl)
+        return verified
+
+    def check(self, password_hash, password):
+        if not self.slots.acquire(blocking=False):
+            raise ServiceBusy('too many concurrent sign ins, try again later')
+        try:
+            # Run with the request's context variables, so the password
+            # service sees the application
+            future = self.executor.submit(contextvars.copy_context().run, passwords.check,
+                                          password_hash, password)
+        except RuntimeError:
+            self.slots.release()
+            raise
+        # The slot is held until the hash is done, even if we stop waiting
+        future.add_done_callback(lambda future: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise ServiceBusy('sign in timed out, try again later')
+
+
+# Get the verifier of the current application
+def get_verifier():
+    verifier = current_app.extensions.get('api_credentials')
+    if verifier is None:
+        verifier = current_app.extensions.setdefault('api_credentials',
+                                                     CredentialVerifier(current_app))
+    return verifier
@@ -1,6 +1,6 @@
 from flask import request, jsonify
 from app.api import api
-from app.exceptions import ValidationError
+from app.exceptions import ValidationError, ServiceBusy
 
 
 # Error handler for status code 403
@@ -21,7 +21,17 @@ def unauthorized(message):
     response.status_code = 401
     return response
 
+# Status code 503
+def service_unavailable(message, retry_after=1):
+    response = jsonify({'error': 'service unavailable', 'message': message})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @api.errorhandler(ValidationError)
 def validation_error(e):
     return bad_request(e.args[0])
 
+@api.errorhandler(ServiceBusy)
+def service_busy(e):
+    return service_unavailable(e.args[0])
@@ -0,0 +1,96 @@
+import zlib
+from datetime import datetime
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import select
+from app import db
+from app.api import api
+from app.api.decorators import permission_required
+from app.exceptions import ValidationError
+from models import User, Post, Comment, Follow, Permission
+
+
+# Lower bound of an incremental export, an ISO 8601 date
+def parse_since():
+    since = request.args.get('since')
+    if since is None:
+        return None
+    try:
+        return datetime.fromisoformat(since)
+    except ValueError:
+        raise ValidationError('since must be an ISO 8601 date')
+
+
+def row_to_json(row):
+    return current_app.json.dumps({key: value.isoformat() if isinstance(value, datetime) else value
+                                   for key, value in row._mapping.items()})
+
+
+# Stream the rows of a query as newline delimited JSON.
+# Rows come from a server-side cursor a batch at a time and are written out
+# as they arrive, so memory use does not grow with the size of the export.
+# With since= only rows whose window column falls in [since, until) are
+# sent; until is returned in X-Export-Until to be used as the next since.
+# Deleted rows leave nothing to window on, so incremental exports never
+# report deletions: consumers need a periodic full export to drop them.
+def export(query, window_column, *order_by):
+    since = parse_since()
+    until = datetime.utcnow()
+    if since is not None:
+        query = query.where(window_column >= since, window_column < until)
+    query = query.order_by(*order_by)
+    batch_size = current_app.config['API_EXPORT_BATCH_SIZE']
+    compress = request.accept_encodings['gzip'] > 0
+
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        result = db.session.execute(query, execution_options={'stream_results': True})
+        for rows in result.partitions(batch_size):
+            data = ''.join(row_to_json(row) + '\n' for row in rows).encode()
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        result.close()
+        if compressor is not None:
+            yield compressor.flush()
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Export-Until'] = until.isoformat()
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@api.route('/export/posts')
+@permission_required(Permission.ADMIN)
+def export_posts():
+    query = select(Post.id, Post.title, Post.slug, Post.body, Post.timestamp, Post.updated_at,
+                   Post.author_id, Post.comment_count)
+    return export(query, Post.updated_at, Post.id)
+
+
+@api.route('/export/users')
+@permission_required(Permission.ADMIN)
+def export_users():
+    query = select(User.id, User.username, User.first_name, User.last_name, User.bio, User.country,
+                   User.confirmed, User.role_id, User.post_count, User.follower_count,
+                   User.following_count, User.updated_at)
+    return export(query, User.updated_at, User.id)
+
+
+@api.route('/export/comments')
+@permission_required(Permission.ADMIN)
+def export_comments():
+    query = select(Comment.id, Comment.body, Comment.comment_date, Comment.updated_at, Comment.disabled,
+                   Comment.post_id, Comment.author_id, Comment.parent_id)
+    return export(query, Comment.updated_at, Comment.id)
+
+
+# Follows are only created or deleted: with since= this returns new follows,
+# unfollows only show up in a full export
+@api.route('/export/follows')
+@permission_required(Permission.ADMIN)
+def export_follows():
+    query = select(Follow.follower_id, Follow.followed_id, Follow.date_followed)
+    return export(query, Follow.date_followed, Follow.follower_id, Follow.followed_id)
@@ -1,37 +1,63 @@
-import json
+from datetime import datetime, timedelta
 from flask import jsonify, request, g, current_app, url_for
-from app import db
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app import db, sanitizer
 from app.api import api
 from app.api.decorators import permission_required
-from models import User, Post, Permission
-from app.api.errors import forbidden
+from models import User, Post, Permission, IdempotencyKey
+from app.api.errors import forbidden, bad_request
+from app.exceptions import ValidationError
+from app.pagination import paginate_keyset, page_urls
+from app.api.serializers import posts_to_json, post_fieldset, post_options, fieldset_args
+from app.api.caching import conditional, conditional_response, post_validator, posts_page_validator
+from app.timeline import fanout_post
 
-# Get all posts
+
+# Ids of a ?ids=1,2,3 batch read
+def parse_ids(value):
+    try:
+        ids = list(dict.fromkeys(int(id) for id in value.split(',') if id.strip()))
+    except ValueError:
+        raise ValidationError('ids must be a comma separated list of integers')
+    limit = current_app.config['API_BATCH_MAX_ITEMS']
+    if not ids or len(ids) > limit:
+        raise ValidationError(f'between 1 and {limit} ids are accepted')
+    return ids
+
+# Get all posts, or the posts listed in ?ids= with one query
 @api.route('/posts/')
 def get_posts():
-    page = request.args.get('page', 1, type=int)
-    pagination = Post.query.paginate(
-        page, per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_posts', page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_posts', page=page+1)
-    return jsonify({
-        'posts': [post.to_json() for post in posts],
+    if 'ids' in request.args:
+        return get_posts_by_id(parse_ids(request.args['ids']))
+    fieldset = post_fieldset()
+    pagination = paginate_keyset(Post.query.options(*post_options(fieldset)), (Post.timestamp, Post.id),
+                                 per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'))
+    prev, next = page_urls(pagination, 'api.get_posts', **fieldset_args())
+    return conditional_response(posts_page_validator(pagination.items, fieldset, prev, next), lambda: jsonify({
+        'posts': posts_to_json(pagination.items, fieldset),
         'prev': prev,
-        'next': next,
-        'count': pagination.total
-    })
+        'next': next
+    }))
+
+def get_posts_by_id(ids):
+    fieldset = post_fieldset()
+    found = {post.id: post for post in Post.query.options(*post_options(fieldset)).filter(Post.id.in_(ids))}
+    posts = [found[id] for id in ids if id in found]
+    missing = [id for id in ids if id not in found]
+    return conditional_response(posts_page_validator(posts, fieldset, None, None, missing), lambda: jsonify({
+        'posts': posts_to_json(posts, fieldset),
+        'missing': missing
+    }))
 
 # get individual post
 @api.route('/posts/<int:id>')
+@conditional(post_validator)
 def get_post(id):
-    post = Post.query.get_or_404(id)
-    return jsonify(post.to_json())
+    fieldset = post_fieldset()
+    post = Post.query.options(*post_options(fieldset)).get_or_404(id)
+    return jsonify(posts_to_json([post], fieldset)[0])
 
 # insert a post into the database
 @api.route('/posts/', methods=['POST'])
@@ -41,6 +67,8 @@ def new_post():
     post.author = g.current_user
     db.session.add(post)
     db.session.commit()
+    sanitizer.dispatch(post)
+    fanout_post.delay(post.id)
     return jsonify(post.to_json()), 201, {'Location': url_for('api.get_post', id=post.id)}
 
 
@@ -55,6 +83,79 @@ def edit_post(id):
     post.body_html = request.json.get('body', post.body_html)
     db.session.add(post)
     db.session.commit()
+    sanitizer.dispatch(post)
     return jsonify(post.to_json())
-    
-    
+
+
+# Create many posts in one transaction. Every item gets its own result;
+# invalid items are reported and skipped. Items carrying an idempotency_key
+# already used by the caller return the post created the first time.
+@api.route('/posts:batch', methods=['POST'])
+@permission_required(Permission.WRITE)
+def new_posts_batch():
+    payload = request.get_json(silent=True)
+    items = payload.get('posts') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return bad_request('posts must be a non-empty list')
+    if len(items) > current_app.config['API_BATCH_MAX_ITEMS']:
+        return bad_request('at most {} posts are accepted'.format(current_app.config['API_BATCH_MAX_ITEMS']))
+    try:
+        results, created = create_posts(items)
+    except IntegrityError:
+        # A concurrent retry claimed one of the keys first; it is found now
+        db.session.rollback()
+        results, created = create_posts(items)
+    sanitizer.dispatch(*created)
+    for post in created:
+        fanout_post.delay(post.id)
+    # Reload the committed posts with one query before serializing them
+    posts = [post for status, post in results if isinstance(post, Post)]
+    Post.query.options(*Post.api_list_options()).filter(Post.id.in_([post.id for post in posts])).all()
+    serialized = dict(zip((post.id for post in posts), posts_to_json(posts)))
+    return jsonify({'results': [
+        {'status': status, 'post': serialized[post.id]} if status != 400 else
+        {'status': status, 'error': 'bad request', 'message': post}
+        for status, post in results]})
+
+# (status, post) results, with the error message in place of the post for
+# rejected items
+def create_posts(items):
+    user = g.current_user
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['API_IDEMPOTENCY_KEY_TIMEOUT'])
+    keys = [item.get('idempotency_key') for item in items if isinstance(item, dict)]
+    keys = [key for key in keys if isinstance(key, str)]
+    known = {}
+    if keys:
+        for record in IdempotencyKey.query.options(joinedload(IdempotencyKey.post)).\
+                filter(IdempotencyKey.user_id == user.id, IdempotencyKey.key.in_(keys)):
+            if record.created_at < cutoff or record.post is None:
+                db.session.delete(record)
+            else:
+                known[record.key] = record.post
+        db.session.flush()
+    results = []
+    created = []
+    for item in items:
+        key = item.get('idempotency_key') if isinstance(item, dict) else None
+        if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 100):
+            results.append((400, 'idempotency_key must be a string of 1 to 100 characters'))
+            continue
+        if key in known:
+            results.append((200, known[key]))
+            continue
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError('post must be an object')
+            post = Post.from_json(item)
+        except ValidationError as e:
+            results.append((400, e.args[0]))
+            continue
+        post.author = user
+        db.session.add(post)
+        if key is not None:
+            db.session.add(IdempotencyKey(user_id=user.id, key=key, post=post))
+            known[key] = post
+        created.append(post)
+        results.append((201, post))
+    db.session.commit()
+    return results, created
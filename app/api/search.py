@@ -0,0 +1,24 @@
+from flask import jsonify, request, current_app, url_for
+from app import search_index
+from app.api import api
+from app.api.serializers import posts_to_json, post_fieldset, post_options, fieldset_args
+
+# Full-text search over posts
+@api.route('/search/')
+def search_posts():
+    query = request.args.get('q', '', type=str)
+    page = request.args.get('page', 1, type=int)
+    language = request.args.get('lang', current_app.config['LANGUAGES'][0], type=str)
+    fieldset = post_fieldset()
+    results = search_index.search(query, language, page=page, options=post_options(fieldset))
+    prev = None
+    if results.has_prev:
+        prev = url_for('api.search_posts', q=query, lang=language, page=page-1, **fieldset_args())
+    next = None
+    if results.has_next:
+        next = url_for('api.search_posts', q=query, lang=language, page=page+1, **fieldset_args())
+    return jsonify({
+        'posts': posts_to_json(results.items, fieldset),
+        'prev': prev,
+        'next': next
+    })
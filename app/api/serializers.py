@@ -0,0 +1,161 @@
+from collections import namedtuple
+from flask import url_for, request
+from sqlalchemy.orm import load_only
+from app.exceptions import ValidationError
+from app.tags import names_by_post
+from app.user_loader import user_loader
+
+# Stand-in id that cannot otherwise appear in a URL
+_MARKER = 9007199254740991
+
+
+# URL of an endpoint with the id left open, built once per collection and
+# filled in per item instead of running url_for for every row
+class UrlTemplate:
+    def __init__(self, endpoint, **values):
+        self.prefix, self.suffix = url_for(endpoint, id=_MARKER, **values).split(str(_MARKER), 1)
+
+    def __call__(self, id):
+        if id is None:
+            return None
+        return f'{self.prefix}{id}{self.suffix}'
+
+
+# Fields of a representation and the related resources to embed, picked
+# with ?fields=a,b and ?expand=c
+FieldSet = namedtuple('FieldSet', ['fields', 'expand'])
+
+# Fields of each resource, those sent by default and the embeddable ones
+POST_FIELDS = ('id', 'url', 'title', 'body', 'slug', 'timestamp', 'author', 'author_url',
+               'comments_url', 'comment_count', 'tags')
+POST_DEFAULT_FIELDS = ('url', 'body', 'slug', 'timestamp', 'author', 'author_url', 'comments_url',
+                       'comment_count')
+POST_EXPANSIONS = ('author',)
+USER_FIELDS = ('id', 'url', 'username', 'posts_url', 'followed_posts_url', 'post_count')
+USER_DEFAULT_FIELDS = ('url', 'username', 'posts_url', 'followed_posts_url', 'post_count')
+
+
+def parse_list(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return tuple(dict.fromkeys(item.strip() for item in value.split(',') if item.strip()))
+
+# The field set asked for by the current request
+def requested_fieldset(available, default, expansions=()):
+    fields = parse_list('fields')
+    if fields is not None:
+        unknown = [field for field in fields if field not in available]
+        if unknown or not fields:
+            raise ValidationError('unknown fields: {}'.format(', '.join(unknown) or '(none given)'))
+    expand = parse_list('expand') or ()
+    unknown = [name for name in expand if name not in expansions]
+    if unknown:
+        raise ValidationError('cannot expand: {}'.format(', '.join(unknown)))
+    return FieldSet(fields or default, frozenset(expand))
+
+def post_fieldset():
+    return requested_fieldset(POST_FIELDS, POST_DEFAULT_FIELDS, POST_EXPANSIONS)
+
+def user_fieldset():
+    return requested_fieldset(USER_FIELDS, USER_DEFAULT_FIELDS)
+
+DEFAULT_POST_FIELDSET = FieldSet(POST_DEFAULT_FIELDS, frozenset())
+
+
+# Query arguments carrying the field set over to page links
+def fieldset_args():
+    return {name: request.args[name] for name in ('fields', 'expand') if name in request.args}
+
+def wants_author(fieldset):
+    return 'author' in fieldset.fields
+
+
+# Loader options fetching only the post columns the fields are built from,
+# plus those used for paging and cache validation
+def post_options(fieldset):
+    from models import Post
+    columns = {
+        'title': Post.title, 'body': Post.body, 'slug': Post.slug, 'author': Post.author_id,
+        'author_url': Post.author_id, 'comment_count': Post.comment_count,
+    }
+    needed = {Post.id, Post.timestamp, Post.version}
+    needed.update(columns[field] for field in fieldset.fields if field in columns)
+    return (load_only(*needed),)
+
+
+# Collection counterparts of Post.to_json and User.to_json: authors are
+# loaded with one query and URLs are formatted from templates. With the
+# default field set the output is the same as calling to_json on every item.
+def posts_to_json(posts, fieldset=DEFAULT_POST_FIELDSET):
+    posts = list(posts)
+    getters = []
+    for field in fieldset.fields:
+        if field == 'url':
+            getters.append((field, lambda post, url=UrlTemplate('api.get_post'): url(post.id)))
+        elif field == 'author_url':
+            getters.append((field, lambda post, url=UrlTemplate('api.get_user'): url(post.author_id)))
+        elif field == 'comments_url':
+            getters.append((field, lambda post, url=UrlTemplate('api.get_post_comments'): url(post.id)))
+        elif field == 'author':
+            authors = {author.id: author for author in user_loader().load_many(post.author_id for post in posts)
+                       if author is not None}
+            if 'author' in fieldset.expand:
+                values = dict(zip(authors, users_to_json(authors.values())))
+            else:
+                values = {author_id: author.username for author_id, author in authors.items()}
+            getters.append((field, lambda post, values=values: values.get(post.author_id)))
+        elif field == 'tags':
+            names = names_by_post(post.id for post in posts)
+            getters.append((field, lambda post, names=names: names[post.id]))
+        else:
+            getters.append((field, lambda post, field=field: getattr(post, field)))
+    return [{field: get(post) for field, get in getters} for post in posts]
+
+
+def users_to_json(users, fields=USER_DEFAULT_FIELDS):
+    templates = {'url': UrlTemplate('api.get_user'), 'posts_url': UrlTemplate('api.get_posts'),
+                 'followed_posts_url': UrlTemplate('api.get_user_followed_posts')}
+    return [{field: templates[field](user.id) if field in templates else getattr(user, field)
+             for field in fields} for user in users]
+
+
+# Collection counterpart of Comment.to_json
+def comments_to_json(comments, can_moderate=False):
+    comments = list(comments)
+    authors = {author.id: author.username
+               for author in user_loader().load_many(comment.author_id for comment in comments)
+               if author is not None}
+    comment_url = UrlTemplate('api.get_comment')
+    post_url = UrlTemplate('api.get_post')
+    user_url = UrlTemplate('api.get_user')
+    return [{
+        'url': comment_url(comment.id),
+        'post_url': post_url(comment.post_id),
+        'body': comment.body if can_moderate or not comment.disabled else None,
+        'comment_date': comment.comment_date,
+        'disabled': bool(comment.disabled),
+        'author': authors.get(comment.author_id),
+        'author_url': user_url(comment.author_id),
+        'parent_url': comment_url(comment.parent_id),
+        'depth': comment.depth,
+        'reply_count': comment.reply_count
+    } for comment in comments]
+
+
+# Nest comments given in path order under their parents: each gets a
+# replies list and the top-level ones (those whose parent is not among
+# comments) are returned
+def threads_to_json(comments, can_moderate=False):
+    comments = list(comments)
+    threads = []
+    nodes = {}
+    for comment, node in zip(comments, comments_to_json(comments, can_moderate)):
+        node['replies'] = []
+        parent = nodes.get(comment.parent_id)
+        if parent is None:
+            threads.append(node)
+        else:
+            parent['replies'].append(node)
+        nodes[comment.id] = node
+    return threads
@@ -0,0 +1,41 @@
+from flask import jsonify, request, current_app, abort
+from app import tags
+from app.api import api
+from app.api.caching import conditional_response, posts_page_validator
+from app.api.serializers import posts_to_json, post_fieldset, post_options, fieldset_args
+from app.pagination import paginate_keyset, page_urls
+from models import Tag
+
+
+# All tags in name order
+@api.route('/tags/')
+def get_tags():
+    pagination = paginate_keyset(Tag.query, (Tag.name,), per_page=current_app.config['API_TAGS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'),
+                                 descending=False)
+    prev, next = page_urls(pagination, 'api.get_tags')
+    return jsonify({
+        'tags': [tag.to_json() for tag in pagination.items],
+        'prev': prev,
+        'next': next
+    })
+
+
+# Posts with a tag, newest first; python+flask lists the posts carrying both
+@api.route('/tags/<tag>/posts/')
+def get_tag_posts(tag):
+    fieldset = post_fieldset()
+    found = tags.lookup(tag)
+    if found is None:
+        abort(404)
+    pagination = tags.page(found, per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           options=post_options(fieldset))
+    prev, next = page_urls(pagination, 'api.get_tag_posts', tag=tag, **fieldset_args())
+    counts = [(t.id, t.post_count) for t in found]
+    return conditional_response(posts_page_validator(pagination.items, fieldset, prev, next, counts), lambda: jsonify({
+        'tags': [t.to_json() for t in found],
+        'posts': posts_to_json(pagination.items, fieldset),
+        'prev': prev,
+        'next': next
+    }))
@@ -1,53 +1,94 @@
-from flask import jsonify, request, current_app, url_for
+from flask import jsonify, request, current_app, url_for, g
+from sqlalchemy.orm import joinedload, lazyload
 from app.api import api
-from models import User, Post
+from models import User, Post, Follow
+from app.pagination import paginate_keyset, page_urls
+from app.api.serializers import posts_to_json, users_to_json, post_fieldset, user_fieldset, post_options, \
+    fieldset_args
+from app.api.caching import conditional, conditional_response, user_validator, posts_page_validator
+from app import timeline
 
 
 @api.route('/users/<int:id>')
+@conditional(user_validator)
 def get_user(id):
+    fields = user_fieldset().fields
     user = User.query.get_or_404(id)
-    return jsonify(user.to_json())
+    return jsonify(users_to_json([user], fields)[0])
 
 
 @api.route('/users/<int:id>/posts/')
 def get_user_posts(id):
     user = User.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = user.posts.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_user_posts', id=id, page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_user_posts', id=id, page=page+1)
-    return jsonify({
-        'posts': [post.to_json() for post in posts],
+    fieldset = post_fieldset()
+    pagination = paginate_keyset(user.posts.options(*post_options(fieldset)), (Post.timestamp, Post.id),
+                                 per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'))
+    prev, next = page_urls(pagination, 'api.get_user_posts', id=id, **fieldset_args())
+    validator = posts_page_validator(pagination.items, fieldset, prev, next, user.post_count)
+    return conditional_response(validator, lambda: jsonify({
+        'posts': posts_to_json(pagination.items, fieldset),
         'prev': prev,
         'next': next,
-        'count': pagination.total
-    })
+        'count': user.post_count
+    }))
 
 
 @api.route('/users/<int:id>/timeline/')
 def get_user_followed_posts(id):
     user = User.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = user.followed_posts.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    prev = None
-    if pagination.has_prev:
-        prev = url_for('api.get_user_followed_posts', id=id, page=page-1)
-    next = None
-    if pagination.has_next:
-        next = url_for('api.get_user_followed_posts', id=id, page=page+1)
+    fieldset = post_fieldset()
+    pagination = timeline.page(user, per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
+                               after=request.args.get('after'), before=request.args.get('before'),
+                               options=post_options(fieldset))
+    prev, next = page_urls(pagination, 'api.get_user_followed_posts', id=id, **fieldset_args())
+    validator = posts_page_validator(pagination.items, fieldset, prev, next)
+    return conditional_response(validator, lambda: jsonify({
+        'posts': posts_to_json(pagination.items, fieldset),
+        'prev': prev,
+        'next': next
+    }))
+
+
+# Serialize a page of follow edges, flagging the users the caller follows
+def follows_to_json(follows, listed):
+    fields = user_fieldset().fields
+    users = [getattr(follow, listed) for follow in follows]
+    followed_by_you = g.current_user.following_among([user.id for user in users])
+    return [{
+        'user': user_json,
+        'date_followed': follow.date_followed,
+        'followed_by_you': user.id in followed_by_you
+    } for follow, user, user_json in zip(follows, users, users_to_json(users, fields))]
+
+
+@api.route('/users/<int:id>/followers/')
+def get_user_followers(id):
+    user = User.query.get_or_404(id)
+    query = user.followers.options(joinedload(Follow.follower), lazyload(Follow.followed))
+    pagination = paginate_keyset(query, (Follow.date_followed, Follow.follower_id),
+                                 per_page=current_app.config['FOLLOWERS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'))
+    prev, next = page_urls(pagination, 'api.get_user_followers', id=id, **fieldset_args())
     return jsonify({
-        'posts': [post.to_json() for post in posts],
+        'followers': follows_to_json(pagination.items, 'follower'),
         'prev': prev,
         'next': next,
-        'count': pagination.total
-    })
\ No newline at end of file
+        'count': user.follower_count
+    })
+
+
+@api.route('/users/<int:id>/following/')
+def get_user_following(id):
+    user = User.query.get_or_404(id)
+    query = user.followed.options(joinedload(Follow.followed), lazyload(Follow.follower))
+    pagination = paginate_keyset(query, (Follow.date_followed, Follow.followed_id),
+                                 per_page=current_app.config['FOLLOWERS_PER_PAGE'],
+                                 after=request.args.get('after'), before=request.args.get('before'))
+    prev, next = page_urls(pagination, 'api.get_user_following', id=id, **fieldset_args())
+    return jsonify({
+        'following': follows_to_json(pagination.items, 'followed'),
+        'prev': prev,
+        'next': next,
+        'count': user.following_count
+    })
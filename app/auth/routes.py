@@ -1,11 +1,12 @@
 from flask import render_template, url_for, redirect, flash, request
 from flask_login import login_user, login_required, logout_user, current_user
-from app import db
+from app import db, passwords
 from app.auth import auth 
 from app.auth.forms import ChangeEmailForm, LoginForm, RecoverPasswordForm, RegisterForm, ResetPasswordForm, UpdatePasswordForm
 from models import User
 from app.auth.utils.emails import send_email 
 from flask_babel import _
+from app.exceptions import ServiceBusy
 
 # login route
 @auth.route('/login', methods=['GET', 'POST'])
@@ -15,9 +16,17 @@ def login():
     form = LoginForm()
     # Check for valid form submission
     if form.validate_on_submit():
-        # Query for user
-        user = User.query.filter_by(username=form.username.data).first()
-        if user is not None and user.verify_password(form.password.data):
+        # Query for user, with a bounded number of concurrent attempts
+        try:
+            with passwords.login_slot(request.remote_addr, form.username.data):
+                user = User.query.filter_by(username=form.username.data).first()
+                verified = user is not None and user.verify_password(form.password.data)
+        except ServiceBusy:
+            flash("Too many sign in attempts. Try again in a moment", "warning")
+            return redirect(url_for('auth.login'))
+        if verified:
+            # Save a rehashed password
+            db.session.commit()
             login_user(user, form.remember_me.data)
             # Get the next query parameter
             next = request.args.get('next')
@@ -89,10 +98,11 @@ def confirm_account(token):
 # Filter unconfirmed accounts
 @auth.before_app_request
 def before_request():
+    # Static files are served without resolving the user
+    if request.endpoint == 'static' or request.blueprint == 'auth':
+        return
     if current_user.is_authenticated \
-            and not current_user.confirmed \
-            and request.blueprint != 'auth' \
-            and request.endpoint != 'static':
+            and not current_user.confirmed:
         return redirect(url_for('auth.unconfirmed_account'))
     
 # Unconfirmed accounts
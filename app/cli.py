@@ -31,4 +31,153 @@ def register(app):
     def compile():
         """Compile all languages."""
         if os.system('pybabel compile -d app/translations'):
-            raise RuntimeError('compile command failed')
\ No newline at end of file
+            raise RuntimeError('compile command failed')
+
+    @app.cli.group()
+    def counters():
+        """Denormalized counter commands"""
+        pass
+
+    @counters.command()
+    @click.option('--chunk-size', default=1000, help='Rows updated per transaction.')
+    def reconcile(chunk_size):
+        """Recompute comment, post and follower counters."""
+        from app.counters import reconcile as reconcile_counters
+        reconcile_counters(chunk_size=chunk_size, echo=click.echo)
+
+    @app.cli.group()
+    def timeline():
+        """Home timeline commands"""
+        pass
+
+    @timeline.command()
+    @click.argument('username')
+    def rebuild(username):
+        """Rebuild the home timeline of a single user."""
+        from models import User
+        from app.timeline import rebuild as rebuild_timeline
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user named {username}')
+        click.echo(f'{rebuild_timeline(user.id)} post(s) in the timeline of {username}')
+
+    @app.cli.group()
+    def search():
+        """Full-text search commands"""
+        pass
+
+    @search.command()
+    def reindex():
+        """Rebuild the search index from the posts table."""
+        from app import search_index
+        click.echo(f'{search_index.reindex()} post(s) indexed')
+
+    @app.cli.group()
+    def users():
+        """User account commands"""
+        pass
+
+    @users.command('import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+                  help='File format, guessed from the extension by default.')
+    @click.option('--chunk-size', default=1000, help='Users inserted per transaction.')
+    @click.option('--processes', type=int, help='Password hashing processes (default: CPU count).')
+    @click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+                  help='Write rejected rows to this CSV file.')
+    def import_users(path, file_format, chunk_size, processes, errors_path):
+        """Bulk import users from a CSV or JSON lines file."""
+        import csv
+        from app.user_import import UserImporter, read_rows
+        file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        with open(path, newline='', encoding='utf-8') as stream:
+            importer = UserImporter(chunk_size=chunk_size, processes=processes)
+            result = importer.run(read_rows(stream, file_format), echo=click.echo)
+        if errors_path:
+            with open(errors_path, 'w', newline='', encoding='utf-8') as out:
+                writer = csv.writer(out)
+                writer.writerow(['line', 'error'])
+                writer.writerows(result.errors)
+        else:
+            for error in result.errors[:20]:
+                click.echo(f'line {error.line}: {error.message}', err=True)
+            if len(result.errors) > 20:
+                click.echo(f'... {len(result.errors) - 20} more, use --errors to save them all', err=True)
+        click.echo(f'Imported {result.imported} user(s), rejected {len(result.errors)} row(s)')
+
+    @app.cli.group()
+    def fake():
+        """Synthetic data for development and load testing"""
+        pass
+
+    def fake_options(f):
+        f = click.option('--seed', default=0, help='Seed; the same seed and database give the same data.')(f)
+        f = click.option('--processes', default=os.cpu_count() or 1, help='Generator processes.')(f)
+        return f
+
+    @fake.command('users')
+    @click.argument('count', type=int)
+    @fake_options
+    def fake_users(count, seed, processes):
+        """Generate users (password: 'password')."""
+        from app.main.utils import fake
+        fake.fake_users(count, seed=seed, processes=processes, echo=click.echo)
+        fake.finish(echo=click.echo)
+
+    @fake.command('follows')
+    @click.option('--per-user', default=20, help='Average number of users followed.')
+    @fake_options
+    def fake_follows(per_user, seed, processes):
+        """Generate a power-law follow graph for users without follows."""
+        from app.main.utils import fake
+        fake.fake_follows(per_user, seed=seed, processes=processes, echo=click.echo)
+        fake.finish(echo=click.echo)
+
+    @fake.command('posts')
+    @click.argument('count', type=int)
+    @click.option('--days', default=365, help='Period the posts are spread over.')
+    @fake_options
+    def fake_posts(count, days, seed, processes):
+        """Generate posts by existing users."""
+        from app.main.utils import fake
+        fake.fake_posts(count, seed=seed, days=days, processes=processes, echo=click.echo)
+        fake.finish(echo=click.echo)
+
+    @fake.command('comments')
+    @click.argument('count', type=int)
+    @click.option('--days', default=365, help='Period the comments are spread over.')
+    @fake_options
+    def fake_comments(count, days, seed, processes):
+        """Generate comments on existing posts."""
+        from app.main.utils import fake
+        fake.fake_comments(count, seed=seed, days=days, processes=processes, echo=click.echo)
+        fake.finish(echo=click.echo)
+
+    @fake.command('all')
+    @click.option('--users', 'user_count', default=10000)
+    @click.option('--per-user', default=20, help='Average number of users followed.')
+    @click.option('--posts', 'post_count', default=50000)
+    @click.option('--comments', 'comment_count', default=200000)
+    @fake_options
+    def fake_all(user_count, per_user, post_count, comment_count, seed, processes):
+        """Generate users, follows, posts and comments."""
+        from app.main.utils import fake
+        fake.fake_users(user_count, seed=seed, processes=processes, echo=click.echo)
+        fake.fake_follows(per_user, seed=seed, processes=processes, echo=click.echo)
+        fake.fake_posts(post_count, seed=seed, processes=processes, echo=click.echo)
+        fake.fake_comments(comment_count, seed=seed, processes=processes, echo=click.echo)
+        fake.finish(echo=click.echo)
+
+    @app.cli.group()
+    def posts():
+        """Blog post commands"""
+        pass
+
+    @posts.command()
+    @click.option('--chunk-size', default=500, help='Posts per worker task.')
+    @click.option('--processes', type=int, help='Sanitizer processes (default: CPU count).')
+    def resanitize(chunk_size, processes):
+        """Sanitize every post body again, e.g. after changing the allowlist."""
+        from app.sanitizer import resanitize as resanitize_posts
+        changed = resanitize_posts(chunk_size=chunk_size, processes=processes, echo=click.echo)
+        click.echo(f'{changed} post(s) changed')
@@ -0,0 +1,93 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from app import db
+from app.pagination import KeysetPagination, decode_cursor
+
+# Reply threads stored as materialized paths.
+# A comment's path is the dot separated, zero padded ids of its top-level
+# comment and every reply down to it, so the paths of a thread sort in
+# reading order and share the top-level comment's path as prefix. A page
+# of threads is then one range scan over the (post_id, path) index.
+
+SEGMENT_WIDTH = 10
+
+def segment(comment_id):
+    return str(comment_id).zfill(SEGMENT_WIDTH)
+
+# Deepest reply level the path column has room for
+MAX_DEPTH = 22
+
+# Upper bound of the paths below path: '/' sorts right after the '.' separator
+def subtree_end(path):
+    return path + '/'
+
+
+# A page of threads: items are the top-level comments, newest first, and
+# comments every comment shown in display order
+class ThreadPage(KeysetPagination):
+    def __init__(self, items, comments, has_prev, has_next):
+        from models import Comment
+        super().__init__(items, (Comment.path,), has_prev, has_next)
+        self.comments = comments
+
+
+# Newest threads of a post with their replies down to max_depth, in one
+# statement: the page's top-level paths are picked in a CTE and bound the
+# path range the comments are read from
+def thread_page(post_id, per_page, max_depth, after=None, before=None):
+    from models import Comment
+    backwards = before is not None and after is None
+    token = before if backwards else after
+    cursor = decode_cursor(token, (Comment.path,))[0] if token is not None else None
+    order = Comment.path.asc() if backwards else Comment.path.desc()
+    roots = select(Comment.path).where(Comment.post_id == post_id, Comment.depth == 0)
+    if cursor is not None:
+        roots = roots.where(Comment.path > cursor if backwards else Comment.path < cursor)
+    roots = roots.order_by(order).limit(per_page + 1).cte('roots')
+    page = select(roots.c.path).order_by(roots.c.path.asc() if backwards else roots.c.path.desc()).\
+            limit(per_page).subquery()
+    lower = select(func.min(page.c.path)).scalar_subquery()
+    upper = select(func.max(page.c.path)).scalar_subquery()
+    found = select(func.count()).select_from(roots).scalar_subquery()
+    rows = db.session.query(Comment, found).options(joinedload(Comment.author)).\
+            filter(Comment.post_id == post_id, Comment.depth <= max_depth,
+                   Comment.path >= lower, Comment.path < subtree_end(upper)).\
+            order_by(Comment.path).all()
+    more = bool(rows) and rows[0][1] > per_page
+    threads = []
+    for comment, _ in rows:
+        if comment.depth == 0:
+            threads.append([])
+        threads[-1].append(comment)
+    threads.reverse()
+    items = [thread[0] for thread in threads]
+    comments = [comment for thread in threads for comment in thread]
+    if backwards:
+        return ThreadPage(items, comments, has_prev=more, has_next=True)
+    return ThreadPage(items, comments, has_prev=cursor is not None, has_next=more)
+
+
+# A comment and its replies down to max_depth levels below it, in reading order
+def subtree(comment, max_depth):
+    from models import Comment
+    return Comment.query.options(joinedload(Comment.author)).\
+        filter(Comment.post_id == comment.post_id, Comment.path >= comment.path,
+               Comment.path < subtree_end(comment.path), Comment.depth <= comment.depth + max_depth).\
+        order_by(Comment.path).all()
+
+
+# One thread from the given comment down, as a single page
+def thread_of(post_id, comment_id, max_depth):
+    from models import Comment
+    comment = Comment.query.filter_by(id=comment_id, post_id=post_id).first()
+    if comment is None:
+        return None
+    return ThreadPage([comment], subtree(comment, max_depth), has_prev=False, has_next=False)
+
+
+# Comment a reply is attached to: replies below MAX_DEPTH go to the deepest
+# comment above that still has room
+def reply_parent(comment):
+    while comment is not None and comment.depth >= MAX_DEPTH:
+        comment = comment.parent
+    return comment
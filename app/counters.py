@@ -0,0 +1,83 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+
+
+# Atomically add delta to a counter column of the row with the given id.
+# Runs on the flush connection, so it commits or rolls back with the change
+# being counted. Instances already in the session are kept in step.
+def adjust_counter(connection, target, model, column, row_id, delta):
+    if row_id is None:
+        return
+    table = model.__table__
+    connection.execute(table.update().where(table.c.id == row_id).
+                       values({column: table.c[column] + delta, **version_values(table)}))
+    session = object_session(target)
+    if session is None:
+        return
+    instance = session.identity_map.get(db.inspect(model).identity_key_from_primary_key((row_id,)))
+    if instance is not None and column in instance.__dict__:
+        set_committed_value(instance, column, (instance.__dict__[column] or 0) + delta)
+
+
+# Version bump for tables whose rows carry a version (see models.bump_version)
+def version_values(table):
+    if 'version' not in table.c:
+        return {}
+    return {'version': table.c.version + 1, 'updated_at': datetime.utcnow()}
+
+
+# Apply counter changes for a foreign key that moved from one row to another
+def move_counter(connection, target, model, column, foreign_key):
+    history = db.inspect(target).attrs[foreign_key].history
+    if not history.has_changes():
+        return
+    for old_id in history.deleted:
+        adjust_counter(connection, target, model, column, old_id, -1)
+    for new_id in history.added:
+        adjust_counter(connection, target, model, column, new_id, 1)
+
+
+# Counter columns and the query that recomputes them:
+# (model, counter column, counted model, foreign key on the counted model)
+def counter_definitions():
+    from models import User, Post, Comment, Follow, Tag, PostTag
+    return [
+        (Post, 'comment_count', Comment, 'post_id'),
+        (Comment, 'reply_count', Comment, 'parent_id'),
+        (User, 'post_count', Post, 'author_id'),
+        (User, 'follower_count', Follow, 'followed_id'),
+        (User, 'following_count', Follow, 'follower_id'),
+        (Tag, 'post_count', PostTag, 'tag_id'),
+    ]
+
+
+# Recompute counters in id chunks, fixing only the rows that drifted.
+# Returns a dict of "table.column" -> number of repaired rows.
+def reconcile(chunk_size=1000, echo=None):
+    repaired = {}
+    for model, column, counted, foreign_key in counter_definitions():
+        table = model.__table__
+        # Aliased, as replies are counted on their own table
+        counted_table = counted.__table__.alias()
+        actual = select(func.count()).select_from(counted_table).\
+            where(counted_table.c[foreign_key] == table.c.id).scalar_subquery()
+        max_id = db.session.query(func.max(table.c.id)).scalar() or 0
+        fixed = 0
+        for start in range(1, max_id + 1, chunk_size):
+            end = start + chunk_size - 1
+            result = db.session.execute(
+                table.update().
+                where(table.c.id.between(start, end)).
+                where(table.c[column] != actual).
+                values({column: actual, **version_values(table)}).
+                execution_options(synchronize_session=False))
+            db.session.commit()
+            fixed += result.rowcount
+        name = f'{table.name}.{column}'
+        repaired[name] = fixed
+        if echo is not None:
+            echo(f'{name}: {fixed} row(s) repaired')
+    return repaired
@@ -1,7 +1,9 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, EmailField, TextAreaField
-from wtforms.validators import DataRequired
+from wtforms.validators import DataRequired, ValidationError
 from flask_ckeditor import CKEditorField
+from app import exceptions
+from app.tags import parse_tags
 
 class ProfileForm(FlaskForm):
     username = StringField('Username')
@@ -18,6 +20,13 @@ class ProfileForm(FlaskForm):
 class PostForm(FlaskForm):
     title = StringField('Title')
     body = CKEditorField('What\'s on your mind?', validators=[DataRequired()])
+    tags = StringField('Tags')
+    
+    def validate_tags(self, field):
+        try:
+            parse_tags(field.data or '')
+        except exceptions.ValidationError as e:
+            raise ValidationError(str(e))
     
 # Admin Blog Post Form   
 class AdminPostForm(FlaskForm):
@@ -1,11 +1,13 @@
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from app import db
+from app import db, sanitizer, tags
 from models import Post
 from app.dashboard import dashboard
 from app.auth.utils.decorators import admin_required
 from app.dashboard.forms import PostForm, ProfileForm, AdminPostForm
 from app.dashboard.utils import save_profile_image, save_header_image
+from app.timeline import fanout_post
+from app.user_loader import user_loader
 
 @dashboard.route('/')
 @login_required
@@ -81,8 +83,11 @@ def post_blog():
     if form.validate_on_submit():
         post = Post(title=form.title.data, body_html=form.body.data, 
                     author=current_user._get_current_object())
+        tags.set_tags(post, tags.parse_tags(form.tags.data or ''))
         db.session.add(post)
         db.session.commit()
+        sanitizer.dispatch(post)
+        fanout_post.delay(post.id)
         flash("New blog post has been added successfully", "success")
         return redirect(url_for('dashboard.post_blog'))
     
@@ -98,7 +103,7 @@ def post_blog():
 @login_required
 def view_posts():
     
-    posts = Post.query.filter_by(author=current_user._get_current_object()).all()
+    posts = Post.query.options(*Post.card_options()).filter_by(author=current_user._get_current_object()).all()
     
     context = {
         'title': 'View Posts',
@@ -119,12 +124,15 @@ def update_blog(blog_id):
     if form.validate_on_submit():
         post.title = form.title.data
         post.body_html = form.body.data
+        tags.set_tags(post, tags.parse_tags(form.tags.data or ''))
         db.session.commit()
+        sanitizer.dispatch(post)
         flash("Blog post has been updated", "success")
         return redirect(url_for('dashboard.view_posts'))
     
     form.title.data = post.title
     form.body.data = post.body_html
+    form.tags.data = ', '.join(tag.name for tag in post.tags)
     context = {
         'title': 'Update Blog',
         'form': form,
@@ -149,7 +157,8 @@ def delete_post(blog_id):
 @admin_required
 def admin_view_posts():
     
-    posts = Post.query.order_by(Post.timestamp.desc()).all()
+    posts = Post.query.options(*Post.card_options()).order_by(Post.timestamp.desc()).all()
+    user_loader().prime(post.author_id for post in posts)
     
     context = {
         'title': 'Admin View Posts',
@@ -173,6 +182,7 @@ def admin_update_blog(blog_id):
         post.author.username = form.author.data
         post.body_html = form.body.data
         db.session.commit()
+        sanitizer.dispatch(post)
         flash("Blog post has been updated", "success")
         return redirect(url_for('dashboard.admin_view_posts'))
     
@@ -1,2 +1,5 @@
 class ValidationError(ValueError):
-    pass
\ No newline at end of file
+    pass
+
+class ServiceBusy(RuntimeError):
+    pass
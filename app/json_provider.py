@@ -0,0 +1,49 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON provider backed by orjson, used when it is installed. Output matches
+# the default provider (sorted keys, HTTP dates, same fallbacks for other
+# types) except that non-ASCII text is written as UTF-8 instead of escaped.
+# Calls with json.dumps specific arguments and debug pretty printing are
+# left to the default provider.
+class OrjsonProvider(DefaultJSONProvider):
+    options = 0
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS |
+                        orjson.OPT_NON_STR_KEYS)
+        if self.sort_keys:
+            self.options |= orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def encode(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self.options)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    encoder = app.config['JSON_ENCODER']
+    if encoder == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_ENCODER is orjson but orjson is not installed')
+    if encoder == 'orjson' or (encoder == 'auto' and orjson is not None):
+        app.json = OrjsonProvider(app)
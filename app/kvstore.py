@@ -0,0 +1,169 @@
+import threading
+import time
+from flask import current_app
+import redis
+
+
+# In-process stand-in for the subset of the Redis API used by the app.
+# Used when no REDIS_URL is configured (tests, single process setups).
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    def _purge(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def get(self, key):
+        with self._lock:
+            self._purge(key)
+            return self._data.get(key)
+
+    def mget(self, keys, *args):
+        return [self.get(key) for key in list(keys) + list(args)]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            self._purge(key)
+            if nx and key in self._data:
+                return None
+            self._data[key] = value
+            if ex is not None:
+                self._expires[key] = time.time() + ex
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                self._purge(key)
+                if self._data.pop(key, None) is not None:
+                    removed += 1
+                self._expires.pop(key, None)
+            return removed
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._purge(key)
+            value = int(self._data.get(key) or 0) + amount
+            self._data[key] = value
+            return value
+
+    def decr(self, key, amount=1):
+        return self.incr(key, -amount)
+
+    def expire(self, key, time_seconds):
+        with self._lock:
+            self._purge(key)
+            if key not in self._data:
+                return False
+            self._expires[key] = time.time() + time_seconds
+            return True
+
+    def exists(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._purge(key)
+            return sum(1 for key in keys if key in self._data)
+
+    # Sorted sets are stored as dicts of member -> score
+    def zadd(self, key, mapping):
+        with self._lock:
+            self._purge(key)
+            zset = self._data.setdefault(key, {})
+            added = sum(1 for member in mapping if member not in zset)
+            zset.update((member, float(score)) for member, score in mapping.items())
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._data.get(key, {})
+            return sum(1 for member in members if zset.pop(member, None) is not None)
+
+    def zcard(self, key):
+        with self._lock:
+            self._purge(key)
+            return len(self._data.get(key, {}))
+
+    def _zsorted(self, key):
+        zset = self._data.get(key, {})
+        return sorted(zset.items(), key=lambda item: (item[1], item[0]))
+
+    def zremrangebyrank(self, key, start, stop):
+        with self._lock:
+            items = self._zsorted(key)
+            stop = len(items) + stop if stop < 0 else stop
+            start = max(len(items) + start if start < 0 else start, 0)
+            # Like Redis, a range ending before the first rank is empty
+            removed = items[start:stop + 1] if stop >= 0 else []
+            for member, _ in removed:
+                del self._data[key][member]
+            return len(removed)
+
+    def zrangebyscore(self, key, min, max, start=None, num=None, withscores=False):
+        with self._lock:
+            self._purge(key)
+            items = [item for item in self._zsorted(key)
+                     if float(min) <= item[1] <= float(max)]
+            return self._zslice(items, start, num, withscores)
+
+    def zrevrangebyscore(self, key, max, min, start=None, num=None, withscores=False):
+        with self._lock:
+            self._purge(key)
+            items = [item for item in reversed(self._zsorted(key))
+                     if float(min) <= item[1] <= float(max)]
+            return self._zslice(items, start, num, withscores)
+
+    @staticmethod
+    def _zslice(items, start, num, withscores):
+        if start is not None:
+            items = items[start:start + num]
+        return items if withscores else [member for member, _ in items]
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    def publish(self, channel, message):
+        # A single process has no other subscribers to notify
+        return 0
+
+
+# Queues commands like a Redis pipeline and runs them on execute()
+class MemoryPipeline:
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+
+# Get the key/value store of the current application
+def get_store(app=None):
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('kvstore')
+    if store is None:
+        url = app.config.get('REDIS_URL')
+        store = redis.Redis.from_url(url) if url else MemoryStore()
+        app.extensions['kvstore'] = store
+    return store
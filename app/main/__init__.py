@@ -1,5 +1,6 @@
 from flask import Blueprint, session
 from models import Permission
+from app.user_loader import get_user
 
 main = Blueprint("main", __name__)
 
@@ -13,6 +14,6 @@ def pull_lang_code(endpoint, values):
 
 @main.app_context_processor
 def inject_permissions():
-    return dict(Permission=Permission)
+    return dict(Permission=Permission, get_user=get_user)
 
 from app.main import routes
\ No newline at end of file
@@ -1,11 +1,13 @@
 from ast import Sub
 from flask_wtf import FlaskForm
-from wtforms import TextAreaField, SubmitField
-from wtforms.validators import DataRequired, ValidationError
+from wtforms import TextAreaField, SubmitField, HiddenField
+from wtforms.validators import DataRequired, ValidationError, Optional, Regexp
 from flask_login import current_user
 
 class CommentForm(FlaskForm):
     body = TextAreaField('', validators=[DataRequired()])
+    # Comment being replied to, empty for a new thread
+    parent_id = HiddenField(validators=[Optional(), Regexp(r"^\d+$")])
     submit = SubmitField('Submit Comment')
     
     
@@ -1,12 +1,19 @@
 from flask import (redirect, url_for, render_template, request, current_app, 
                    flash, make_response, g, session, abort)
-from app import db
+from app import db, recent_posts_index, search_index
 from app.main import main
 from flask_login import current_user, login_required
 from app.auth.utils.decorators import permission_required
 from app.main.forms import CommentForm
-from models import Post, User, Permission, Comment
+from models import Post, User, Permission, Comment, Follow
 from flask_babel import get_locale, refresh
+from sqlalchemy.orm import joinedload, lazyload
+from app.exceptions import ValidationError
+from app.pagination import paginate_keyset
+from app import timeline, comment_threads, tags
+from app.page_cache import cached_page
+from app.main.utils.loaders import load_post_details
+from app.user_loader import user_loader
 
 @main.before_request
 def before_request():
@@ -21,6 +28,22 @@ def before_request():
         abort(404)
     g.locale = str(get_locale())
 
+# Keyset paginate a query from the ?after= / ?before= cursors of the request
+def keyset_page(query, columns, per_page):
+    try:
+        return paginate_keyset(query, columns, per_page=per_page,
+                               after=request.args.get('after'), before=request.args.get('before'))
+    except ValidationError:
+        abort(400)
+
+# Page of a user's materialized home timeline
+def timeline_page(user, per_page):
+    try:
+        return timeline.page(user, per_page=per_page, options=Post.card_options(),
+                             after=request.args.get('after'), before=request.args.get('before'))
+    except ValidationError:
+        abort(400)
+
 # Homepage route
 @main.route('/')
 def home():
@@ -33,31 +56,75 @@ def home():
 
 # Blog page
 @main.route('/blog')
+@cached_page
 def blog():
     
-    page = request.args.get('page', 1, type=int)
     show_followed = False
     
     if current_user.is_authenticated:
         show_followed = bool(request.cookies.get('show_followed', ''))
     if show_followed:
-        query = current_user.followed_posts
+        pagination = timeline_page(current_user, per_page=current_app.config['BLOG_POSTS_PER_PAGE'])
     else:
-        query = Post.query
-    pagination = query.order_by(Post.timestamp.desc()).\
-                paginate(page=page, per_page=current_app.config['BLOG_POSTS_PER_PAGE'])
+        pagination = keyset_page(Post.query.options(*Post.card_options()), (Post.timestamp, Post.id), 
+                                 per_page=current_app.config['BLOG_POSTS_PER_PAGE'])
     posts = pagination.items
-    recent_posts = Post.query.order_by(Post.timestamp.desc()).all()
+    user_loader().prime(post.author_id for post in posts)
+    recent_posts = recent_posts_index.get()
     
     context = {
         'title': 'Blog Page',
         'posts': posts,
         'pagination': pagination,
         'recent_posts': recent_posts,
+        'popular_tags': tags.popular(current_app.config['POPULAR_TAGS_COUNT']),
         'show_followed':show_followed
     }
     return render_template('main/blog.html', **context)
 
+# Posts with a tag, or with all tags of a '+' joined list such as python+flask
+@main.route('/tags/<tag>')
+@cached_page
+def tag_posts(tag):
+    try:
+        found = tags.lookup(tag)
+        if found is None:
+            abort(404)
+        pagination = tags.page(found, per_page=current_app.config['BLOG_POSTS_PER_PAGE'],
+                               after=request.args.get('after'), before=request.args.get('before'),
+                               options=Post.card_options())
+    except ValidationError:
+        abort(400)
+    posts = pagination.items
+    user_loader().prime(post.author_id for post in posts)
+    
+    context = {
+        'title': 'Posts tagged ' + ', '.join(t.name for t in found),
+        'posts': posts,
+        'pagination': pagination,
+        'recent_posts': recent_posts_index.get(),
+        'popular_tags': tags.popular(current_app.config['POPULAR_TAGS_COUNT']),
+        'tag': tag,
+        'tag_names': [t.name for t in found]
+    }
+    return render_template('main/blog.html', **context)
+
+# Full-text search over posts
+@main.route('/search')
+def search():
+    query = request.args.get('q', '', type=str)
+    page = request.args.get('page', 1, type=int)
+    results = search_index.search(query, session['lang_code'], page=page, options=Post.card_options())
+    user_loader().prime(post.author_id for post in results.items)
+    
+    context = {
+        'title': 'Search',
+        'results': results,
+        'posts': results.items,
+        'recent_posts': recent_posts_index.get()
+    }
+    return render_template('main/search.html', **context)
+
 # Selection of all posts
 @main.route('/all')
 @login_required
@@ -77,15 +144,15 @@ def show_followed():
 
 # Get user posts
 @main.route('/user_posts/<username>')
+@cached_page
 def user_posts(username):
     
     user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    pagination = Post.query.filter_by(author=user).\
-                order_by(Post.timestamp.desc()).\
-                paginate(page=page, per_page=current_app.config['BLOG_POSTS_PER_PAGE'])
+    pagination = keyset_page(Post.query.options(*Post.card_options()).filter_by(author=user), (Post.timestamp, Post.id), 
+                             per_page=current_app.config['BLOG_POSTS_PER_PAGE'])
     posts = pagination.items
-    recent_posts = Post.query.order_by(Post.timestamp.desc()).all()
+    user_loader().prime(post.author_id for post in posts)
+    recent_posts = recent_posts_index.get()
     
     context = {
         'title': f'{user.username}\'s Posts',
@@ -98,6 +165,7 @@ def user_posts(username):
 
 # User Profile page
 @main.route('/user_profile/<username>')
+@cached_page
 def user_profile(username):
     user = User.query.filter_by(username=username).first_or_404()
     
@@ -124,6 +192,7 @@ def follow(username):
         return redirect(url_for('main.user_profile', username=username))
     current_user.follow(user)
     db.session.commit()
+    timeline.invalidate(current_user.id)
     flash(f'You are now following {username}', 'success')
     return redirect(url_for('main.user_profile', username=username))
 
@@ -141,9 +210,16 @@ def unfollow(username):
         return redirect(url_for('main.user_profile', username=username))
     current_user.unfollow(user)
     db.session.commit()
+    timeline.invalidate(current_user.id)
     flash(f'You have unfollowed {username}', 'info')
     return redirect(url_for('main.user_profile', username=username))
 
+# Ids of the listed users that the current user follows, in one query
+def viewer_follows(follows):
+    if not current_user.is_authenticated:
+        return set()
+    return current_user.following_among([follow['user'].id for follow in follows])
+
 # Get Followers of a particular user
 @main.route('/followers/<username>')
 def followers(username):
@@ -152,14 +228,18 @@ def followers(username):
     if user is None:
         flash('Invalid user', 'warning')
         return redirect(url_for('main.user_profile', username=username))
-    followers = user.followers.all()
-    follows = [{'user':item.follower, 'date_followed':item.date_followed} for item in followers]
+    pagination = keyset_page(user.followers.options(joinedload(Follow.follower), lazyload(Follow.followed)),
+                             (Follow.date_followed, Follow.follower_id),
+                             per_page=current_app.config['FOLLOWERS_PER_PAGE'])
+    follows = [{'user':item.follower, 'date_followed':item.date_followed} for item in pagination.items]
     
     context = {
         'title': f'Followers of {username}',
         'follows':follows,
         'user':user,
-        'followers':'followers'
+        'followers':'followers',
+        'pagination': pagination,
+        'viewer_follows': viewer_follows(follows)
     }
     return render_template('main/followers.html', **context)
 
@@ -172,38 +252,57 @@ def following(username):
     if user is None:
         flash('Invalid user', 'warning')
         return redirect(url_for('main.user_profile', username=username))
-    followed = user.followed.all()
-    follows = [{'user':item.followed, 'date_followed':item.date_followed} for item in followed]
+    pagination = keyset_page(user.followed.options(joinedload(Follow.followed), lazyload(Follow.follower)),
+                             (Follow.date_followed, Follow.followed_id),
+                             per_page=current_app.config['FOLLOWERS_PER_PAGE'])
+    follows = [{'user':item.followed, 'date_followed':item.date_followed} for item in pagination.items]
     
     context = {
         'title': f'Users Followed by {username}',
         'follows':follows,
         'user':user,
-        'following':'following'
+        'following':'following',
+        'pagination': pagination,
+        'viewer_follows': viewer_follows(follows)
     }
     return render_template('main/followers.html', **context)
 
-# View Blog Details
+# View Blog Details.
+# Not page cached: the comment form carries the visitor's CSRF token
 @main.route('/blog/<int:blog_id>/<slug>', methods=['GET', 'POST'])
 def blog_details(blog_id, slug):
     
     form = CommentForm()
-    post = Post.query.get_or_404(blog_id)
-    page = request.args.get('page', default=1, type=int)
     
     if form.validate_on_submit():
-        comment = Comment(body=form.body.data, author=current_user._get_current_object(), post=post)
+        post = Post.query.get_or_404(blog_id)
+        parent = None
+        if form.parent_id.data:
+            parent = Comment.query.filter_by(id=form.parent_id.data, post_id=post.id).first_or_404()
+        comment = Comment(body=form.body.data, author=current_user._get_current_object(), post=post,
+                          parent=comment_threads.reply_parent(parent))
         db.session.add(comment)
         db.session.commit()
         flash("Your comment has been added", "success")
         return redirect(url_for('main.blog_details', blog_id=post.id, slug=post.slug, _anchor='comments'))
 
-    next_post = Post.query.order_by(Post.id.asc()).filter(Post.id > blog_id).first()
-    prev_post = Post.query.order_by(Post.id.desc()).filter(Post.id < blog_id).first()
-    recent_posts = Post.query.order_by(Post.timestamp.desc()).all()
-    pagination = post.comments.order_by(Comment.comment_date.desc()).\
-                paginate(page=page, per_page=current_app.config['COMMENTS_PER_PAGE'])
-    comments = pagination.items
+    if request.method == 'GET' and request.args.get('reply_to', type=int):
+        form.parent_id.data = request.args.get('reply_to', type=int)
+    try:
+        details = load_post_details(blog_id, per_page=current_app.config['COMMENTS_PER_PAGE'],
+                                    max_depth=current_app.config['COMMENT_THREAD_DEPTH'],
+                                    after=request.args.get('after'), before=request.args.get('before'),
+                                    thread=request.args.get('thread', type=int))
+    except ValidationError:
+        abort(400)
+    if details is None:
+        abort(404)
+    post = details.post
+    next_post = details.next_post
+    prev_post = details.prev_post
+    recent_posts = recent_posts_index.get()
+    pagination = details.pagination
+    comments = pagination.comments
     
     
     context = {
@@ -1,31 +1,280 @@
-from random import randint
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from faker import Faker
-from models import User, Post
-from app import db
+from flask import current_app
+from slugify import slugify
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+from app import db, page_cache, recent_posts_index, search_index, timeline
+from app.comment_threads import segment
+from app.counters import reconcile
+from app.sanitizer import make_excerpt
+from app.user_import import copy_rows
+from models import User, Post, Comment, Follow, Role
+
+# Password of every generated account
+FAKE_PASSWORD = 'password'
+
+# Ids that generated rows may reference, set in each worker process
+_id_spaces = {}
+
+
+# Ids of the existing rows of a table. Dense ranges are picked arithmetically,
+# sparse ones through the array of actual ids.
+class IdSpace:
+    def __init__(self, low, high, ids=None):
+        self.low = low
+        self.high = high
+        self.ids = ids
+
+    @staticmethod
+    def load(model):
+        low, high, count = db.session.query(func.min(model.id), func.max(model.id), func.count(model.id)).one()
+        if not count:
+            return None
+        if high - low + 1 == count:
+            return IdSpace(low, high)
+        return IdSpace.from_query(select(model.id).order_by(model.id))
+
+    @staticmethod
+    def from_query(query):
+        ids = array('q', db.session.execute(query).scalars())
+        return IdSpace(ids[0], ids[-1], ids) if ids else None
+
+    def __len__(self):
+        return len(self.ids) if self.ids is not None else self.high - self.low + 1
+
+    def at(self, index):
+        return self.ids[index] if self.ids is not None else self.low + index
+
+    # Power-law pick: alpha > 1 favours the oldest rows, 1 is uniform
+    def pick(self, rng, alpha=1.0):
+        return self.at(int(len(self) * rng.random() ** alpha))
+
+    # Power-law pick favouring the newest rows
+    def pick_recent(self, rng, alpha=1.0):
+        return self.at(len(self) - 1 - int(len(self) * rng.random() ** alpha))
+
+
+def init_worker(id_spaces):
+    _id_spaces.update(id_spaces)
+
+
+# Chunk generators: run in worker processes, seeded from (seed, first id) so
+# the same arguments always produce the same rows.
+def chunk_rng(seed, kind, first_id):
+    return random.Random(f'{seed}:{kind}:{first_id}')
+
+def chunk_faker(rng):
+    fake = Faker()
+    fake.seed_instance(rng.getrandbits(32))
+    return fake
+
+def generate_users(seed, first_id, count, password_hash, role_id, now):
+    rng = chunk_rng(seed, 'users', first_id)
+    fake = chunk_faker(rng)
+    users = []
+    for user_id in range(first_id, first_id + count):
+        users.append({
+            'id': user_id, 'username': f'{fake.user_name()}{user_id}', 'email': f'user{user_id}@example.com',
+            'password_hash': password_hash, 'confirmed': True, 'user_terms': True,
+            'first_name': fake.first_name(), 'last_name': fake.last_name(), 'address': fake.city(),
+            'bio': fake.sentence(), 'image': 'default.jpg', 'header': 'header.jpg', 'role_id': role_id,
+            'post_count': 0, 'follower_count': 0, 'following_count': 0, 'updated_at': now,
+        })
+    follows = [{'follower_id': user_id, 'followed_id': user_id, 'date_followed': now}
+               for user_id in range(first_id, first_id + count)]
+    return {'users': users, 'follows': follows}
+
+def generate_follows(seed, first_index, count, per_user, now):
+    rng = chunk_rng(seed, 'follows', first_index)
+    users = _id_spaces['users']
+    followers = _id_spaces['followers']
+    follows = []
+    for index in range(first_index, min(first_index + count, len(followers))):
+        follower_id = followers.at(index)
+        # Pareto distributed out-degree with the requested mean
+        degree = min(int(rng.paretovariate(1.5) * per_user / 3), len(users) - 1)
+        followed = set()
+        for _ in range(degree * 2):
+            if len(followed) >= degree:
+                break
+            followed_id = users.pick(rng, alpha=3.0)
+            if followed_id != follower_id:
+                followed.add(followed_id)
+        follows.extend({'follower_id': follower_id, 'followed_id': followed_id,
+                        'date_followed': now - timedelta(seconds=rng.randrange(365 * 86400))}
+                       for followed_id in sorted(followed))
+    return {'follows': follows}
+
+def generate_posts(seed, first_id, count, total, start, span, excerpt_length):
+    rng = chunk_rng(seed, 'posts', first_id)
+    fake = chunk_faker(rng)
+    users = _id_spaces['users']
+    posts = []
+    for offset, post_id in enumerate(range(first_id, first_id + count)):
+        title = fake.sentence(nb_words=6).rstrip('.')
+        body = ''.join(f'<p>{paragraph}</p>' for paragraph in fake.paragraphs(nb=rng.randint(1, 5)))
+        # Ids follow time, like real posts
+        position = (first_id - _id_spaces['first_post_id'] + offset + rng.random()) / total
+        timestamp = start + span * position
+        posts.append({
+            'id': post_id, 'title': title, 'slug': slugify(title), 'body': body, 'body_html': body,
+            'excerpt': make_excerpt(body, excerpt_length),
+            'timestamp': timestamp, 'updated_at': timestamp,
+            'author_id': users.pick(rng, alpha=2.0), 'comment_count': 0,
+        })
+    return {'posts': posts}
+
+def generate_comments(seed, first_id, count, start, span):
+    rng = chunk_rng(seed, 'comments', first_id)
+    fake = chunk_faker(rng)
+    users = _id_spaces['users']
+    posts = _id_spaces['posts']
+    comments = []
+    for comment_id in range(first_id, first_id + count):
+        comment_date = start + span * rng.random()
+        comments.append({
+            'id': comment_id, 'body': fake.sentence(nb_words=rng.randint(4, 30)), 'disabled': False,
+            'comment_date': comment_date, 'updated_at': comment_date,
+            # Recent posts get most of the comments
+            'post_id': posts.pick_recent(rng, alpha=2.0),
+            'author_id': users.pick(rng),
+            'path': segment(comment_id), 'depth': 0, 'reply_count': 0,
+        })
+    return {'comments': comments}
+
+
+# Run chunk generators in a process pool, yielding results in order while
+# keeping only a few chunks in flight
+def generate_parallel(function, tasks, processes, id_spaces):
+    if processes <= 1:
+        init_worker(id_spaces)
+        for args in tasks:
+            yield function(*args)
+        return
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                             initargs=(id_spaces,)) as pool:
+        pending = deque()
+        for args in tasks:
+            pending.append(pool.submit(function, *args))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+# Keep Postgres sequences ahead of the explicitly numbered rows
+def reset_sequence(model):
+    if db.session.connection().dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                   f"(SELECT max(id) FROM {table}))"))
+        db.session.commit()
+
+
+# Insert generated chunks, reporting progress
+def insert_chunks(name, total, chunks, echo=None):
+    tables = {'users': User.__table__, 'follows': Follow.__table__, 'posts': Post.__table__,
+              'comments': Comment.__table__}
+    started = time.time()
+    inserted = 0
+    for chunk in chunks:
+        connection = db.session.connection()
+        for table, rows in chunk.items():
+            if rows:
+                copy_rows(connection, tables[table], rows)
+        if 'posts' in chunk:
+            search_index.backend.stage(connection, {post['id']: (post['title'], post['body'])
+                                                    for post in chunk['posts']})
+        db.session.commit()
+        inserted += len(chunk[name])
+        if echo is not None:
+            rate = inserted / max(time.time() - started, 1e-6)
+            echo(f'{name}: {inserted}/{total or inserted} ({rate:.0f} rows/s)')
+    return inserted
+
+
+def chunk_tasks(first_id, count, chunk_size):
+    for start in range(first_id, first_id + count, chunk_size):
+        yield start, min(chunk_size, first_id + count - start)
+
+
+def fake_users(count, seed=0, chunk_size=10000, processes=1, echo=None):
+    role = Role.query.filter_by(default=True).first()
+    password_hash = generate_password_hash(FAKE_PASSWORD)
+    now = datetime.utcnow()
+    tasks = ((seed, start, size, password_hash, role.id if role else None, now)
+             for start, size in chunk_tasks(next_id(User), count, chunk_size))
+    inserted = insert_chunks('users', count, generate_parallel(generate_users, tasks, processes, {}), echo)
+    reset_sequence(User)
+    return inserted
+
+# Follows for the users that follow nobody but themselves yet
+def fake_follows(per_user=20, seed=0, chunk_size=1000, processes=1, echo=None):
+    users = IdSpace.load(User)
+    others = select(Follow.follower_id).where(Follow.follower_id == User.id, Follow.followed_id != User.id)
+    followers = IdSpace.from_query(select(User.id).where(~others.exists()).order_by(User.id))
+    if users is None or followers is None:
+        return 0
+    now = datetime.utcnow()
+    tasks = ((seed, start, chunk_size, per_user, now) for start in range(0, len(followers), chunk_size))
+    return insert_chunks('follows', None, generate_parallel(
+        generate_follows, tasks, processes, {'users': users, 'followers': followers}), echo)
+
+def fake_posts(count, seed=0, days=365, chunk_size=5000, processes=1, echo=None):
+    users = IdSpace.load(User)
+    if users is None:
+        return 0
+    first_id = next_id(Post)
+    span = timedelta(days=days)
+    start = datetime.utcnow() - span
+    excerpt_length = current_app.config['POST_EXCERPT_LENGTH']
+    tasks = ((seed, start_id, size, count, start, span, excerpt_length)
+             for start_id, size in chunk_tasks(first_id, count, chunk_size))
+    inserted = insert_chunks('posts', count, generate_parallel(
+        generate_posts, tasks, processes, {'users': users, 'first_post_id': first_id}), echo)
+    reset_sequence(Post)
+    return inserted
+
+def fake_comments(count, seed=0, days=365, chunk_size=10000, processes=1, echo=None):
+    users = IdSpace.load(User)
+    posts = IdSpace.load(Post)
+    if users is None or posts is None:
+        return 0
+    span = timedelta(days=days)
+    start = datetime.utcnow() - span
+    tasks = ((seed, start_id, size, start, span)
+             for start_id, size in chunk_tasks(next_id(Comment), count, chunk_size))
+    inserted = insert_chunks('comments', count, generate_parallel(
+        generate_comments, tasks, processes, {'users': users, 'posts': posts}), echo)
+    reset_sequence(Comment)
+    return inserted
+
+# Bring counters and caches in line with the bulk inserted rows, which
+# bypassed the session hooks that normally keep them current
+def finish(echo=None):
+    reconcile(echo=echo)
+    timeline.invalidate_all()
+    recent_posts_index.invalidate()
+    search_index.invalidate()
+    page_cache.invalidate()
+
 
 # Function to create multiple users
 def users(count=20):
-    fake = Faker()
-    i = 0
-    while i < count:
-        user = User(email=fake.email(), username=fake.user_name(), password='123456', 
-                    confirmed=True, first_name=fake.name(), last_name=fake.name(), 
-                    address=fake.city(), bio=fake.text())
-        db.session.add(user)
-        try:
-            db.session.commit()
-            i += 1
-        except Exception as e:
-            print(e)
-            db.session.rollback()
-            
+    fake_users(count, seed=random.randrange(1 << 32))
+    finish()
+
 #Function to create multiple posts
 def create_posts(count=25):
-    fake = Faker()
-    user_count = User.query.count()
-    for i in range(count):
-        user = User.query.offset(randint(0, user_count-1)).first()
-        post = Post(title=fake.name(), body_html=fake.text(), 
-                    timestamp=fake.past_date(), author=user)
-        db.session.add(post)
-    db.session.commit()
\ No newline at end of file
+    fake_posts(count, seed=random.randrange(1 << 32))
+    finish()
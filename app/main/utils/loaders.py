@@ -0,0 +1,51 @@
+from collections import namedtuple
+from sqlalchemy.orm import aliased, joinedload
+from app import db
+from app.comment_threads import thread_page, thread_of
+from models import Post
+
+# Link to a neighbouring post
+PostLink = namedtuple('PostLink', ['id', 'title', 'slug'])
+
+PostDetails = namedtuple('PostDetails', ['post', 'next_post', 'prev_post', 'pagination'])
+
+
+def post_link(id, title, slug):
+    return PostLink(id, title, slug) if id is not None else None
+
+
+# Load a post with its author, tags and both neighbours in one statement.
+# The neighbours are found with MIN/MAX id seeks on the primary key, which
+# stay constant time as the table grows.
+def load_post(post_id):
+    next_id = db.session.query(db.func.min(Post.id)).filter(Post.id > post_id).scalar_subquery()
+    prev_id = db.session.query(db.func.max(Post.id)).filter(Post.id < post_id).scalar_subquery()
+    next_post = aliased(Post)
+    prev_post = aliased(Post)
+    row = db.session.query(Post,
+                           next_post.id, next_post.title, next_post.slug,
+                           prev_post.id, prev_post.title, prev_post.slug).\
+            options(joinedload(Post.author), joinedload(Post.tags)).\
+            outerjoin(next_post, next_post.id == next_id).\
+            outerjoin(prev_post, prev_post.id == prev_id).\
+            filter(Post.id == post_id).first()
+    if row is None:
+        return None
+    return row[0], post_link(*row[1:4]), post_link(*row[4:7])
+
+
+# Everything the blog_details page shows, in two statements: the post with
+# its neighbours, and a page of comment threads with their authors joined.
+# With thread set only the replies below that comment are shown.
+def load_post_details(post_id, per_page, max_depth, after=None, before=None, thread=None):
+    loaded = load_post(post_id)
+    if loaded is None:
+        return None
+    post, next_post, prev_post = loaded
+    if thread is not None:
+        pagination = thread_of(post_id, thread, max_depth)
+        if pagination is None:
+            return None
+    else:
+        pagination = thread_page(post_id, per_page, max_depth, after=after, before=before)
+    return PostDetails(post, next_post, prev_post, pagination)
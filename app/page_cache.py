@@ -0,0 +1,121 @@
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, request, session, make_response
+from flask_login import current_user
+from app import db
+from app.kvstore import get_store
+
+GENERATION_KEY = 'page_cache:generation'
+
+
+# Current cache generation; bumping it invalidates every cached page
+def generation():
+    return int(get_store().get(GENERATION_KEY) or 0)
+
+def invalidate():
+    get_store().incr(GENERATION_KEY)
+
+
+def cache_key(generation):
+    view_args = sorted((request.view_args or {}).items())
+    args = sorted(request.args.items(multi=True))
+    return 'page:{}:{}:{}:{}:{}'.format(generation, request.endpoint, session.get('lang_code'),
+                                        json.dumps(view_args), json.dumps(args))
+
+
+# Latest post or comment date, used as Last-Modified of the cached pages
+def last_modified():
+    from models import Post, Comment
+    latest_post = db.session.query(db.func.max(Post.timestamp)).scalar_subquery()
+    latest_comment = db.session.query(db.func.max(Comment.comment_date)).scalar_subquery()
+    dates = db.session.query(latest_post, latest_comment).one()
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+# Requests that must always be rendered for the visitor
+def bypass():
+    return request.method != 'GET' or current_user.is_authenticated or \
+        bool(session.get('_flashes'))
+
+
+# Pages holding the visitor's CSRF token belong to their session and
+# must not be served to anyone else
+def session_bound(body):
+    token = g.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+    return bool(token) and token in body
+
+
+def build_response(entry):
+    response = make_response(entry['body'])
+    response.mimetype = entry['mimetype']
+    response.set_etag(entry['etag'])
+    if entry['last_modified']:
+        response.last_modified = datetime.fromisoformat(entry['last_modified'])
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def load(store, key):
+    data = store.get(key)
+    return json.loads(data) if data else None
+
+
+# Wait for another worker that is rendering the same page
+def wait_for(store, key):
+    deadline = time.time() + current_app.config['PAGE_CACHE_LOCK_TIMEOUT']
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = load(store, key)
+        if entry is not None:
+            return entry
+
+
+# Cache the rendered page for anonymous visitors and answer conditional
+# requests with 304. Only one worker renders a missing page at a time,
+# the others wait for its result.
+def cached_page(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config['PAGE_CACHE_ENABLED'] or bypass():
+            return f(*args, **kwargs)
+        store = get_store()
+        current_generation = generation()
+        key = cache_key(current_generation)
+        entry = load(store, key)
+        if entry is not None:
+            return build_response(entry)
+
+        lock_key = key + ':lock'
+        token = uuid.uuid4().hex
+        if not store.set(lock_key, token, ex=current_app.config['PAGE_CACHE_LOCK_TIMEOUT'], nx=True):
+            entry = wait_for(store, key)
+            if entry is not None:
+                return build_response(entry)
+            return f(*args, **kwargs)
+        try:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or response.mimetype != 'text/html' or \
+                    session.get('_flashes'):
+                return response
+            body = response.get_data(as_text=True)
+            if session_bound(body):
+                return response
+            modified = last_modified()
+            entry = {
+                'body': body,
+                'mimetype': response.mimetype,
+                'etag': hashlib.sha1('{}:{}'.format(key, modified).encode()).hexdigest(),
+                'last_modified': modified.isoformat() if modified else None,
+            }
+            store.set(key, json.dumps(entry), ex=current_app.config['PAGE_CACHE_TIMEOUT'])
+            return build_response(entry)
+        finally:
+            if store.get(lock_key) in (token, token.encode()):
+                store.delete(lock_key)
+    return decorated_function
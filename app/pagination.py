@@ -0,0 +1,103 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import and_, or_
+from app.exceptions import ValidationError
+
+
+# Cursor tokens are opaque to clients: url-safe base64 of the key values
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    data = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def decode_cursor(token, columns):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(token)
+        decoded = []
+        for column, value in zip(columns, values):
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif not isinstance(value, column.type.python_type):
+                raise ValueError(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise ValidationError('invalid pagination cursor')
+
+
+# Rows strictly past the cursor in (col1, col2, ...) order, or from the
+# cursor on when inclusive. The redundant bound on the first column lets the
+# database turn the seek into an index range scan instead of filtering every
+# row before the cursor.
+def seek_condition(columns, values, descending, inclusive=False):
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal = [columns[j] == values[j] for j in range(i)]
+        if inclusive and i == len(columns) - 1:
+            clauses.append(and_(*equal, column <= value if descending else column >= value))
+        else:
+            clauses.append(and_(*equal, column < value if descending else column > value))
+    bound = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    return and_(bound, or_(*clauses))
+
+
+# One page of a keyset paginated query
+class KeysetPagination:
+    def __init__(self, items, columns, has_prev, has_next):
+        self.items = items
+        self.columns = columns
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+    def cursor_for(self, item):
+        return encode_cursor([getattr(item, column.key) for column in self.columns])
+
+    # Token for the page before this one (newer items in descending order)
+    @property
+    def prev_cursor(self):
+        if self.has_prev and self.items:
+            return self.cursor_for(self.items[0])
+
+    # Token for the page after this one
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return self.cursor_for(self.items[-1])
+
+
+# Paginate query by seeking past the cursor on columns instead of using
+# OFFSET, so every page costs the same index range scan as the first one.
+# The last column must be unique (usually the primary key).
+def paginate_keyset(query, columns, per_page, after=None, before=None, descending=True):
+    columns = list(columns)
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+    # Walking backwards reverses the order, then the page is flipped back
+    reverse = descending != backwards
+    if cursor is not None:
+        query = query.filter(seek_condition(columns, decode_cursor(cursor, columns), reverse))
+    ordering = [column.desc() if reverse else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*ordering).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        return KeysetPagination(rows, columns, has_prev=more, has_next=True)
+    return KeysetPagination(rows, columns, has_prev=cursor is not None, has_next=more)
+
+
+# prev/next urls of a keyset page for endpoint
+def page_urls(pagination, endpoint, **values):
+    prev = None
+    if pagination.has_prev:
+        prev = url_for(endpoint, before=pagination.prev_cursor, **values)
+    next = None
+    if pagination.has_next:
+        next = url_for(endpoint, after=pagination.next_cursor, **values)
+    return prev, next
@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from app.exceptions import ServiceBusy
+from app.kvstore import get_store
+
+_pool = None
+_pool_pid = None
+
+
+# Password hashing service.
+# The method (algorithm and cost, in Werkzeug's 'pbkdf2:sha256:<iterations>'
+# form) comes from PASSWORD_HASH_METHOD; hashes made with another method are
+# upgraded on the next successful login. With PASSWORD_HASH_MODE = 'process'
+# verifications run in a process pool instead of the request thread.
+def hash_password(password):
+    return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'],
+                                  salt_length=current_app.config['PASSWORD_SALT_LENGTH'])
+
+
+def hash_method(password_hash):
+    return password_hash.split('$', 1)[0] if password_hash else None
+
+# Algorithm and cost of a method with Werkzeug's defaults filled in, so
+# 'pbkdf2:sha256' and the 'pbkdf2:sha256:260000' it is stored as compare equal
+def parse_method(method):
+    if not method:
+        return None
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        algorithm = args[0] if args and args[0] else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 and args[1] else DEFAULT_PBKDF2_ITERATIONS
+        return (name, algorithm, iterations)
+    if name == 'scrypt':
+        defaults = (2 ** 15, 8, 1)
+        return (name,) + tuple(int(args[i]) if len(args) > i and args[i] else defaults[i] for i in range(3))
+    return (name,) + tuple(args)
+
+def needs_rehash(password_hash):
+    try:
+        return parse_method(hash_method(password_hash)) != parse_method(current_app.config['PASSWORD_HASH_METHOD'])
+    except ValueError:
+        return True
+
+
+# Per process pool, created again after a fork
+def process_pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(max_workers=current_app.config['PASSWORD_HASH_PROCESSES'])
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def check(password_hash, password):
+    if not password_hash:
+        return False
+    if current_app.config['PASSWORD_HASH_MODE'] == 'process':
+        return process_pool().submit(check_password_hash, password_hash, password).result()
+    return check_password_hash(password_hash, password)
+
+
+# Limit the sign ins being verified at once per client address and per
+# username. Excess attempts fail before any hashing is done.
+@contextmanager
+def login_slot(remote_addr, username):
+    store = get_store()
+    limits = [('login:ip:{}'.format(remote_addr), current_app.config['LOGIN_CONCURRENCY_PER_IP']),
+              ('login:user:{}'.format((username or '').lower()), current_app.config['LOGIN_CONCURRENCY_PER_USERNAME'])]
+    acquired = []
+    try:
+        for key, limit in limits:
+            count = store.incr(key)
+            acquired.append(key)
+            # Slots of crashed workers are released by the expiry, counted
+            # from the first attempt so busy keys still run out
+            if count == 1:
+                store.expire(key, current_app.config['LOGIN_SLOT_TIMEOUT'])
+            if count > limit:
+                raise ServiceBusy('too many sign in attempts in progress')
+        yield
+    finally:
+        for key in acquired:
+            # The key may have expired meanwhile: never leave it below zero
+            if store.decr(key) <= 0:
+                store.delete(key)
@@ -0,0 +1,115 @@
+import json
+import threading
+from collections import OrderedDict
+from flask import current_app
+from redis.exceptions import RedisError
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.kvstore import get_store
+
+# User columns kept in the cached principal record
+PRINCIPAL_COLUMNS = ('id', 'username', 'confirmed', 'image', 'role_id')
+
+ROLES_VERSION_KEY = 'principal:roles:version'
+
+
+# Thread safe LRU mapping used as the in-process tier
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def local_cache():
+    cache = current_app.extensions.get('principal_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'principal_cache', LRUCache(current_app.config['PRINCIPAL_CACHE_SIZE']))
+    return cache
+
+
+def version_key(user_id):
+    return 'principal:{}:version'.format(user_id)
+
+# Records are keyed by the user's version and the roles version, so bumping
+# either one makes every cached copy unreachable
+def record_key(store, user_id):
+    user_version, roles_version = store.mget([version_key(user_id), ROLES_VERSION_KEY])
+    return 'principal:{}:{}:{}'.format(user_id, int(user_version or 0), int(roles_version or 0))
+
+
+def principal_record(user):
+    record = {column: getattr(user, column) for column in PRINCIPAL_COLUMNS}
+    record['permissions'] = user.role.permissions if user.role is not None else 0
+    return record
+
+
+def load_record(user_id):
+    from models import User
+    store = get_store()
+    key = record_key(store, user_id)
+    cache = local_cache()
+    record = cache.get(key)
+    if record is not None:
+        return record
+    data = store.get(key)
+    if data is not None:
+        record = json.loads(data)
+    else:
+        user = User.query.options(joinedload(User.role)).filter_by(id=user_id).first()
+        if user is None:
+            return None
+        record = principal_record(user)
+        store.set(key, json.dumps(record), ex=current_app.config['PRINCIPAL_CACHE_TIMEOUT'])
+    cache.set(key, record)
+    return record
+
+
+# Persistent User built from a principal record (or any subset of it with
+# the id) without touching the database. Columns outside the record are
+# expired and load on first access.
+def build_user(record):
+    from models import User
+    user = User.__mapper__.class_manager.new_instance()
+    for column in PRINCIPAL_COLUMNS:
+        if column in record:
+            set_committed_value(user, column, record[column])
+    make_transient_to_detached(user)
+    user = db.session.merge(user, load=False)
+    user.principal_permissions = record['permissions']
+    return user
+
+
+# Resolve the logged in user for Flask-Login
+def load_principal(user_id):
+    from models import User
+    try:
+        record = load_record(user_id)
+    except RedisError:
+        return User.query.get(user_id)
+    return build_user(record) if record is not None else None
+
+
+def invalidate(*user_ids):
+    store = get_store()
+    for user_id in user_ids:
+        store.incr(version_key(user_id))
+
+def invalidate_roles():
+    get_store().incr(ROLES_VERSION_KEY)
@@ -0,0 +1,135 @@
+import logging
+import threading
+import uuid
+from collections import namedtuple
+from flask import current_app
+from redis.exceptions import RedisError
+from app.kvstore import get_store
+
+logger = logging.getLogger(__name__)
+
+# Lightweight post record rendered by the "Recent Posts" sidebar
+RecentPost = namedtuple('RecentPost', ['id', 'title', 'slug', 'timestamp'])
+
+
+# Per-process top-K index of the most recent posts.
+# Seeded with one query and kept current from committed Post changes, so
+# rendering the sidebar does not touch the database.
+class RecentPostsIndex:
+    def __init__(self, app):
+        self.app = app
+        self.size = app.config['RECENT_POSTS_COUNT']
+        self.channel = app.config['RECENT_POSTS_CHANNEL']
+        self.token = uuid.uuid4().hex
+        self.entries = None
+        self.lock = threading.Lock()
+        self.subscriber = None
+
+    # Return the cached posts, seeding the index if needed
+    def get(self):
+        if not self.subscribe():
+            return self.load()
+        entries = self.entries
+        if entries is None:
+            entries = self.load()
+            with self.lock:
+                if self.entries is None:
+                    self.entries = entries
+        return list(entries)
+
+    def load(self):
+        from models import Post
+        rows = Post.query.with_entities(Post.id, Post.title, Post.slug, Post.timestamp).\
+                order_by(Post.timestamp.desc(), Post.id.desc()).limit(self.size).all()
+        return [RecentPost(*row) for row in rows]
+
+    def invalidate(self):
+        with self.lock:
+            self.entries = None
+
+    # Apply committed changes: a dict of post id -> RecentPost (or None when deleted)
+    def apply(self, changes):
+        with self.lock:
+            if self.entries is not None:
+                self.entries = self._merge(self.entries, changes)
+        self.publish()
+
+    def _merge(self, entries, changes):
+        current = {entry.id: entry for entry in entries}
+        for post_id, post in changes.items():
+            if post is None:
+                if post_id in current:
+                    # The next post to move up is unknown, reseed on next read
+                    return None
+                continue
+            current[post.id] = post
+        merged = sorted(current.values(), key=lambda p: (p.timestamp, p.id), reverse=True)
+        if len(entries) == self.size:
+            dropped = set(current) - set(p.id for p in merged[:self.size])
+            if dropped & set(entry.id for entry in entries):
+                # A cached post moved below the cut, something uncached may belong here
+                return None
+        return merged[:self.size]
+
+    # Tell the other workers that their copy is stale
+    def publish(self):
+        if not self.app.config.get('REDIS_URL'):
+            return
+        try:
+            get_store(self.app).publish(self.channel, self.token)
+        except RedisError as e:
+            logger.warning('Could not publish recent posts invalidation: %s', e)
+
+    def on_message(self, message):
+        data = message.get('data')
+        if isinstance(data, bytes):
+            data = data.decode()
+        if data != self.token:
+            self.invalidate()
+
+    # Listen for invalidations from the other workers. Returns False when the
+    # index cannot be kept coherent and has to be bypassed.
+    def subscribe(self):
+        if not self.app.config.get('REDIS_URL'):
+            return True
+        if self.subscriber is not None and self.subscriber.is_alive():
+            return True
+        with self.lock:
+            if self.subscriber is not None and self.subscriber.is_alive():
+                return True
+            self.entries = None
+            try:
+                pubsub = get_store(self.app).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.channel: self.on_message})
+                self.subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True)
+            except RedisError as e:
+                logger.warning('Recent posts index disabled, cannot subscribe: %s', e)
+                return False
+        return True
+
+
+# Flask extension holding one RecentPostsIndex per application
+class RecentPosts:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RECENT_POSTS_COUNT', 5)
+        app.config.setdefault('RECENT_POSTS_CHANNEL', 'santa:recent_posts')
+        app.extensions['recent_posts'] = RecentPostsIndex(app)
+
+    @property
+    def index(self):
+        return current_app.extensions['recent_posts']
+
+    def get(self):
+        return self.index.get()
+
+    def apply(self, changes):
+        self.index.apply(changes)
+
+    # Reseed this worker's index and tell the others to do the same
+    def invalidate(self):
+        self.index.invalidate()
+        self.index.publish()
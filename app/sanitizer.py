@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+from html import escape
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+import bleach
+from flask import current_app
+from redis.exceptions import RedisError
+from app import db, celery, page_cache, search_index
+from app.kvstore import get_store
+from app.principals import LRUCache
+
+# Allowlist applied to post bodies
+Policy = namedtuple('Policy', ['tags', 'attributes', 'protocols'])
+
+_local = threading.local()
+
+
+def current_policy():
+    config = current_app.config
+    attributes = config['SANITIZER_ALLOWED_ATTRIBUTES'] or bleach.sanitizer.ALLOWED_ATTRIBUTES
+    return Policy(tuple(sorted(config['SANITIZER_ALLOWED_TAGS'] or bleach.sanitizer.ALLOWED_TAGS)),
+                  tuple(sorted((tag, tuple(sorted(names))) for tag, names in attributes.items())),
+                  tuple(sorted(config['SANITIZER_ALLOWED_PROTOCOLS'] or bleach.sanitizer.ALLOWED_PROTOCOLS)))
+
+def policy_key(policy):
+    return hashlib.sha1(json.dumps(policy).encode()).hexdigest()[:12]
+
+
+# Clean then linkify, like bleach.linkify(bleach.clean(html, strip=True)),
+# with the Cleaner and Linker built once per thread and policy instead of on
+# every call. Safe to run in worker processes: it needs no application.
+def clean(policy, html):
+    cache = getattr(_local, 'cleaners', None)
+    if cache is None:
+        cache = _local.cleaners = {}
+    if policy not in cache:
+        cache[policy] = (bleach.Cleaner(tags=list(policy.tags),
+                                        attributes={tag: list(names) for tag, names in policy.attributes},
+                                        protocols=list(policy.protocols), strip=True),
+                         bleach.Linker())
+    cleaner, linker = cache[policy]
+    return linker.linkify(cleaner.clean(html))
+
+
+# Elements without a closing tag
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                           'meta', 'source', 'track', 'wbr'])
+
+
+# Cut sanitized HTML after a number of text characters, on a word boundary,
+# keeping the markup balanced so the result can be rendered on its own
+class ExcerptParser(HTMLParser):
+    def __init__(self, length):
+        super().__init__(convert_charrefs=True)
+        self.remaining = length
+        self.parts = []
+        self.open_tags = []
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if not self.done:
+            self.parts.append(self.get_starttag_text())
+            if tag not in VOID_ELEMENTS:
+                self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.done:
+            self.parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if not self.done and tag in self.open_tags:
+            while self.open_tags:
+                open_tag = self.open_tags.pop()
+                self.parts.append(f'</{open_tag}>')
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data):
+        if self.done:
+            return
+        if len(data) <= self.remaining:
+            self.parts.append(escape(data, quote=False))
+            self.remaining -= len(data)
+            return
+        cut = data[:self.remaining]
+        # Do not end inside a word, unless it is the first one
+        if data[self.remaining:self.remaining + 1].strip():
+            if ' ' in cut:
+                cut = cut.rsplit(' ', 1)[0]
+            elif self.parts:
+                cut = ''
+        self.parts.append(escape(cut.rstrip(), quote=False) + '\u2026')
+        self.done = True
+
+    def excerpt(self):
+        self.close()
+        return ''.join(self.parts + [f'</{tag}>' for tag in reversed(self.open_tags)])
+
+
+def make_excerpt(html, length=None):
+    if not html:
+        return html
+    parser = ExcerptParser(length or current_app.config['POST_EXCERPT_LENGTH'])
+    parser.feed(html)
+    return parser.excerpt()
+
+
+# Content hash cache of sanitized bodies: an in-process LRU in front of the
+# key/value store, keyed by the policy and a SHA-256 of the input
+def local_cache():
+    cache = current_app.extensions.get('sanitizer_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'sanitizer_cache', LRUCache(current_app.config['SANITIZER_CACHE_SIZE']))
+    return cache
+
+def cache_key(policy, html):
+    return 'sanitized:{}:{}'.format(policy_key(policy), hashlib.sha256(html.encode()).hexdigest())
+
+def cached(html, policy=None):
+    policy = policy or current_policy()
+    key = cache_key(policy, html)
+    body = local_cache().get(key)
+    if body is not None:
+        return body
+    try:
+        body = get_store().get(key)
+    except RedisError:
+        return None
+    if body is None:
+        return None
+    body = body.decode() if isinstance(body, bytes) else body
+    local_cache().set(key, body)
+    return body
+
+def remember(html, body, policy=None):
+    key = cache_key(policy or current_policy(), html)
+    local_cache().set(key, body)
+    try:
+        get_store().set(key, body, ex=current_app.config['SANITIZER_CACHE_TIMEOUT'])
+    except RedisError:
+        pass
+
+
+def sanitize(html):
+    if not html:
+        return html
+    policy = current_policy()
+    body = cached(html, policy)
+    if body is None:
+        body = clean(policy, html)
+        remember(html, body, policy)
+    return body
+
+
+# Set the sanitized body of a post whose body_html changed. In async mode
+# a cache miss leaves the post pending (keeping its previous body) for
+# sanitize_post to finish after the commit.
+def apply(post, html):
+    if html and current_app.config['SANITIZER_ASYNC']:
+        body = cached(html)
+        if body is None:
+            post.body_pending = True
+            return
+    else:
+        body = sanitize(html)
+    post.body = body
+    post.excerpt = make_excerpt(body)
+    post.body_pending = False
+
+def dispatch(*posts):
+    pending = [post.id for post in posts if post.body_pending]
+    if len(pending) == 1:
+        sanitize_post.delay(pending[0])
+    elif pending:
+        sanitize_posts.delay(pending)
+
+
+@celery.task
+def sanitize_post(post_id):
+    from models import Post
+    post = Post.query.filter_by(id=post_id).with_for_update().first()
+    if post is None or not post.body_pending:
+        db.session.rollback()
+        return
+    post.body = sanitize(post.body_html)
+    post.excerpt = make_excerpt(post.body)
+    post.body_pending = False
+    db.session.commit()
+
+@celery.task
+def sanitize_posts(post_ids):
+    from models import Post
+    posts = Post.query.filter(Post.id.in_(post_ids), Post.body_pending).with_for_update().all()
+    for post in posts:
+        post.body = sanitize(post.body_html)
+        post.excerpt = make_excerpt(post.body)
+        post.body_pending = False
+    db.session.commit()
+
+
+def resanitize_chunk(policy, excerpt_length, rows):
+    results = []
+    for post_id, html in rows:
+        body = clean(policy, html) if html else html
+        results.append((post_id, body, make_excerpt(body, excerpt_length)))
+    return results
+
+# Sanitize every post again with the current policy, in id chunks spread
+# over a process pool. Returns the number of posts whose body changed.
+def resanitize(chunk_size=500, processes=None, echo=None):
+    from models import Post
+    policy = current_policy()
+    excerpt_length = current_app.config['POST_EXCERPT_LENGTH']
+    posts = Post.__table__
+    processes = processes or os.cpu_count() or 1
+    changed = 0
+    last_id = 0
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        while True:
+            chunks = []
+            for _ in range(processes):
+                rows = db.session.query(Post.id, Post.title, Post.body_html, Post.body).\
+                        filter(Post.id > last_id).order_by(Post.id).limit(chunk_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                chunks.append(rows)
+            if not chunks:
+                break
+            current = {row[0]: row for rows in chunks for row in rows}
+            futures = [pool.submit(resanitize_chunk, policy, excerpt_length, [(row[0], row[2]) for row in rows])
+                       for rows in chunks]
+            results = [result for future in futures for result in future.result()
+                       if result[1] != current[result[0]][3]]
+            documents = {post_id: (current[post_id][1], body) for post_id, body, _ in results}
+            if documents:
+                db.session.execute(posts.update().where(posts.c.id == db.bindparam('post_id')).
+                                   values(body=db.bindparam('new_body'), excerpt=db.bindparam('new_excerpt'),
+                                          body_pending=False, version=posts.c.version + 1,
+                                          updated_at=datetime.utcnow()),
+                                   [{'post_id': post_id, 'new_body': body, 'new_excerpt': excerpt}
+                                    for post_id, body, excerpt in results])
+                search_index.backend.stage(db.session.connection(), documents)
+            db.session.commit()
+            search_index.backend.commit(documents)
+            changed += len(documents)
+            if echo is not None:
+                echo(f'{changed} post(s) updated, last id {last_id}')
+    if changed:
+        page_cache.invalidate()
+    return changed
@@ -0,0 +1,67 @@
+from collections import namedtuple
+from flask import current_app
+
+SearchResults = namedtuple('SearchResults', ['query', 'items', 'page', 'has_prev', 'has_next'])
+
+
+# Flask extension picking a search backend per application: a tsvector
+# index on Postgres, an in-process BM25 inverted index elsewhere.
+class Search:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.config.setdefault('SEARCH_RESULTS_PER_PAGE', 10)
+        app.config.setdefault('SEARCH_LANGUAGE_CONFIGS', {'en': 'english'})
+        backend = app.config['SEARCH_BACKEND']
+        if backend == 'auto':
+            uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+            backend = 'postgres' if uri.startswith('postgres') else 'memory'
+        if backend == 'postgres':
+            from app.search.postgres import PostgresSearchBackend
+            app.extensions['search'] = PostgresSearchBackend(app)
+        else:
+            from app.search.memory import MemorySearchBackend
+            app.extensions['search'] = MemorySearchBackend(app)
+
+    @property
+    def backend(self):
+        return current_app.extensions['search']
+
+    # Record a post change during flush: document is (title, body) or None
+    # when the post was deleted. Applied to the index once committed.
+    def stage(self, session, connection, post_id, document):
+        self.backend.stage(connection, {post_id: document})
+        session.info.setdefault('search_changes', {})[post_id] = document
+
+    def commit(self, session):
+        changes = session.info.pop('search_changes', None)
+        if changes:
+            self.backend.commit(changes)
+
+    def discard(self, session):
+        session.info.pop('search_changes', None)
+
+    def reindex(self):
+        return self.backend.reindex()
+
+    # Refresh after posts were written without going through the session
+    def invalidate(self):
+        self.backend.invalidate()
+
+    # Ranked, page numbered search over posts
+    def search(self, query, language, page=1, per_page=None, options=()):
+        from models import Post
+        per_page = per_page or current_app.config['SEARCH_RESULTS_PER_PAGE']
+        page = max(page, 1)
+        query = (query or '').strip()
+        if not query:
+            return SearchResults(query, [], page, False, False)
+        ids = self.backend.search(query, language, offset=(page - 1) * per_page, limit=per_page + 1)
+        has_next = len(ids) > per_page
+        ids = ids[:per_page]
+        posts = {post.id: post for post in Post.query.options(*options).filter(Post.id.in_(ids))} if ids else {}
+        items = [posts[post_id] for post_id in ids if post_id in posts]
+        return SearchResults(query, items, page, page > 1, has_next)
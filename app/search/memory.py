@@ -0,0 +1,130 @@
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+from app.kvstore import get_store
+from app.search.text import tokenize
+
+# Bumped to make every worker rebuild its index, after bulk changes
+GENERATION_KEY = 'search:generation'
+
+
+# In-process inverted index with BM25 ranking.
+# Used on SQLite and in tests, where there is no full-text index in the
+# database. Each worker keeps its own copy, seeded from the posts table on
+# first use and updated from committed Post changes.
+class InvertedIndex:
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.terms = {}
+        self.lengths = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+
+    def add(self, doc_id, tokens):
+        with self.lock:
+            self.remove(doc_id)
+            frequencies = Counter(tokens)
+            for term, frequency in frequencies.items():
+                self.postings[term][doc_id] = frequency
+            self.terms[doc_id] = list(frequencies)
+            self.lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+
+    def remove(self, doc_id):
+        with self.lock:
+            length = self.lengths.pop(doc_id, None)
+            if length is None:
+                return
+            self.total_length -= length
+            for term in self.terms.pop(doc_id):
+                postings = self.postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    # Best matches first as (doc_id, score), up to limit
+    def search(self, tokens, limit):
+        with self.lock:
+            count = len(self.lengths)
+            if not count:
+                return []
+            average = self.total_length / count
+            scores = defaultdict(float)
+            for term in set(tokens):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+class MemorySearchBackend:
+    def __init__(self, app):
+        self.app = app
+        self.index = None
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def document(self, title, body):
+        # The title counts twice so that title matches rank higher
+        return tokenize(title) * 2 + tokenize(body)
+
+    def ensure_index(self):
+        generation = int(get_store(self.app).get(GENERATION_KEY) or 0)
+        if self.index is not None and self.generation == generation:
+            return self.index
+        with self.lock:
+            if self.index is None or self.generation != generation:
+                self.index = self.build()
+                self.generation = generation
+        return self.index
+
+    def build(self, chunk_size=1000):
+        from models import Post
+        index = InvertedIndex()
+        last_id = 0
+        while True:
+            rows = Post.query.with_entities(Post.id, Post.title, Post.body).\
+                    filter(Post.id > last_id).order_by(Post.id).limit(chunk_size).all()
+            if not rows:
+                break
+            for post_id, title, body in rows:
+                index.add(post_id, self.document(title, body))
+            last_id = rows[-1][0]
+        return index
+
+    def reindex(self):
+        index = self.build()
+        with self.lock:
+            self.index = index
+        return len(index.lengths)
+
+    def invalidate(self):
+        get_store(self.app).incr(GENERATION_KEY)
+
+    # Flush time: nothing to do, the index only sees committed data
+    def stage(self, connection, changes):
+        pass
+
+    def commit(self, changes):
+        if self.index is None:
+            return
+        for post_id, document in changes.items():
+            if document is None:
+                self.index.remove(post_id)
+            else:
+                self.index.add(post_id, self.document(*document))
+
+    def search(self, query, language, offset, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        hits = self.ensure_index().search(tokens, offset + limit)
+        return [doc_id for doc_id, _ in hits[offset:]]
@@ -0,0 +1,66 @@
+from sqlalchemy import text
+from app import db
+from app.search.text import strip_tags
+
+
+# Full-text search on Postgres.
+# post_search holds one tsvector per post and configured language, with a
+# GIN index on the document (see the migration). Rows are written on the
+# flush connection, so the index commits or rolls back with the post.
+class PostgresSearchBackend:
+    def __init__(self, app):
+        self.app = app
+        self.configs = app.config['SEARCH_LANGUAGE_CONFIGS']
+
+    def config_for(self, language):
+        return self.configs.get(language) or self.configs[self.app.config['LANGUAGES'][0]]
+
+    def stage(self, connection, changes):
+        deleted = [post_id for post_id, document in changes.items() if document is None]
+        if deleted:
+            connection.execute(text('DELETE FROM post_search WHERE post_id IN :ids').
+                               bindparams(db.bindparam('ids', expanding=True)), {'ids': deleted})
+        rows = [{'post_id': post_id, 'language': language, 'config': config,
+                 'title': title or '', 'body': strip_tags(body)}
+                for post_id, document in changes.items() if document is not None
+                for title, body in [document]
+                for language, config in self.configs.items()]
+        if rows:
+            connection.execute(text(
+                "INSERT INTO post_search (post_id, language, document) "
+                "VALUES (:post_id, :language, "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :title), 'A') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :body), 'B')) "
+                "ON CONFLICT (post_id, language) DO UPDATE SET document = EXCLUDED.document"), rows)
+
+    def commit(self, changes):
+        pass
+
+    # The index is a table, kept current by stage
+    def invalidate(self):
+        pass
+
+    def reindex(self, chunk_size=1000):
+        from models import Post
+        last_id = 0
+        indexed = 0
+        while True:
+            rows = Post.query.with_entities(Post.id, Post.title, Post.body).\
+                    filter(Post.id > last_id).order_by(Post.id).limit(chunk_size).all()
+            if not rows:
+                break
+            self.stage(db.session.connection(), {post_id: (title, body) for post_id, title, body in rows})
+            db.session.commit()
+            last_id = rows[-1][0]
+            indexed += len(rows)
+        return indexed
+
+    def search(self, query, language, offset, limit):
+        rows = db.session.execute(text(
+            "SELECT post_id FROM post_search, plainto_tsquery(CAST(:config AS regconfig), :query) AS q "
+            "WHERE language = :language AND document @@ q "
+            "ORDER BY ts_rank_cd(document, q) DESC, post_id DESC LIMIT :limit OFFSET :offset"),
+            {'config': self.config_for(language), 'query': query,
+             'language': language if language in self.configs else self.app.config['LANGUAGES'][0],
+             'limit': limit, 'offset': offset})
+        return [row[0] for row in rows]
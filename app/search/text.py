@@ -0,0 +1,21 @@
+import re
+
+TAG_RE = re.compile(r'<[^>]+>')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Words too common to be worth indexing
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its of on or
+she so that the their them then there these they this to was we were what when which who
+will with you your
+""".split())
+
+
+# Plain text of an HTML fragment
+def strip_tags(html):
+    return TAG_RE.sub(' ', html or '')
+
+
+def tokenize(text):
+    return [token for token in WORD_RE.findall(strip_tags(text).lower())
+            if len(token) > 1 and token not in STOPWORDS]
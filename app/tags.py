@@ -0,0 +1,226 @@
+from datetime import datetime
+from flask import current_app
+from slugify import slugify
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.exceptions import ValidationError
+from app.pagination import KeysetPagination, decode_cursor, seek_condition
+
+
+# Post tags.
+# post_tags copies the timestamp of its post, so the posts of a tag are one
+# range of the (tag_id, post_timestamp, post_id) index, already in listing
+# order. Posts carrying several tags are found by walking those ranges side
+# by side and keeping the keys present in all of them, skipping ahead with
+# an index seek whenever one range runs past the others. Tags far larger
+# than the rarest one are not walked; the keys found are looked up in them.
+
+TAG_NAME_LENGTH = 50
+
+# Tag names are slugs, so they are safe in URLs and '+' can join them
+def normalize(name):
+    return slugify(name or '', max_length=TAG_NAME_LENGTH)
+
+
+# Tag names of a comma separated list, normalized and without duplicates
+def parse_tags(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)) or not all(isinstance(name, str) for name in value):
+        raise ValidationError('tags must be a list of names')
+    names = list(dict.fromkeys(name for name in map(normalize, value) if name))
+    limit = current_app.config['TAGS_PER_POST']
+    if len(names) > limit:
+        raise ValidationError(f'at most {limit} tags are accepted')
+    return names
+
+
+def get_or_create(name):
+    from models import Tag
+    tag = Tag.query.filter_by(name=name).first()
+    if tag is not None:
+        return tag
+    try:
+        with db.session.begin_nested():
+            tag = Tag(name=name)
+            db.session.add(tag)
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        tag = Tag.query.filter_by(name=name).one()
+    return tag
+
+
+# Replace the tags of post with the given names, only adding and removing
+# the links that changed
+def set_tags(post, names):
+    from models import Tag, PostTag
+    tags = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))} if names else {}
+    wanted = {(tags.get(name) or get_or_create(name)).id for name in names}
+    current = {link.tag_id: link for link in post.tag_links}
+    changed = False
+    for tag_id, link in current.items():
+        if tag_id not in wanted:
+            post.tag_links.remove(link)
+            changed = True
+    for tag_id in wanted.difference(current):
+        post.tag_links.append(PostTag(tag_id=tag_id))
+        changed = True
+    if changed and post.id is not None:
+        # New version for cache validation, as tags are part of the post
+        post.updated_at = datetime.utcnow()
+
+
+# Tags named in a '+' joined list, e.g. python+flask, or None when one of
+# them does not exist
+def lookup(value):
+    from models import Tag
+    names = list(dict.fromkeys(normalize(name) for name in value.split('+')))
+    limit = current_app.config['TAG_INTERSECTION_LIMIT']
+    if not all(names) or len(names) > limit:
+        raise ValidationError(f'between 1 and {limit} tags can be combined')
+    tags = Tag.query.filter(Tag.name.in_(names)).all()
+    if len(tags) != len(names):
+        return None
+    return tags
+
+
+# Tag names of each of post_ids, read with one query
+def names_by_post(post_ids):
+    from models import Tag, PostTag
+    names = {post_id: [] for post_id in post_ids}
+    if names:
+        rows = db.session.query(PostTag.post_id, Tag.name).join(Tag, Tag.id == PostTag.tag_id).\
+                filter(PostTag.post_id.in_(names)).order_by(Tag.name)
+        for post_id, name in rows:
+            names[post_id].append(name)
+    return names
+
+
+# Most used tags, for the sidebar
+def popular(count):
+    from models import Tag
+    return Tag.query.filter(Tag.post_count > 0).order_by(Tag.post_count.desc(), Tag.name).limit(count).all()
+
+
+# (post_timestamp, post_id) keys of one tag in listing order, read from the
+# index a batch at a time. Batches start small and double up to
+# max_batch_size, so a page that ends early reads little past it.
+class TagKeys:
+    def __init__(self, tag_id, descending, batch_size, max_batch_size):
+        self.tag_id = tag_id
+        self.descending = descending
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.keys = []
+        self.position = 0
+        self.exhausted = False
+
+    def before(self, key, target, inclusive):
+        if key == target:
+            return not inclusive
+        return key > target if self.descending else key < target
+
+    # First key at or past target (strictly past unless inclusive), None
+    # once the tag has no more posts
+    def seek(self, target, inclusive=True):
+        while True:
+            while self.position < len(self.keys) and target is not None and \
+                    self.before(self.keys[self.position], target, inclusive):
+                self.position += 1
+            if self.position < len(self.keys):
+                return self.keys[self.position]
+            if self.exhausted:
+                return None
+            self.load(target, inclusive)
+
+    # Continue from target with a fresh index seek instead of reading
+    # through the keys before it
+    def load(self, target, inclusive):
+        from models import PostTag
+        columns = (PostTag.post_timestamp, PostTag.post_id)
+        query = select(*columns).where(PostTag.tag_id == self.tag_id)
+        if target is not None:
+            query = query.where(seek_condition(columns, target, self.descending, inclusive=inclusive))
+        ordering = [column.desc() if self.descending else column.asc() for column in columns]
+        self.keys = [tuple(row) for row in
+                     db.session.execute(query.order_by(*ordering).limit(self.batch_size))]
+        self.position = 0
+        self.exhausted = len(self.keys) < self.batch_size
+        self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+
+
+# Up to limit keys found in every one of streams, past start. The first
+# stream proposes a key, the others seek to it; any stream landing past it
+# proposes its own key to the first one, so every stream moves only forward.
+def intersect(streams, start, limit):
+    first, others = streams[0], streams[1:]
+    found = []
+    candidate = first.seek(start, inclusive=False)
+    while candidate is not None and len(found) < limit:
+        for stream in others:
+            key = stream.seek(candidate)
+            if key is None:
+                return found
+            if key != candidate:
+                candidate = first.seek(key)
+                break
+        else:
+            found.append(candidate)
+            candidate = first.seek(candidate, inclusive=False)
+    return found
+
+
+# Keys of candidates whose posts also carry every one of tag_ids, checked
+# with one lookup on the post_tags primary key
+def probe(candidates, tag_ids):
+    from models import PostTag
+    if not tag_ids or not candidates:
+        return candidates
+    rows = db.session.query(PostTag.post_id).\
+            filter(PostTag.post_id.in_([post_id for _, post_id in candidates]), PostTag.tag_id.in_(tag_ids)).\
+            group_by(PostTag.post_id).having(db.func.count() == len(tag_ids))
+    found = {row[0] for row in rows}
+    return [key for key in candidates if key[1] in found]
+
+
+# One keyset page of the posts carrying all of tags, newest first. Matching
+# keys come from the tag index alone; the posts are then loaded with one IN
+# query.
+def page(tags, per_page, after=None, before=None, options=()):
+    from models import Post
+    columns = (Post.timestamp, Post.id)
+    backwards = before is not None and after is None
+    token = before if backwards else after
+    cursor = tuple(decode_cursor(token, columns)) if token is not None else None
+    limit = per_page + 1
+    max_batch_size = max(limit, current_app.config['TAG_SCAN_BATCH_SIZE'])
+    # The rarest tag leads. Tags of similar size are walked alongside it;
+    # walking a much larger one would read most of its range, so the keys
+    # found are checked against those instead.
+    tags = sorted(tags, key=lambda tag: tag.post_count)
+    walk_limit = tags[0].post_count * current_app.config['TAG_MERGE_RATIO']
+    streams = [TagKeys(tag.id, not backwards, limit, max_batch_size)
+               for tag in tags if tag is tags[0] or tag.post_count <= walk_limit]
+    probed = [tag.id for tag in tags if tag is not tags[0] and tag.post_count > walk_limit]
+    keys = []
+    position = cursor
+    wanted = limit
+    while len(keys) < limit:
+        candidates = intersect(streams, position, wanted)
+        if not candidates:
+            break
+        keys.extend(probe(candidates, probed))
+        position = candidates[-1]
+        if len(candidates) < wanted:
+            break
+        wanted = min(wanted * 2, max_batch_size)
+    keys = keys[:limit]
+    more = len(keys) > per_page
+    ids = [post_id for _, post_id in keys[:per_page]]
+    posts = {post.id: post for post in Post.query.options(*options).filter(Post.id.in_(ids))} if ids else {}
+    items = [posts[post_id] for post_id in ids if post_id in posts]
+    if backwards:
+        items.reverse()
+        return KeysetPagination(items, columns, has_prev=more, has_next=True)
+    return KeysetPagination(items, columns, has_prev=cursor is not None, has_next=more)
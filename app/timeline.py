@@ -0,0 +1,197 @@
+import calendar
+from flask import current_app
+from app import db, celery
+from app.kvstore import get_store
+from app.pagination import KeysetPagination, decode_cursor, paginate_keyset, seek_condition
+
+
+# Materialized home timelines.
+# Each user has a sorted set of post ids scored by post timestamp, filled by
+# fanout_post when someone they follow writes. Authors with more than
+# TIMELINE_FANOUT_LIMIT followers are not fanned out; their posts are pulled
+# at read time and merged in. A timeline keeps the newest TIMELINE_MAX_LENGTH
+# posts, older pages are read from the database. Timelines expire after
+# TIMELINE_TTL and are rebuilt by the next read, so inactive users do not
+# keep one in the store.
+
+# Bumped to retire every built timeline at once, after bulk changes
+GENERATION_KEY = 'timeline:generation'
+
+def timeline_key(user_id):
+    return f'timeline:{user_id}'
+
+def built_key(user_id):
+    return f'timeline:{user_id}:built'
+
+def score(timestamp):
+    return calendar.timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+
+
+# Add a post to the timelines of the given users. Timelines that are not
+# built are skipped, the next read builds them from the database.
+def push(user_ids, post_id, timestamp):
+    max_length = current_app.config['TIMELINE_MAX_LENGTH']
+    ttl = current_app.config['TIMELINE_TTL']
+    store = get_store()
+    built = store.mget([built_key(user_id) for user_id in user_ids])
+    pipe = store.pipeline(transaction=False)
+    for user_id, marker in zip(user_ids, built):
+        if marker is None:
+            continue
+        pipe.zadd(timeline_key(user_id), {post_id: score(timestamp)})
+        pipe.zremrangebyrank(timeline_key(user_id), 0, -(max_length + 1))
+        pipe.expire(timeline_key(user_id), ttl)
+    pipe.execute()
+
+
+# Drop a user's timeline, it is rebuilt on the next read
+def invalidate(user_id):
+    get_store().delete(built_key(user_id))
+
+# Drop every timeline, for changes that bypass fanout_post
+def invalidate_all():
+    get_store().incr(GENERATION_KEY)
+
+
+# Rebuild a user's timeline from the posts of the authors they follow
+def rebuild(user_id, generation=None):
+    from models import Post, Follow, User
+    rows = db.session.query(Post.id, Post.timestamp).\
+            join(Follow, Follow.followed_id == Post.author_id).\
+            join(User, User.id == Post.author_id).\
+            filter(Follow.follower_id == user_id,
+                   User.follower_count <= current_app.config['TIMELINE_FANOUT_LIMIT']).\
+            order_by(Post.timestamp.desc(), Post.id.desc()).\
+            limit(current_app.config['TIMELINE_MAX_LENGTH']).all()
+    store = get_store()
+    if generation is None:
+        generation = int(store.get(GENERATION_KEY) or 0)
+    pipe = store.pipeline()
+    pipe.delete(timeline_key(user_id))
+    if rows:
+        pipe.zadd(timeline_key(user_id), {post_id: score(timestamp) for post_id, timestamp in rows})
+        pipe.expire(timeline_key(user_id), current_app.config['TIMELINE_TTL'])
+    pipe.set(built_key(user_id), generation, ex=current_app.config['TIMELINE_TTL'])
+    pipe.execute()
+    return len(rows)
+
+
+# The built marker holds the generation the timeline was built in
+def ensure_built(user_id):
+    built, generation = get_store().mget([built_key(user_id), GENERATION_KEY])
+    generation = int(generation or 0)
+    if built is None or int(built) != generation:
+        rebuild(user_id, generation)
+
+
+# Fan a new post out to the timelines of its author's followers in batches
+@celery.task
+def fanout_post(post_id):
+    from models import Post, Follow
+    post = Post.query.get(post_id)
+    if post is None or post.author is None:
+        return 0
+    if post.author.follower_count > current_app.config['TIMELINE_FANOUT_LIMIT']:
+        # Pulled by the followers at read time
+        return 0
+    batch_size = current_app.config['TIMELINE_BATCH_SIZE']
+    last_id = 0
+    pushed = 0
+    while True:
+        follower_ids = [row[0] for row in db.session.query(Follow.follower_id).
+                        filter(Follow.followed_id == post.author_id, Follow.follower_id > last_id).
+                        order_by(Follow.follower_id).limit(batch_size)]
+        if not follower_ids:
+            break
+        push(follower_ids, post.id, post.timestamp)
+        last_id = follower_ids[-1]
+        pushed += len(follower_ids)
+    return pushed
+
+
+# Authors followed by user whose posts are pulled rather than pushed
+def pulled_authors(user_id):
+    from models import Follow, User
+    rows = db.session.query(Follow.followed_id).\
+            join(User, User.id == Follow.followed_id).\
+            filter(Follow.follower_id == user_id,
+                   User.follower_count > current_app.config['TIMELINE_FANOUT_LIMIT']).all()
+    return [row[0] for row in rows]
+
+
+# Oldest score kept in a timeline trimmed to TIMELINE_MAX_LENGTH, None when
+# the timeline holds every post of the followed authors
+def window_floor(store, key):
+    pipe = store.pipeline(transaction=False)
+    pipe.zcard(key)
+    pipe.zrangebyscore(key, '-inf', '+inf', start=0, num=1, withscores=True)
+    length, oldest = pipe.execute()
+    if length < current_app.config['TIMELINE_MAX_LENGTH'] or not oldest:
+        return None
+    return oldest[0][1]
+
+
+# One keyset page of user's home timeline, newest first.
+# Merges the pushed post ids with posts pulled from high-follower authors
+# and loads the posts with a single IN query. Pages reaching past a trimmed
+# timeline come from the followed posts join instead.
+def page(user, per_page, after=None, before=None, options=()):
+    from models import Post
+    columns = (Post.timestamp, Post.id)
+    backwards = before is not None and after is None
+    token = before if backwards else after
+    cursor = decode_cursor(token, columns) if token is not None else None
+    limit = per_page + 1
+
+    ensure_built(user.id)
+    store = get_store()
+    key = timeline_key(user.id)
+    floor = window_floor(store, key)
+    if floor is not None and cursor is not None and score(cursor[0]) <= floor:
+        return paginate_keyset(user.followed_posts.options(*options), columns, per_page,
+                               after=after, before=before)
+    # Entries sharing the cursor's score are fetched again, leave room for them
+    fetch = limit + per_page
+    if backwards:
+        entries = store.zrangebyscore(key, score(cursor[0]), '+inf', start=0, num=fetch, withscores=True)
+    else:
+        max_score = score(cursor[0]) if cursor is not None else '+inf'
+        entries = store.zrevrangebyscore(key, max_score, '-inf', start=0, num=fetch, withscores=True)
+    candidates = {int(member): entry_score for member, entry_score in entries}
+
+    pulled = {}
+    authors = pulled_authors(user.id)
+    if authors:
+        query = Post.query.options(*options).filter(Post.author_id.in_(authors))
+        if cursor is not None:
+            query = query.filter(seek_condition(columns, cursor, descending=not backwards))
+        ordering = (Post.timestamp.asc(), Post.id.asc()) if backwards else \
+                   (Post.timestamp.desc(), Post.id.desc())
+        for post in query.order_by(*ordering).limit(limit):
+            pulled[post.id] = post
+            candidates[post.id] = score(post.timestamp)
+
+    keys = sorted(((entry_score, post_id) for post_id, entry_score in candidates.items()),
+                  reverse=not backwards)
+    if cursor is not None:
+        cursor_key = (score(cursor[0]), cursor[1])
+        keys = [k for k in keys if (k > cursor_key if backwards else k < cursor_key)]
+    more = len(keys) > per_page
+    if floor is not None and not backwards and not more:
+        # The page runs into the trimmed part of the timeline
+        return paginate_keyset(user.followed_posts.options(*options), columns, per_page,
+                               after=after, before=before)
+    ids = [post_id for _, post_id in keys[:per_page]]
+
+    missing = [post_id for post_id in ids if post_id not in pulled]
+    posts = dict(pulled)
+    if missing:
+        posts.update((post.id, post) for post in Post.query.options(*options).filter(Post.id.in_(missing)))
+        deleted = [post_id for post_id in missing if post_id not in posts]
+        if deleted:
+            store.zrem(key, *deleted)
+    items = [posts[post_id] for post_id in ids if post_id in posts]
+    if backwards:
+        items.reverse()
+        return KeysetPagination(items, columns, has_prev=more, has_next=True)
+    return KeysetPagination(items, columns, has_prev=cursor is not None, has_next=more)
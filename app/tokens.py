@@ -0,0 +1,33 @@
+from app import principals
+from app.kvstore import get_store
+
+# Version of the API token format
+TOKEN_VERSION = 2
+
+
+def generation_key(user_id):
+    return 'token:{}:generation'.format(user_id)
+
+
+# Token generations of a user: their own, bumped to revoke all of their
+# tokens, and the roles version shared with the principal cache, which
+# retires the permission claims of every access token
+def generations(user_id):
+    user_generation, roles_generation = get_store().mget([generation_key(user_id),
+                                                          principals.ROLES_VERSION_KEY])
+    return int(user_generation or 0), int(roles_generation or 0)
+
+
+def revoke(*user_ids):
+    store = get_store()
+    for user_id in user_ids:
+        store.incr(generation_key(user_id))
+
+
+# Check the generation claims of a decoded token
+def is_current(data):
+    user_generation, roles_generation = generations(data['token_id'])
+    if data.get('gen') != user_generation:
+        return False
+    # Refresh tokens read permissions from the database when used
+    return data.get('typ') == 'refresh' or data.get('rgen') == roles_generation
@@ -0,0 +1,215 @@
+import csv
+import io
+import itertools
+import json
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+from werkzeug.security import generate_password_hash
+from app import db, page_cache
+
+# Columns that may be given in an import file besides the credentials
+PROFILE_COLUMNS = ('first_name', 'middle_name', 'last_name', 'address', 'job_title',
+                   'bio', 'mobile_no', 'country')
+# Fields read as text from an import row
+TEXT_FIELDS = ('username', 'email', 'password', 'password_hash', 'role') + PROFILE_COLUMNS
+
+RowError = namedtuple('RowError', ['line', 'message'])
+ImportResult = namedtuple('ImportResult', ['imported', 'errors'])
+
+
+# Stream (line number, row dict) pairs from a CSV or JSON lines file
+def read_rows(stream, format):
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            row = None
+        yield line, row if isinstance(row, dict) else {'__invalid__': True}
+
+
+def parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def hash_password(method, salt_length, password):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+# Bulk importer for user accounts.
+# Roles are resolved once, rows are validated and de-duplicated in memory
+# and against the database a chunk at a time, passwords are hashed in a
+# process pool and users plus their self-follow rows are inserted with one
+# statement per table and chunk (COPY on Postgres). Bad rows are reported
+# and skipped, the rest of the file is still imported.
+class UserImporter:
+    def __init__(self, chunk_size=1000, processes=None):
+        from models import Role, User
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.roles = {role.name.lower(): role.id for role in Role.query}
+        default = Role.query.filter_by(default=True).first()
+        self.default_role_id = default.id if default is not None else None
+        self.admin_email = (current_app.config['SANTA_ADMIN'] or '').lower()
+        self.method = current_app.config['PASSWORD_HASH_METHOD']
+        self.salt_length = current_app.config['PASSWORD_SALT_LENGTH']
+        # Limits of the length-bound columns, checked before the database sees them
+        self.lengths = {column.name: column.type.length for column in User.__table__.c
+                        if getattr(column.type, 'length', None)}
+        self.usernames = set()
+        self.emails = set()
+        self.errors = []
+        self.imported = 0
+
+    def run(self, rows, echo=None):
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk, pool)
+                if echo is not None:
+                    echo(f'{self.imported} user(s) imported, {len(self.errors)} error(s)')
+        if self.imported:
+            page_cache.invalidate()
+        return ImportResult(self.imported, sorted(self.errors))
+
+    def error(self, line, message):
+        self.errors.append(RowError(line, message))
+
+    # Validated insert values, or None when the row is rejected
+    def prepare(self, line, row):
+        if row.get('__invalid__'):
+            return self.error(line, 'not a JSON object')
+        for field in TEXT_FIELDS:
+            value = row.get(field)
+            if value is not None and not isinstance(value, str):
+                return self.error(line, f'{field} must be a string')
+            if value and field in self.lengths and len(value) > self.lengths[field]:
+                return self.error(line, f'{field} is longer than {self.lengths[field]} characters')
+        username = (row.get('username') or '').strip()
+        email = (row.get('email') or '').strip().lower()
+        if not username:
+            return self.error(line, 'invalid username')
+        if '@' not in email:
+            return self.error(line, 'invalid email')
+        if username in self.usernames:
+            return self.error(line, f'duplicate username {username}')
+        if email in self.emails:
+            return self.error(line, f'duplicate email {email}')
+        password, password_hash = row.get('password'), row.get('password_hash')
+        if not password and not password_hash:
+            return self.error(line, 'missing password')
+        role_name = (row.get('role') or '').strip().lower()
+        if role_name and role_name not in self.roles:
+            return self.error(line, f'unknown role {role_name}')
+        if role_name:
+            role_id = self.roles[role_name]
+        elif self.admin_email and email == self.admin_email:
+            role_id = self.roles.get('administrator', self.default_role_id)
+        else:
+            role_id = self.default_role_id
+        values = {
+            'username': username, 'email': email, 'password_hash': password_hash,
+            'confirmed': parse_bool(row.get('confirmed')), 'user_terms': False,
+            'image': 'default.jpg', 'header': 'header.jpg', 'role_id': role_id,
+            'post_count': 0, 'follower_count': 1, 'following_count': 1, 'updated_at': datetime.utcnow(),
+        }
+        values.update((column, row.get(column) or None) for column in PROFILE_COLUMNS)
+        self.usernames.add(username)
+        self.emails.add(email)
+        return line, values, password
+
+    def import_chunk(self, chunk, pool):
+        from models import User
+        prepared = [entry for entry in (self.prepare(line, row) for line, row in chunk)
+                    if entry is not None]
+        if not prepared:
+            return
+        # Accounts that already exist
+        users = User.__table__
+        taken = db.session.execute(
+            select(users.c.username, users.c.email).where(
+                users.c.username.in_([values['username'] for _, values, _ in prepared]) |
+                users.c.email.in_([values['email'] for _, values, _ in prepared]))).all()
+        taken_usernames = {username for username, _ in taken}
+        taken_emails = {email for _, email in taken}
+        accepted = []
+        for line, values, password in prepared:
+            if values['username'] in taken_usernames:
+                self.error(line, f'username {values["username"]} already exists')
+            elif values['email'] in taken_emails:
+                self.error(line, f'email {values["email"]} already exists')
+            else:
+                accepted.append((line, values, password))
+        to_hash = [(index, password) for index, (_, values, password) in enumerate(accepted)
+                   if not values['password_hash']]
+        hashes = pool.map(hash_password, itertools.repeat(self.method), itertools.repeat(self.salt_length),
+                          [password for _, password in to_hash], chunksize=max(len(to_hash) // 32, 1))
+        for (index, _), password_hash in zip(to_hash, hashes):
+            accepted[index][1]['password_hash'] = password_hash
+        try:
+            self.insert([values for _, values, _ in accepted])
+        except (IntegrityError, DataError):
+            # Lost a race with another writer, or a value the database
+            # refused: isolate the rows that fail
+            db.session.rollback()
+            for line, values, _ in accepted:
+                try:
+                    self.insert([values])
+                except IntegrityError:
+                    db.session.rollback()
+                    self.error(line, 'username or email already exists')
+                except DataError as e:
+                    db.session.rollback()
+                    self.error(line, f'invalid value: {e.orig}')
+
+    # Insert users and their self-follows, then commit
+    def insert(self, rows):
+        from models import User, Follow
+        if not rows:
+            return
+        users = User.__table__
+        connection = db.session.connection()
+        copy_rows(connection, users, rows)
+        ids = db.session.execute(select(users.c.id).where(
+            users.c.username.in_([row['username'] for row in rows]))).scalars().all()
+        now = datetime.utcnow()
+        copy_rows(connection, Follow.__table__,
+                  [{'follower_id': user_id, 'followed_id': user_id, 'date_followed': now} for user_id in ids])
+        db.session.commit()
+        self.imported += len(rows)
+
+
+# COPY the rows on Postgres, executemany elsewhere. COPY runs on the raw
+# DBAPI cursor, so its errors are wrapped like those of a statement.
+def copy_rows(connection, table, rows):
+    if connection.dialect.name != 'postgresql':
+        connection.execute(table.insert(), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    statement = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'.format(
+        table.name, ', '.join(columns))
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except connection.dialect.dbapi.Error as e:
+        raise DBAPIError.instance(statement, None, e, connection.dialect.dbapi.Error,
+                                  dialect=connection.dialect) from e
@@ -0,0 +1,59 @@
+from flask import g
+from app import db
+
+
+# Request-scoped batching loader for users.
+# Ids are collected with prime() while a page or a JSON collection is being
+# prepared and resolved with a single IN query on the first load(). Loaded
+# users also land in the session identity map, so lazy many-to-one loads
+# such as post.author are answered without SQL afterwards.
+class UserLoader:
+    def __init__(self):
+        self.cache = {}
+        self.pending = set()
+
+    def prime(self, user_ids):
+        self.pending.update(user_id for user_id in user_ids
+                            if user_id is not None and user_id not in self.cache)
+
+    def load(self, user_id):
+        if user_id is None:
+            return None
+        if user_id not in self.cache:
+            self.pending.add(user_id)
+            self.dispatch()
+        return self.cache.get(user_id)
+
+    def load_many(self, user_ids):
+        user_ids = list(user_ids)
+        self.prime(user_ids)
+        self.dispatch()
+        return [self.cache.get(user_id) for user_id in user_ids]
+
+    def dispatch(self):
+        from models import User
+        pending, self.pending = self.pending - set(self.cache), set()
+        if not pending:
+            return
+        # Users already in the session need no query
+        mapper = db.inspect(User)
+        for user_id in list(pending):
+            user = db.session.identity_map.get(mapper.identity_key_from_primary_key((user_id,)))
+            if user is not None:
+                self.cache[user_id] = user
+                pending.discard(user_id)
+        if pending:
+            for user in User.query.filter(User.id.in_(pending)):
+                self.cache[user.id] = user
+        for user_id in pending:
+            self.cache.setdefault(user_id, None)
+
+
+# Get the loader of the current request
+def user_loader():
+    if 'user_loader' not in g:
+        g.user_loader = UserLoader()
+    return g.user_loader
+
+def get_user(user_id):
+    return user_loader().load(user_id)
@@ -0,0 +1,65 @@
+"""Pages per second when serializing API post collections.
+
+    python benchmarks/api_serialization.py --per-page 100
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from flask.json.provider import DefaultJSONProvider
+from app import create_app, db, json_provider
+from app.api.serializers import posts_to_json
+from app.user_loader import user_loader
+from models import Role, User, Post
+
+
+def setup(per_page):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        Role.insert_roles()
+        users = [User(password='cat', username=f'user{i}', email=f'user{i}@example.com') for i in range(10)]
+        db.session.add_all(users)
+        db.session.add_all(Post(title=f'Post {i}', body_html=f'<p>Body of post {i} ' + 'words ' * 100 + '</p>',
+                                author=users[i % len(users)]) for i in range(per_page))
+        db.session.commit()
+    return app
+
+
+# Serialize the same page over and over, starting each round from a cold
+# user loader like a new request would
+def run(app, provider, serialize, seconds):
+    with app.test_request_context():
+        posts = Post.query.options(*Post.api_list_options()).all()
+        pages = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            user_loader().cache.clear()
+            provider.response({'posts': serialize(posts), 'prev': None, 'next': None}).get_data()
+            pages += 1
+        return pages / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+    app = setup(args.per_page)
+    providers = [('stdlib', DefaultJSONProvider(app))]
+    if json_provider.orjson is not None:
+        providers.append(('orjson', json_provider.OrjsonProvider(app)))
+    serializers = [('to_json', lambda posts: [post.to_json() for post in posts]), ('batched', posts_to_json)]
+    for provider_name, provider in providers:
+        for serializer_name, serialize in serializers:
+            rate = run(app, provider, serialize, args.seconds)
+            print(f'{serializer_name:8} {provider_name:7} {rate:8.1f} pages/s '
+                  f'{rate * args.per_page:10.0f} posts/s')
+
+
+if __name__ == '__main__':
+    main()
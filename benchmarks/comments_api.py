@@ -0,0 +1,82 @@
+"""Latency of comment API pages for a post with many comments.
+
+    python benchmarks/comments_api.py --comments 100000
+    TEST_DATABASE_URL=postgresql://... python benchmarks/comments_api.py
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from app import create_app, db
+from app.user_import import copy_rows
+from models import Role, User, Post, Comment
+
+
+def setup(count):
+    app = create_app('testing')
+    app.app_context().push()
+    db.create_all()
+    Role.insert_roles()
+    users = [User(password='cat', username=f'user{i}', email=f'user{i}@example.com', confirmed=True)
+             for i in range(100)]
+    post = Post(title='Popular post', body_html='<p>Body</p>', author=users[0])
+    db.session.add_all(users + [post])
+    db.session.commit()
+    start = datetime.utcnow() - timedelta(days=30)
+    user_ids = [user.id for user in users]
+    for first in range(0, count, 10000):
+        copy_rows(db.session.connection(), Comment.__table__, [
+            {'body': f'Comment {i}', 'comment_date': start + timedelta(seconds=i), 'disabled': i % 50 == 0,
+             'post_id': post.id, 'author_id': user_ids[i % len(user_ids)]}
+            for i in range(first, min(first + 10000, count))])
+        db.session.commit()
+    db.session.execute(Post.__table__.update().values(comment_count=count))
+    db.session.commit()
+    return app, post.id
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=100000)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    app, post_id = setup(args.comments)
+    app.config['API_COMMENTS_PER_PAGE'] = args.per_page
+    client = app.test_client()
+    headers = {'Authorization': 'Basic ' + base64.b64encode(b'user0@example.com:cat').decode()}
+
+    # Walk to a few depths once, keeping the cursor of each
+    depths = [0, args.comments // 2 // args.per_page, args.comments // args.per_page - 1]
+    urls = {}
+    url = f'/api/v1/posts/{post_id}/comments/'
+    page = 0
+    while url and page <= depths[-1]:
+        if page in depths:
+            urls[page] = url
+        url = client.get(url, headers=headers).get_json()['next']
+        page += 1
+
+    for depth, url in urls.items():
+        keyset, _ = timed(lambda: client.get(url, headers=headers), args.repeat)
+        offset_query = Comment.query.filter(Comment.post_id == post_id).\
+            order_by(Comment.comment_date, Comment.id).offset(depth * args.per_page).limit(args.per_page)
+        offset, _ = timed(lambda: offset_query.all(), args.repeat)
+        print(f'page {depth:6}: API request {keyset:7.2f} ms, OFFSET query alone {offset:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
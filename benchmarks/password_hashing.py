@@ -0,0 +1,47 @@
+"""Logins per second per core for a password hashing method.
+
+    python benchmarks/password_hashing.py --method pbkdf2:sha256:260000
+    python benchmarks/password_hashing.py --mode process --processes 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+def run(method, mode, processes, seconds):
+    password_hash = generate_password_hash('correct horse battery staple', method=method)
+    verified = 0
+    started = time.perf_counter()
+    if mode == 'process':
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            while time.perf_counter() - started < seconds:
+                batch = [pool.submit(check_password_hash, password_hash, 'correct horse battery staple')
+                         for _ in range(processes * 4)]
+                verified += sum(future.result() for future in batch)
+    else:
+        processes = 1
+        while time.perf_counter() - started < seconds:
+            verified += check_password_hash(password_hash, 'correct horse battery staple')
+    elapsed = time.perf_counter() - started
+    return verified / elapsed, verified / elapsed / processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', default=os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:260000')
+    parser.add_argument('--mode', choices=['inline', 'process'], default='inline')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    total, per_core = run(args.method, args.mode, args.processes, args.seconds)
+    print(f'{args.method} ({args.mode}): {total:.1f} logins/s, {per_core:.1f} logins/s per core')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Latency of tag listings: the index walk of app.tags against a join per
+tag.
+
+    python benchmarks/tag_intersection.py --posts 100000
+    TEST_DATABASE_URL=postgresql://... python benchmarks/tag_intersection.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from sqlalchemy.orm import aliased
+from app import create_app, db, tags
+from app.counters import reconcile
+from app.user_import import copy_rows
+from models import Role, User, Post, Tag, PostTag
+
+# Share of the posts carrying each tag
+FREQUENCIES = {'common': 0.5, 'frequent': 0.3, 'rare': 0.01}
+
+
+def setup(count):
+    app = create_app('testing')
+    app.app_context().push()
+    db.create_all()
+    Role.insert_roles()
+    user = User(password='cat', username='author', email='author@example.com', confirmed=True)
+    db.session.add(user)
+    db.session.add_all(Tag(name=name) for name in FREQUENCIES)
+    db.session.commit()
+    tag_ids = {tag.name: tag.id for tag in Tag.query}
+    rng = random.Random(1)
+    start = datetime.utcnow() - timedelta(days=365)
+    for first in range(1, count + 1, 10000):
+        posts, links = [], []
+        for post_id in range(first, min(first + 10000, count + 1)):
+            timestamp = start + timedelta(minutes=post_id)
+            posts.append({'id': post_id, 'title': f'Post {post_id}', 'slug': f'post-{post_id}',
+                          'body': 'Body', 'excerpt': 'Body', 'timestamp': timestamp, 'author_id': user.id})
+            links.extend({'post_id': post_id, 'tag_id': tag_ids[name], 'post_timestamp': timestamp}
+                         for name, frequency in FREQUENCIES.items() if rng.random() < frequency)
+        copy_rows(db.session.connection(), Post.__table__, posts)
+        copy_rows(db.session.connection(), PostTag.__table__, links)
+        db.session.commit()
+    reconcile()
+    return app
+
+
+# The same page read with one join of post_tags per tag
+def joined_page(found, per_page):
+    query = Post.query
+    for tag in found:
+        link = aliased(PostTag)
+        query = query.join(link, (link.post_id == Post.id) & (link.tag_id == tag.id))
+    return query.order_by(Post.timestamp.desc(), Post.id.desc()).limit(per_page + 1).all()
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--per-page', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    setup(args.posts)
+    for names in (['common'], ['common', 'frequent'], ['frequent', 'rare'], ['common', 'frequent', 'rare']):
+        found = tags.lookup('+'.join(names))
+        merged, page = timed(lambda: tags.page(found, args.per_page), args.repeat)
+        joined, rows = timed(lambda: joined_page(found, args.per_page), args.repeat)
+        assert [post.id for post in page.items] == [post.id for post in rows[:args.per_page]]
+        print(f'{"+".join(names):24}: index walk {merged:7.2f} ms, joins {joined:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
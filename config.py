@@ -21,11 +21,106 @@ class Config:
     # Posts per page
     BLOG_POSTS_PER_PAGE = 9
     COMMENTS_PER_PAGE = 3
+    # Reply levels shown below each comment thread
+    COMMENT_THREAD_DEPTH = 3
+    FOLLOWERS_PER_PAGE = 50
+    POST_EXCERPT_LENGTH = 150
+    SEARCH_RESULTS_PER_PAGE = 10
+    # Tags: per post, combinable in one listing, index keys read per batch
+    # while intersecting tags, and how many times larger than the rarest
+    # tag a tag may be to be merged with it rather than probed
+    TAGS_PER_POST = 10
+    TAG_INTERSECTION_LIMIT = 4
+    TAG_SCAN_BATCH_SIZE = 500
+    TAG_MERGE_RATIO = 8
+    POPULAR_TAGS_COUNT = 10
+
+    # Logged in user cache (in-process LRU in front of Redis)
+    PRINCIPAL_CACHE_SIZE = 1024
+    PRINCIPAL_CACHE_TIMEOUT = 3600
+
+    # API token lifetimes in seconds
+    API_TOKEN_EXPIRATION = 3600
+    API_REFRESH_TOKEN_EXPIRATION = 30 * 24 * 3600
+
+    # Cache-Control of API GET responses by endpoint; clients revalidate with
+    # the ETag/Last-Modified validators by default
+    API_CACHE_CONTROL = {
+        'api.get_post': 'private, max-age=0, must-revalidate',
+        'api.get_user': 'private, max-age=60',
+    }
+    API_CACHE_CONTROL_DEFAULT = 'private, no-cache'
+
+    # Items accepted by the batch API endpoints and lifetime of the
+    # idempotency keys of batch created posts
+    API_BATCH_MAX_ITEMS = 100
+    API_IDEMPOTENCY_KEY_TIMEOUT = 24 * 3600
+
+    # Comments per page of the comments API
+    API_COMMENTS_PER_PAGE = 50
+    API_THREADS_PER_PAGE = 10
+    API_TAGS_PER_PAGE = 100
+
+    # Rows fetched from the server-side cursor at a time by the NDJSON exports
+    API_EXPORT_BATCH_SIZE = 1000
+
+    # API Basic auth: verified credential cache and password hashing pool
+    API_CREDENTIAL_CACHE_SIZE = 4096
+    API_CREDENTIAL_CACHE_TIMEOUT = 300
+    API_PASSWORD_HASH_WORKERS = 4
+    API_PASSWORD_HASH_QUEUE = 16
+    API_PASSWORD_HASH_TIMEOUT = 5
+
+    # Password hashing: Werkzeug method string, 'inline' or 'process' verification
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:260000'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_MODE = os.environ.get('PASSWORD_HASH_MODE') or 'inline'
+    PASSWORD_HASH_PROCESSES = os.cpu_count() or 1
+    
+    # Sign ins verified at once per client address and per username
+    LOGIN_CONCURRENCY_PER_IP = 4
+    LOGIN_CONCURRENCY_PER_USERNAME = 1
+    LOGIN_SLOT_TIMEOUT = 30
+
+    # Post body sanitization (None keeps the bleach defaults)
+    SANITIZER_ALLOWED_TAGS = None
+    SANITIZER_ALLOWED_ATTRIBUTES = None
+    SANITIZER_ALLOWED_PROTOCOLS = None
+    SANITIZER_ASYNC = os.environ.get('SANITIZER_ASYNC', '').lower() in ('1', 'true')
+    SANITIZER_CACHE_SIZE = 1024
+    SANITIZER_CACHE_TIMEOUT = 24 * 3600
+
+    # JSON encoding: 'orjson', 'stdlib' or 'auto' (orjson when installed)
+    JSON_ENCODER = os.environ.get('JSON_ENCODER') or 'auto'
+
+    # Full-text search: 'postgres', 'memory' or 'auto' (by database)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    SEARCH_LANGUAGE_CONFIGS = {'en': 'english', 'es': 'spanish', 'de': 'german', 'fr': 'french'}
     
     # Celery Config
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
     
+    # Redis (caches and cross-worker invalidation)
+    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    
+    # Number of posts shown in the "Recent Posts" sidebar
+    RECENT_POSTS_COUNT = 5
+    
+    # Home timelines: entries kept per user, follower count above which an
+    # author's posts are pulled at read time instead of fanned out,
+    # followers handled per fan-out batch and lifetime of a built timeline
+    # (seconds)
+    TIMELINE_MAX_LENGTH = 800
+    TIMELINE_FANOUT_LIMIT = 10000
+    TIMELINE_BATCH_SIZE = 1000
+    TIMELINE_TTL = 7 * 24 * 3600
+    
+    # Full page cache for anonymous visitors (seconds)
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_TIMEOUT = 300
+    PAGE_CACHE_LOCK_TIMEOUT = 5
+    
     
 
     @staticmethod
@@ -39,6 +134,8 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
+    REDIS_URL = None
+    CELERY_ALWAYS_EAGER = True
 
 class ProductionConfig(Config):
     pass
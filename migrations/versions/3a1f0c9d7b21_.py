@@ -0,0 +1,54 @@
+"""add denormalized counters
+
+Revision ID: 3a1f0c9d7b21
+Revises: 25838db0bc02
+Create Date: 2026-10-18 09:12:40.215316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1f0c9d7b21'
+down_revision = '25838db0bc02'
+branch_labels = None
+depends_on = None
+
+# Rows backfilled per statement
+CHUNK_SIZE = 5000
+
+# (table, counter column, counted table, foreign key on the counted table)
+COUNTERS = [
+    ('posts', 'comment_count', 'comments', 'post_id'),
+    ('users', 'post_count', 'posts', 'author_id'),
+    ('users', 'follower_count', 'follows', 'followed_id'),
+    ('users', 'following_count', 'follows', 'follower_id'),
+]
+
+
+def backfill(table, column, counted, foreign_key):
+    connection = op.get_bind()
+    max_id = connection.execute(sa.text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+    statement = sa.text(
+        f'UPDATE {table} SET {column} = '
+        f'(SELECT COUNT(*) FROM {counted} WHERE {counted}.{foreign_key} = {table}.id) '
+        f'WHERE {table}.id BETWEEN :start AND :end')
+    for start in range(1, max_id + 1, CHUNK_SIZE):
+        connection.execute(statement, {'start': start, 'end': start + CHUNK_SIZE - 1})
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+    for counter in COUNTERS:
+        backfill(*counter)
+
+
+def downgrade():
+    op.drop_column('users', 'following_count')
+    op.drop_column('users', 'follower_count')
+    op.drop_column('users', 'post_count')
+    op.drop_column('posts', 'comment_count')
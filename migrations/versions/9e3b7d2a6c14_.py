@@ -0,0 +1,110 @@
+"""precomputed excerpts of post bodies
+
+Revision ID: 9e3b7d2a6c14
+Revises: f2a8c61d5b37
+Create Date: 2026-10-18 18:05:47.302611
+
+"""
+from html import escape
+from html.parser import HTMLParser
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b7d2a6c14'
+down_revision = 'f2a8c61d5b37'
+branch_labels = None
+depends_on = None
+
+# Length of the backfilled excerpts, the POST_EXCERPT_LENGTH default
+EXCERPT_LENGTH = 150
+BATCH_SIZE = 1000
+
+# Elements without a closing tag
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                           'meta', 'source', 'track', 'wbr'])
+
+
+# Frozen copy of app.sanitizer.make_excerpt as of this revision, so later
+# changes to the application code cannot alter what the migration writes
+class ExcerptParser(HTMLParser):
+    def __init__(self, length):
+        super().__init__(convert_charrefs=True)
+        self.remaining = length
+        self.parts = []
+        self.open_tags = []
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if not self.done:
+            self.parts.append(self.get_starttag_text())
+            if tag not in VOID_ELEMENTS:
+                self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.done:
+            self.parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if not self.done and tag in self.open_tags:
+            while self.open_tags:
+                open_tag = self.open_tags.pop()
+                self.parts.append(f'</{open_tag}>')
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data):
+        if self.done:
+            return
+        if len(data) <= self.remaining:
+            self.parts.append(escape(data, quote=False))
+            self.remaining -= len(data)
+            return
+        cut = data[:self.remaining]
+        # Do not end inside a word, unless it is the first one
+        if data[self.remaining:self.remaining + 1].strip():
+            if ' ' in cut:
+                cut = cut.rsplit(' ', 1)[0]
+            elif self.parts:
+                cut = ''
+        self.parts.append(escape(cut.rstrip(), quote=False) + '\u2026')
+        self.done = True
+
+    def excerpt(self):
+        self.close()
+        return ''.join(self.parts + [f'</{tag}>' for tag in reversed(self.open_tags)])
+
+
+def make_excerpt(html, length):
+    if not html:
+        return html
+    parser = ExcerptParser(length)
+    parser.feed(html)
+    return parser.excerpt()
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column('posts', sa.Column('excerpt', sa.Text(), nullable=True))
+    # ### end Alembic commands ###
+    connection = op.get_bind()
+    posts = sa.table('posts', sa.column('id', sa.Integer), sa.column('body', sa.Text),
+                     sa.column('excerpt', sa.Text))
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.select(posts.c.id, posts.c.body).where(posts.c.id > last_id).
+                                  order_by(posts.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        connection.execute(posts.update().where(posts.c.id == sa.bindparam('post_id')).
+                           values(excerpt=sa.bindparam('new_excerpt')),
+                           [{'post_id': post_id, 'new_excerpt': make_excerpt(body, EXCERPT_LENGTH)}
+                            for post_id, body in rows])
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_column('posts', 'excerpt')
+    # ### end Alembic commands ###
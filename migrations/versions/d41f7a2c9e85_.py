@@ -0,0 +1,48 @@
+"""full-text search index for posts
+
+Revision ID: d41f7a2c9e85
+Revises: b5d93a0e47c8
+Create Date: 2026-10-18 15:12:08.401337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7a2c9e85'
+down_revision = 'b5d93a0e47c8'
+branch_labels = None
+depends_on = None
+
+LANGUAGE_CONFIGS = {'en': 'english', 'es': 'spanish', 'de': 'german', 'fr': 'french'}
+
+
+# Only Postgres keeps the index in the database; other backends search in memory
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.create_table('post_search',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('language', sa.String(length=8), nullable=False),
+    sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'language')
+    )
+    op.create_index('ix_post_search_document', 'post_search', ['document'], unique=False, postgresql_using='gin')
+    for language, config in LANGUAGE_CONFIGS.items():
+        op.execute(sa.text(
+            "INSERT INTO post_search (post_id, language, document) "
+            "SELECT id, :language, "
+            "setweight(to_tsvector(CAST(:config AS regconfig), coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector(CAST(:config AS regconfig), "
+            "regexp_replace(coalesce(body, ''), '<[^>]+>', ' ', 'g')), 'B') "
+            "FROM posts").bindparams(language=language, config=config))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_post_search_document', table_name='post_search', postgresql_using='gin')
+    op.drop_table('post_search')
@@ -1,21 +1,27 @@
+import itertools
 import jwt
 from datetime import datetime, timedelta, timezone
-from app import db, login_manager, admin
+from app import db, login_manager, admin, recent_posts_index, search_index
 from flask import redirect, url_for, request, flash, current_app, abort
-from werkzeug.security import check_password_hash, generate_password_hash
 from flask_login import UserMixin, current_user, AnonymousUserMixin
 from flask_admin import AdminIndexView, BaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from sqlalchemy import event
+from sqlalchemy.orm import object_session, defer
+from sqlalchemy.orm.attributes import set_committed_value
 from slugify import slugify
 from app.exceptions import ValidationError
-import bleach
+from app.recent_posts import RecentPost
+from app.counters import adjust_counter, move_counter
+from app import page_cache
+from app.user_loader import get_user
+from app import principals, tokens, passwords, sanitizer, comment_threads, tags
 
 
 # User loader function
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return principals.load_principal(int(user_id))
     
 # Permission Class
 class Permission:
@@ -84,6 +90,9 @@ class Role(db.Model):
 # Follows association table as a model
 class Follow(db.Model):
     __tablename__ = "follows"
+    __table_args__ = (db.Index('ix_follows_followed_id_follower_id', 'followed_id', 'follower_id'),
+                      db.Index('ix_follows_followed_id_date_followed', 'followed_id', 'date_followed', 'follower_id'),
+                      db.Index('ix_follows_follower_id_date_followed', 'follower_id', 'date_followed', 'followed_id'))
     follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     date_followed = db.Column(db.DateTime, default=datetime.utcnow)
@@ -109,6 +118,12 @@ class User(UserMixin, db.Model):
     image = db.Column(db.String(120), default='default.jpg')
     header = db.Column(db.String(120), default='header.jpg')
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
+    post_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    follower_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    following_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped by every change to the row, used as API cache validators
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     followed = db.relationship('Follow', foreign_keys=[Follow.follower_id], 
                                backref=db.backref('follower', lazy='joined'),
@@ -138,16 +153,36 @@ class User(UserMixin, db.Model):
     # Set password
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
+        self.__dict__.pop('password_rehashed', None)
         
-    # Verify password
+    # Verify password, upgrading a hash made with an outdated method. The
+    # credentials stay the same, so the upgrade does not revoke API tokens.
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not passwords.check(self.password_hash, password):
+            return False
+        self.rehash_password(password)
+        return True
+
+    # Store a verified password again if its hash uses an outdated method
+    def rehash_password(self, password):
+        if not passwords.needs_rehash(self.password_hash):
+            return False
+        self.password = password
+        self.password_rehashed = True
+        return True
     
     
     # Role verification
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        return self.permission_mask() & perm == perm
+    
+    # Users loaded from the principal cache or a token carry their permission bitmask
+    def permission_mask(self):
+        permissions = self.__dict__.get('principal_permissions')
+        if permissions is None:
+            permissions = self.role.permissions if self.role is not None else 0
+        return permissions
     
     def is_administrator(self):
         return self.can(Permission.ADMIN)
@@ -236,10 +271,20 @@ class User(UserMixin, db.Model):
         db.session.add(self)
         return True
     
-    # token based authentication support
-    def generate_auth_token(self, expiration):
+    # token based authentication support.
+    # Access tokens carry the claims needed to authorize API calls (confirmed
+    # flag, permission bitmask) and are checked against the token generations
+    # only; refresh tokens are exchanged for new access tokens.
+    def generate_auth_token(self, expiration, kind='access'):
+        user_generation, roles_generation = tokens.generations(self.id)
         token = jwt.encode(payload={
+            'ver': tokens.TOKEN_VERSION,
+            'typ': kind,
             'token_id': self.id,
+            'confirmed': bool(self.confirmed),
+            'perms': self.permission_mask(),
+            'gen': user_generation,
+            'rgen': roles_generation,
             'exp': datetime.now(tz=timezone.utc) + timedelta(seconds=expiration)
         },
         key=current_app.config['SECRET_KEY'], algorithm="HS256")
@@ -247,13 +292,21 @@ class User(UserMixin, db.Model):
         return token
     
     @staticmethod
-    def verify_auth_token(token):
+    def verify_auth_token(token, kind='access'):
         try:
             data = jwt.decode(jwt=token, key=current_app.config['SECRET_KEY'], 
                               algorithms=["HS256"])
         except Exception as e:
             return None
-        return User.query.get(data.get('token_id'))
+        # Tokens from before the current format, including versionless ones,
+        # cannot be checked against the generations and are refused
+        if data.get('ver') != tokens.TOKEN_VERSION or data.get('typ') != kind \
+                or not tokens.is_current(data):
+            return None
+        if kind == 'refresh':
+            return User.query.get(data['token_id'])
+        return principals.build_user({'id': data['token_id'], 'confirmed': data['confirmed'],
+                                      'permissions': data['perms']})
     
     """Followers helpers method"""
     # Check whether a user is following another user
@@ -274,6 +327,15 @@ class User(UserMixin, db.Model):
         if f:
             db.session.delete(f)
             
+    # Subset of user_ids that this user follows, in one query
+    def following_among(self, user_ids):
+        user_ids = set(user_ids)
+        if self.id is None or not user_ids:
+            return set()
+        rows = db.session.query(Follow.followed_id).\
+                filter(Follow.follower_id == self.id, Follow.followed_id.in_(user_ids)).all()
+        return set(row[0] for row in rows)
+    
     # Check for followers
     def is_followed_by(self, user):
         if user.id is None:
@@ -301,7 +363,7 @@ class User(UserMixin, db.Model):
             'username': self.username,
             'posts_url': url_for('api.get_posts', id=self.id),
             'followed_posts_url': url_for('api.get_user_followed_posts', id=self.id),
-            'post_count': self.posts.count()
+            'post_count': self.post_count
         }
         
         return json_user
@@ -316,9 +378,26 @@ class Post(db.Model):
     slug = db.Column(db.String(180))
     body = db.Column(db.Text)
     body_html = db.Column(db.Text)
+    excerpt = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Set while body still has to be produced from body_html in the background
+    body_pending = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    tag_links = db.relationship('PostTag', backref='post', cascade='all, delete-orphan')
+    tags = db.relationship('Tag', secondary='post_tags', viewonly=True, order_by='Tag.name')
+    
+    # Loader options for listings: cards render the excerpt, API lists the body
+    @staticmethod
+    def card_options():
+        return (defer(Post.body), defer(Post.body_html))
+    
+    @staticmethod
+    def api_list_options():
+        return (defer(Post.body_html),)
     
     # Slugify posts
     @staticmethod
@@ -328,14 +407,16 @@ class Post(db.Model):
     
     # Converting post to json serializable dictionary
     def to_json(self):
+        author = get_user(self.author_id)
         json_post = {
             'url': url_for('api.get_post', id=self.id),
             'body': self.body,
             'slug': self.slug,
             'timestamp': self.timestamp,
-            'author_url': url_for('api.get_user', id=self.author_id),
+            'author': author.username if author is not None else None,
+            'author_url': url_for('api.get_user', id=self.author_id) if self.author_id else None,
             'comments_url': url_for('api.get_post_comments', id=self.id),
-            'comment_count': self.comments.count()
+            'comment_count': self.comment_count
         }
         
         return json_post
@@ -347,12 +428,15 @@ class Post(db.Model):
         body = json_post.get('body')
         if (body is None or body == "") or (title is None or title == ""):
             raise ValidationError('post does have a body or title')
-        return Post(title=title, body=body)
+        tag_names = tags.parse_tags(json_post.get('tags') or [])
+        post = Post(title=title, body_html=body)
+        tags.set_tags(post, tag_names)
+        return post
     
     # Cleaning HTML posts
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        target.body = bleach.linkify(bleach.clean(value, strip=True))
+        sanitizer.apply(target, value)
         
     
     def __repr__(self):
@@ -361,15 +445,264 @@ class Post(db.Model):
 db.event.listen(Post.title, 'set', Post.generate_slug, retval=False)
 db.event.listen(Post.body_html, 'set', Post.on_changed_body, retval=False)
 
+# Collect flushed post changes; they are applied to the recent posts index on commit
+def queue_post_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        changes = session.info.setdefault('recent_posts', {})
+        changes[target.id] = RecentPost(target.id, target.title, target.slug, target.timestamp)
+        state = db.inspect(target)
+        if state.attrs.title.history.has_changes() or state.attrs.body.history.has_changes():
+            search_index.stage(session, connection, target.id, (target.title, target.body))
+
+def queue_post_delete(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('recent_posts', {})[target.id] = None
+        search_index.stage(session, connection, target.id, None)
+
+def apply_post_changes(session):
+    changes = session.info.pop('recent_posts', None)
+    if changes:
+        recent_posts_index.apply(changes)
+    search_index.commit(session)
+    if session.info.pop('page_cache_dirty', None):
+        page_cache.invalidate()
+
+def discard_post_changes(session, previous_transaction=None):
+    session.info.pop('recent_posts', None)
+    search_index.discard(session)
+    session.info.pop('page_cache_dirty', None)
+
+# Cached pages are rendered from posts, tags, comments, follows and user profiles
+def track_page_changes(session, flush_context):
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, (Post, Comment, Follow, User, PostTag)):
+            session.info['page_cache_dirty'] = True
+            return
+
+db.event.listen(Post, 'after_insert', queue_post_change)
+db.event.listen(Post, 'after_update', queue_post_change)
+db.event.listen(Post, 'after_delete', queue_post_delete)
+db.event.listen(db.session, 'after_flush', track_page_changes)
+db.event.listen(db.session, 'after_commit', apply_post_changes)
+db.event.listen(db.session, 'after_rollback', discard_post_changes)
+
+# Cached principals are invalidated once user or role changes are committed
+def queue_principal_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('principal_changes', set()).add(target.id)
+        # New credentials or role revoke the API tokens of the user
+        state = db.inspect(target)
+        keys = ('email', 'role_id') if target.__dict__.pop('password_rehashed', False) else \
+               ('password_hash', 'email', 'role_id')
+        if any(state.attrs[key].history.has_changes() for key in keys):
+            session.info.setdefault('token_revocations', set()).add(target.id)
+
+def queue_principal_delete(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('principal_changes', set()).add(target.id)
+        session.info.setdefault('token_revocations', set()).add(target.id)
+
+def queue_role_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['principal_roles_dirty'] = True
+
+def apply_principal_changes(session):
+    user_ids = session.info.pop('principal_changes', None)
+    if user_ids:
+        principals.invalidate(*user_ids)
+    revoked = session.info.pop('token_revocations', None)
+    if revoked:
+        tokens.revoke(*revoked)
+    if session.info.pop('principal_roles_dirty', None):
+        principals.invalidate_roles()
+
+def discard_principal_changes(session, previous_transaction=None):
+    session.info.pop('principal_changes', None)
+    session.info.pop('token_revocations', None)
+    session.info.pop('principal_roles_dirty', None)
+
+db.event.listen(User, 'after_update', queue_principal_change)
+db.event.listen(User, 'after_delete', queue_principal_delete)
+db.event.listen(Role, 'after_update', queue_role_change)
+db.event.listen(Role, 'after_delete', queue_role_change)
+db.event.listen(db.session, 'after_commit', apply_principal_changes)
+db.event.listen(db.session, 'after_rollback', discard_principal_changes)
+
+# Client supplied keys of API created posts, so retried writes return the
+# post created the first time instead of a duplicate
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'))
+    created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    post = db.relationship('Post')
+
+# Tags and the posts carrying them. post_tags repeats the post timestamp so
+# the posts of a tag are listed straight from its index (see app.tags)
+class Tag(db.Model):
+    __tablename__ = 'tags'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    post_count = db.Column(db.Integer, default=0, server_default='0', nullable=False, index=True)
+    
+    def to_json(self):
+        return {
+            'name': self.name,
+            'posts_url': url_for('api.get_tag_posts', tag=self.name),
+            'post_count': self.post_count
+        }
+    
+    def __repr__(self):
+        return "<Tag %r>" %self.name
+
+class PostTag(db.Model):
+    __tablename__ = 'post_tags'
+    __table_args__ = (db.Index('ix_post_tags_tag_id_post_timestamp', 'tag_id', 'post_timestamp', 'post_id'),)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    post_timestamp = db.Column(db.DateTime, nullable=False)
+
+# Posts are inserted before their tag links, with their timestamp set
+def stamp_post_tag(mapper, connection, target):
+    if target.post_timestamp is None:
+        target.post_timestamp = target.post.timestamp
+
+# Keep the copied timestamps in step when a post is redated
+def sync_post_tag_timestamps(mapper, connection, target):
+    if db.inspect(target).attrs.timestamp.history.has_changes():
+        table = PostTag.__table__
+        connection.execute(table.update().where(table.c.post_id == target.id).
+                           values(post_timestamp=target.timestamp))
+
+db.event.listen(PostTag, 'before_insert', stamp_post_tag)
+db.event.listen(Post, 'after_update', sync_post_tag_timestamps)
+
+# Increment the version of updated rows in SQL, so concurrent writers and
+# counter updates issued on the flush connection are never lost
+def bump_version(mapper, connection, target):
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = mapper.columns['version'] + 1
+
+db.event.listen(User, 'before_update', bump_version)
+db.event.listen(Post, 'before_update', bump_version)
+
 # Comments model
 class Comment(db.Model):
     __tablename__ = "comments" 
+    __table_args__ = (db.Index('ix_comments_post_id_comment_date', 'post_id', 'comment_date', 'id'),
+                      db.Index('ix_comments_post_id_path', 'post_id', 'path'),
+                      db.Index('ix_comments_post_id_depth_path', 'post_id', 'depth', 'path'))
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     comment_date = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     disabled = db.Column(db.Boolean)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'))
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    # Reply threads: path holds the zero padded ids from the top-level
+    # comment down to this one, so a thread is a contiguous path range
+    parent_id = db.Column(db.Integer, db.ForeignKey('comments.id', name='fk_comments_parent_id_comments'))
+    path = db.Column(db.String(255))
+    depth = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    reply_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    parent = db.relationship('Comment', remote_side=[id])
+    
+    # Converting comment to json serializable dictionary; the body of a
+    # disabled comment is only shown to moderators
+    def to_json(self, can_moderate=False):
+        author = get_user(self.author_id)
+        json_comment = {
+            'url': url_for('api.get_comment', id=self.id),
+            'post_url': url_for('api.get_post', id=self.post_id),
+            'body': self.body if can_moderate or not self.disabled else None,
+            'comment_date': self.comment_date,
+            'disabled': bool(self.disabled),
+            'author': author.username if author is not None else None,
+            'author_url': url_for('api.get_user', id=self.author_id) if self.author_id else None,
+            'parent_url': url_for('api.get_comment', id=self.parent_id) if self.parent_id else None,
+            'depth': self.depth,
+            'reply_count': self.reply_count
+        }
+        
+        return json_comment
+    
+    # Creating a comment from a json (deserialization)
+    @staticmethod
+    def from_json(json_comment):
+        body = json_comment.get('body') if isinstance(json_comment, dict) else None
+        if not isinstance(body, str) or not body.strip():
+            raise ValidationError('comment does not have a body')
+        # Comment bodies are rendered as HTML on the blog
+        return Comment(body=sanitizer.sanitize(body))
+
+# Keep the denormalized counters in step with the rows they count
+def count_comment_insert(mapper, connection, target):
+    adjust_counter(connection, target, Post, 'comment_count', target.post_id, 1)
+    adjust_counter(connection, target, Comment, 'reply_count', target.parent_id, 1)
+
+def count_comment_delete(mapper, connection, target):
+    adjust_counter(connection, target, Post, 'comment_count', target.post_id, -1)
+    adjust_counter(connection, target, Comment, 'reply_count', target.parent_id, -1)
+
+def count_comment_update(mapper, connection, target):
+    move_counter(connection, target, Post, 'comment_count', 'post_id')
+
+def count_post_insert(mapper, connection, target):
+    adjust_counter(connection, target, User, 'post_count', target.author_id, 1)
+
+def count_post_delete(mapper, connection, target):
+    adjust_counter(connection, target, User, 'post_count', target.author_id, -1)
+
+def count_post_update(mapper, connection, target):
+    move_counter(connection, target, User, 'post_count', 'author_id')
+
+def count_follow_insert(mapper, connection, target):
+    adjust_counter(connection, target, User, 'follower_count', target.followed_id, 1)
+    adjust_counter(connection, target, User, 'following_count', target.follower_id, 1)
+
+def count_follow_delete(mapper, connection, target):
+    adjust_counter(connection, target, User, 'follower_count', target.followed_id, -1)
+    adjust_counter(connection, target, User, 'following_count', target.follower_id, -1)
+
+def count_post_tag_insert(mapper, connection, target):
+    adjust_counter(connection, target, Tag, 'post_count', target.tag_id, 1)
+
+def count_post_tag_delete(mapper, connection, target):
+    adjust_counter(connection, target, Tag, 'post_count', target.tag_id, -1)
+
+# The path of a comment ends with its own id, known once it is inserted
+def place_comment(mapper, connection, target):
+    table = Comment.__table__
+    path, depth = comment_threads.segment(target.id), 0
+    if target.parent_id is not None:
+        parent_path, parent_depth = connection.execute(
+            db.select(table.c.path, table.c.depth).where(table.c.id == target.parent_id)).one()
+        path, depth = f'{parent_path}.{path}', parent_depth + 1
+    # Not an edit: keep updated_at from bumping past the insert
+    connection.execute(table.update().where(table.c.id == target.id).
+                       values(path=path, depth=depth, updated_at=table.c.updated_at))
+    set_committed_value(target, 'path', path)
+    set_committed_value(target, 'depth', depth)
+
+db.event.listen(Comment, 'after_insert', place_comment)
+db.event.listen(Comment, 'after_insert', count_comment_insert)
+db.event.listen(Comment, 'after_delete', count_comment_delete)
+db.event.listen(Comment, 'after_update', count_comment_update)
+db.event.listen(Post, 'after_insert', count_post_insert)
+db.event.listen(Post, 'after_delete', count_post_delete)
+db.event.listen(Post, 'after_update', count_post_update)
+db.event.listen(Follow, 'after_insert', count_follow_insert)
+db.event.listen(Follow, 'after_delete', count_follow_delete)
+db.event.listen(PostTag, 'after_insert', count_post_tag_insert)
+db.event.listen(PostTag, 'after_delete', count_post_tag_delete)
 
 # Anonymous class to check for Anonymous Permissions
 class AnonymousUser(AnonymousUserMixin):
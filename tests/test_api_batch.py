@@ -0,0 +1,85 @@
+import base64
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from models import Role, User, Post
+
+class APIBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def headers(self):
+        credentials = base64.b64encode(b'abc@email.com:cat').decode()
+        return {'Authorization': 'Basic ' + credentials}
+
+    """Define Tests"""
+
+    def test_get_by_ids_in_one_query(self):
+        posts = [Post(title=f'post {i}', body_html='body', author=self.user) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.commit()
+        ids = [posts[2].id, 999, posts[0].id]
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM posts' in statement:
+                statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            response = self.client.get('/api/v1/posts/?ids=' + ','.join(map(str, ids)), headers=self.headers())
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([post['url'] for post in data['posts']],
+                         [f'/api/v1/posts/{posts[2].id}', f'/api/v1/posts/{posts[0].id}'])
+        self.assertEqual(data['missing'], [999])
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(self.client.get('/api/v1/posts/?ids=a', headers=self.headers()).status_code, 400)
+
+    def test_batch_create_with_idempotency_keys(self):
+        payload = {'posts': [
+            {'title': 'one', 'body': '<b>one</b><script>x</script>', 'idempotency_key': 'k1'},
+            {'title': '', 'body': 'missing title'},
+            {'title': 'two', 'body': 'two', 'idempotency_key': 'k2'},
+        ]}
+        response = self.client.post('/api/v1/posts:batch', json=payload, headers=self.headers())
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 201])
+        self.assertEqual(results[0]['post']['body'], '<b>one</b>x')
+        self.assertEqual(Post.query.count(), 2)
+
+        # Retrying returns the same posts instead of creating new ones
+        response = self.client.post('/api/v1/posts:batch', json=payload, headers=self.headers())
+        retried = response.get_json()['results']
+        self.assertEqual([result['status'] for result in retried], [200, 400, 200])
+        self.assertEqual(retried[2]['post']['url'], results[2]['post']['url'])
+        self.assertEqual(Post.query.count(), 2)
+        self.assertEqual(db.session.get(User, self.user.id).post_count, 2)
+
+    def test_edit_post(self):
+        post = Post(title='one', body_html='one', author=self.user)
+        other = User(password='dog', username='other', email='other@email.com', confirmed=True)
+        db.session.add_all([post, other])
+        db.session.commit()
+        response = self.client.put(f'/api/v1/posts/{post.id}', json={'body': '<b>edited</b><script>x</script>'},
+                                   headers=self.headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['body'], '<b>edited</b>x')
+        credentials = base64.b64encode(b'other@email.com:dog').decode()
+        response = self.client.put(f'/api/v1/posts/{post.id}', json={'body': 'not mine'},
+                                   headers={'Authorization': 'Basic ' + credentials})
+        self.assertEqual(response.status_code, 403)
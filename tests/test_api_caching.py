@@ -0,0 +1,69 @@
+import base64
+import unittest
+from app import create_app, db
+from models import Role, User, Post, Comment
+
+class APICachingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        self.post = Post(title='one', body_html='body', author=self.user)
+        db.session.add_all([self.user, self.post])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def get(self, url, **headers):
+        credentials = base64.b64encode(b'abc@email.com:cat').decode()
+        return self.client.get(url, headers=dict(headers, Authorization='Basic ' + credentials))
+
+    """Define Tests"""
+
+    def test_post_revalidation(self):
+        url = f'/api/v1/posts/{self.post.id}'
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(response.headers['Cache-Control'], 'private, max-age=0, must-revalidate')
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.get(url, **{'If-Modified-Since': response.headers['Last-Modified']}).status_code,
+                         304)
+        # A new comment changes the comment count, so the representation
+        db.session.add(Comment(body='hi', post=self.post, author=self.user))
+        db.session.commit()
+        response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.get_json()['comment_count'], 1)
+
+    def test_edits_bump_versions(self):
+        self.assertEqual(self.post.version, 1)
+        self.post.title = 'two'
+        db.session.commit()
+        self.assertEqual(self.post.version, 2)
+        version = self.user.version
+        self.user.username = 'abcd'
+        db.session.commit()
+        self.assertEqual(self.user.version, version + 1)
+
+    def test_timeline_revalidation(self):
+        url = f'/api/v1/users/{self.user.id}/posts/'
+        response = self.get(url)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+        self.user.username = 'renamed'
+        db.session.commit()
+        response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['posts'][0]['author'], 'renamed')
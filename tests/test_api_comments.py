@@ -0,0 +1,77 @@
+import base64
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from models import Role, User, Post, Comment
+
+class APICommentsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        self.moderator = User(password='dog', username='mod', email='mod@email.com', confirmed=True,
+                              role=Role.query.filter_by(name='Moderator').first())
+        self.post = Post(title='one', body_html='body', author=self.user)
+        db.session.add_all([self.user, self.moderator, self.post])
+        start = datetime.utcnow() - timedelta(hours=1)
+        db.session.add_all([Comment(body=f'comment {i}', post=self.post, comment_date=start + timedelta(minutes=i),
+                                    author=self.user if i % 2 else self.moderator, disabled=i == 3)
+                            for i in range(7)])
+        db.session.commit()
+        self.app.config['API_COMMENTS_PER_PAGE'] = 3
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def headers(self, email='abc@email.com', password='cat'):
+        credentials = base64.b64encode(f'{email}:{password}'.encode()).decode()
+        return {'Authorization': 'Basic ' + credentials}
+
+    """Define Tests"""
+
+    def test_post_comments_pages(self):
+        url = f'/api/v1/posts/{self.post.id}/comments/'
+        bodies = []
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        while url:
+            del statements[:]
+            event.listen(db.engine, 'before_cursor_execute', before_execute)
+            try:
+                data = self.client.get(url, headers=self.headers()).get_json()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_execute)
+            bodies.extend(comment['body'] for comment in data['comments'])
+            self.assertEqual(data['count'], 7)
+            url = data['next']
+            # The caller, then the authors of the page in one query
+            self.assertLessEqual(len([s for s in statements if 'FROM users' in s]), 2)
+        self.assertEqual(bodies, ['comment 0', 'comment 1', 'comment 2', None, 'comment 4', 'comment 5',
+                                  'comment 6'])
+        # Moderators see the bodies of disabled comments
+        comment = Comment.query.filter_by(disabled=True).first()
+        data = self.client.get(f'/api/v1/comments/{comment.id}',
+                               headers=self.headers('mod@email.com', 'dog')).get_json()
+        self.assertEqual(data['body'], 'comment 3')
+
+    def test_new_and_moderated_comment(self):
+        response = self.client.post(f'/api/v1/posts/{self.post.id}/comments/',
+                                    json={'body': 'hi <script>x</script>'}, headers=self.headers())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['body'], 'hi x')
+        self.assertEqual(db.session.get(Post, self.post.id).comment_count, 8)
+        url = response.headers['Location']
+        self.assertEqual(self.client.put(url, json={'disabled': True}, headers=self.headers()).status_code, 403)
+        response = self.client.put(url, json={'disabled': True}, headers=self.headers('mod@email.com', 'dog'))
+        self.assertTrue(response.get_json()['disabled'])
+        self.assertIsNone(self.client.get(url, headers=self.headers()).get_json()['body'])
+        self.assertEqual(self.client.post(f'/api/v1/posts/{self.post.id}/comments/', json={},
+                                          headers=self.headers()).status_code, 400)
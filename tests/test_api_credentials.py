@@ -0,0 +1,64 @@
+import base64
+import unittest
+from unittest import mock
+from app import create_app, db, passwords
+from app.api.credentials import get_verifier
+from models import Role, User
+
+class APICredentialsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def get(self, password):
+        credentials = base64.b64encode(f'abc@email.com:{password}'.encode()).decode()
+        return self.client.get('/api/v1/posts/', headers={'Authorization': 'Basic ' + credentials})
+
+    """Define Tests"""
+
+    def test_verified_credentials_are_cached(self):
+        self.assertEqual(self.get('cat').status_code, 200)
+        with mock.patch('app.passwords.check_password_hash') as check:
+            self.assertEqual(self.get('cat').status_code, 200)
+            check.return_value = False
+            self.assertEqual(self.get('dog').status_code, 401)
+        self.assertEqual(check.call_count, 1)
+
+    def test_password_change_invalidates(self):
+        self.assertEqual(self.get('cat').status_code, 200)
+        self.user.password = 'dog'
+        db.session.commit()
+        self.assertEqual(self.get('cat').status_code, 401)
+        self.assertEqual(self.get('dog').status_code, 200)
+
+    def test_busy_pool_is_rejected(self):
+        verifier = get_verifier()
+        with mock.patch.object(verifier.slots, 'acquire', return_value=False):
+            response = self.get('cat')
+        self.assertEqual(response.status_code, 503)
+
+    # Misses take a login slot like web sign ins
+    def test_login_slots(self):
+        with passwords.login_slot('127.0.0.1', 'abc@email.com'):
+            self.assertEqual(self.get('cat').status_code, 503)
+        self.assertEqual(self.get('cat').status_code, 200)
+
+    def test_rehash_on_login(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        self.assertTrue(passwords.needs_rehash(self.user.password_hash))
+        self.assertEqual(self.get('cat').status_code, 200)
+        db.session.refresh(self.user)
+        self.assertEqual(passwords.hash_method(self.user.password_hash), 'pbkdf2:sha256:1000')
+        self.assertEqual(self.get('cat').status_code, 200)
@@ -0,0 +1,69 @@
+import base64
+import gzip
+import json
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from models import Role, User, Post, Comment
+
+class APIExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.admin = User(password='cat', username='admin', email='admin@email.com', confirmed=True,
+                          role=Role.query.filter_by(name='Administrator').first())
+        self.user = User(password='dog', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add_all([self.admin, self.user])
+        db.session.add_all([Post(title=f'post {i}', body_html='body', author=self.user) for i in range(5)])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def get(self, url, email='admin@email.com', password='cat', **headers):
+        credentials = base64.b64encode(f'{email}:{password}'.encode()).decode()
+        return self.client.get(url, headers=dict(headers, Authorization='Basic ' + credentials))
+
+    """Define Tests"""
+
+    def test_export_posts(self):
+        self.app.config['API_EXPORT_BATCH_SIZE'] = 2
+        response = self.get('/api/v1/export/posts')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['title'] for row in rows], [f'post {i}' for i in range(5)])
+        self.assertEqual(self.get('/api/v1/export/posts', 'abc@email.com', 'dog').status_code, 403)
+
+    def test_incremental_gzip_export(self):
+        since = datetime.utcnow() - timedelta(minutes=1)
+        db.session.add(Comment(body='new', post=Post.query.first(), author=self.user,
+                               comment_date=datetime.utcnow()))
+        db.session.add(Comment(body='old', post=Post.query.first(), author=self.user,
+                               comment_date=since - timedelta(days=1), updated_at=since - timedelta(days=1)))
+        db.session.commit()
+        response = self.get('/api/v1/export/comments?since=' + since.isoformat(), **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        rows = [json.loads(line) for line in gzip.decompress(response.get_data()).splitlines()]
+        self.assertEqual([row['body'] for row in rows], ['new'])
+        self.assertIn('X-Export-Until', response.headers)
+        self.assertEqual(self.get('/api/v1/export/comments?since=yesterday').status_code, 400)
+
+    def test_incremental_export_moderation(self):
+        since = datetime.utcnow() - timedelta(minutes=1)
+        comment = Comment(body='old', post=Post.query.first(), author=self.user,
+                          comment_date=since - timedelta(days=1), updated_at=since - timedelta(days=1))
+        db.session.add(comment)
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/export/comments?since=' + since.isoformat()).get_data(), b'')
+        comment.disabled = True
+        db.session.commit()
+        response = self.get('/api/v1/export/comments?since=' + since.isoformat())
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([(row['body'], row['disabled']) for row in rows], [('old', True)])
@@ -0,0 +1,75 @@
+import base64
+import json
+import unittest
+from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from app import create_app, db, json_provider
+from app.api.serializers import posts_to_json, users_to_json
+from models import Role, User, Post
+
+class SerializersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(self.user)
+        db.session.add_all([Post(title=f'post {i}', body_html=f'body {i}', author=self.user) for i in range(3)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    """Define Tests"""
+
+    def test_collections_match_to_json(self):
+        with self.app.test_request_context():
+            posts = Post.query.all()
+            self.assertEqual(posts_to_json(posts), [post.to_json() for post in posts])
+            self.assertEqual(users_to_json([self.user]), [self.user.to_json()])
+
+    @unittest.skipIf(json_provider.orjson is None, 'orjson is not installed')
+    def test_orjson_output_matches_default(self):
+        payload = {'b': [1, 2.5, None, True], 'a': 'text', 'when': datetime(2022, 5, 1, 12, 30)}
+        fast = json_provider.OrjsonProvider(self.app)
+        default = DefaultJSONProvider(self.app)
+        self.assertEqual(fast.dumps(payload), default.dumps(payload, separators=(',', ':')))
+        self.assertEqual(json.loads(fast.dumps(payload))['when'], 'Sun, 01 May 2022 12:30:00 GMT')
+
+    def test_api_posts_page(self):
+        credentials = base64.b64encode(b'abc@email.com:cat').decode()
+        response = self.app.test_client().get('/api/v1/posts/', headers={'Authorization': 'Basic ' + credentials})
+        self.assertEqual(response.status_code, 200)
+        posts = response.get_json()['posts']
+        self.assertEqual(len(posts), 3)
+        self.assertEqual(posts[0]['author_url'], f'/api/v1/users/{self.user.id}')
+
+    def test_sparse_fields_and_expansion(self):
+        credentials = base64.b64encode(b'abc@email.com:cat').decode()
+        headers = {'Authorization': 'Basic ' + credentials}
+        client = self.app.test_client()
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM posts' in statement:
+                statements.append(statement)
+        db.event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            response = client.get('/api/v1/posts/?fields=id,title', headers=headers)
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', before_execute)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.get_json()['posts'][0]), ['id', 'title'])
+        self.assertTrue(statements)
+        self.assertTrue(all('posts.body' not in statement for statement in statements))
+
+        response = client.get('/api/v1/posts/?fields=title,author&expand=author', headers=headers)
+        author = response.get_json()['posts'][0]['author']
+        self.assertEqual(author['username'], 'abc')
+        self.assertEqual(author['url'], f'/api/v1/users/{self.user.id}')
+        self.assertEqual(client.get('/api/v1/posts/?fields=secret', headers=headers).status_code, 400)
+        self.assertEqual(client.get(f'/api/v1/users/{self.user.id}?fields=username',
+                                    headers=headers).get_json(), {'username': 'abc'})
@@ -0,0 +1,75 @@
+import base64
+import unittest
+from datetime import datetime, timedelta, timezone
+import jwt
+from sqlalchemy import event
+from flask import current_app
+from app import create_app, db
+from models import Role, User
+
+class APITokensTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def headers(self, username, password=''):
+        credentials = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        return {'Authorization': 'Basic ' + credentials}
+
+    def get_tokens(self):
+        response = self.client.post('/api/v1/tokens/', headers=self.headers('abc@email.com', 'cat'))
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    """Define Tests"""
+
+    # Access tokens authenticate and authorize without queries
+    def test_access_token_needs_no_queries(self):
+        token = self.get_tokens()['token']
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        db.session.remove()
+        engine = db.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        try:
+            response = self.client.post('/api/v1/tokens/refresh', headers=self.headers(token))
+            self.assertEqual(response.status_code, 401)
+            response = self.client.delete('/api/v1/tokens/', headers=self.headers(token))
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_execute)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(statements, [])
+
+    def test_refresh_and_revoke(self):
+        tokens = self.get_tokens()
+        self.assertEqual(self.client.get('/api/v1/posts/', headers=self.headers(tokens['refresh_token'])).status_code, 401)
+        response = self.client.post('/api/v1/tokens/refresh', headers=self.headers(tokens['refresh_token']))
+        self.assertEqual(response.status_code, 200)
+        token = response.get_json()['token']
+        self.assertEqual(self.client.get('/api/v1/posts/', headers=self.headers(token)).status_code, 200)
+        self.user.password = 'dog'
+        db.session.commit()
+        self.assertEqual(self.client.get('/api/v1/posts/', headers=self.headers(token)).status_code, 401)
+        response = self.client.post('/api/v1/tokens/refresh', headers=self.headers(tokens['refresh_token']))
+        self.assertEqual(response.status_code, 401)
+
+    # Tokens without a format version skip the revocation checks, so they are refused
+    def test_versionless_token(self):
+        token = jwt.encode(payload={'token_id': self.user.id,
+                                    'exp': datetime.now(tz=timezone.utc) + timedelta(seconds=3600)},
+                           key=current_app.config['SECRET_KEY'], algorithm='HS256')
+        self.assertIsNone(User.verify_auth_token(token))
+        self.assertEqual(self.client.get('/api/v1/posts/', headers=self.headers(token)).status_code, 401)
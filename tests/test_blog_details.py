@@ -0,0 +1,65 @@
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from models import Role, User, Post, Comment
+
+class BlogDetailsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['PAGE_CACHE_ENABLED'] = False
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        self.posts = [Post(title=f'post {i}', body_html='body', author=self.user) for i in range(3)]
+        db.session.add_all([self.user] + self.posts)
+        db.session.commit()
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as session:
+            session['lang_code'] = 'en'
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def add_comments(self, post, count):
+        commenters = [User(password='cat', username=f'c{post.id}-{i}', email=f'c{post.id}-{i}@email.com')
+                      for i in range(count)]
+        db.session.add_all(commenters)
+        db.session.add_all([Comment(body='comment', post=post, author=commenter) for commenter in commenters])
+        db.session.commit()
+
+    def render(self, post):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        url = f'/en/blog/{post.id}/{post.slug}'
+        db.session.expire_all()
+        engine = db.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        try:
+            response = self.client.get(url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_execute)
+        self.assertEqual(response.status_code, 200)
+        return response, len(statements)
+
+    """Define Tests"""
+
+    # The page costs the same number of statements however many comments exist
+    def test_query_count_is_flat(self):
+        self.add_comments(self.posts[0], 2)
+        self.add_comments(self.posts[1], 25)
+        self.render(self.posts[0])
+        _, few = self.render(self.posts[0])
+        response, many = self.render(self.posts[1])
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 2)
+        self.assertIn(b'post 0', response.data)
+        self.assertIn(b'post 2', response.data)
+
+    def test_missing_post(self):
+        response = self.client.get('/en/blog/99/missing')
+        self.assertEqual(response.status_code, 404)
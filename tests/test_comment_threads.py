@@ -0,0 +1,115 @@
+import base64
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.comment_threads import thread_page, subtree, segment
+from app.counters import reconcile
+from models import Role, User, Post, Comment
+
+class CommentThreadsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        self.post = Post(title='one', body_html='body', author=self.user)
+        self.other = Post(title='two', body_html='body', author=self.user)
+        db.session.add_all([self.user, self.post, self.other])
+        db.session.commit()
+        # Five threads; the second one gets replies three levels deep
+        self.roots = [self.comment(f'root {i}') for i in range(5)]
+        self.reply = self.comment('reply', self.roots[1])
+        self.nested = self.comment('nested', self.reply)
+        self.deepest = self.comment('deepest', self.nested)
+        self.second = self.comment('second reply', self.roots[1])
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def comment(self, body, parent=None):
+        comment = Comment(body=body, post=self.post, author=self.user, parent=parent)
+        db.session.add(comment)
+        db.session.commit()
+        return comment
+
+    def headers(self):
+        return {'Authorization': 'Basic ' + base64.b64encode(b'abc@email.com:cat').decode()}
+
+    """Define Tests"""
+
+    def test_paths(self):
+        root = self.roots[1]
+        self.assertEqual(root.path, segment(root.id))
+        self.assertEqual(self.nested.path, '.'.join(segment(c.id) for c in (root, self.reply, self.nested)))
+        self.assertEqual([c.depth for c in (root, self.reply, self.nested, self.deepest)], [0, 1, 2, 3])
+        db.session.expire_all()
+        self.assertEqual(root.reply_count, 2)
+        self.assertEqual(self.reply.reply_count, 1)
+        self.assertFalse(any(reconcile().values()))
+
+    def test_thread_page(self):
+        post_id = self.post.id
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            page = thread_page(post_id, per_page=2, max_depth=2)
+            [comment.author.username for comment in page.comments]
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([c.body for c in page.comments], ['root 4', 'root 3'])
+        page = thread_page(self.post.id, per_page=2, max_depth=2, after=page.next_cursor)
+        # Newest threads first, replies in the order they were written
+        self.assertEqual([c.body for c in page.comments],
+                         ['root 2', 'root 1', 'reply', 'nested', 'second reply'])
+        self.assertTrue(page.has_prev and page.has_next)
+        last = thread_page(self.post.id, per_page=2, max_depth=2, after=page.next_cursor)
+        self.assertEqual([c.body for c in last.comments], ['root 0'])
+        self.assertFalse(last.has_next)
+        back = thread_page(self.post.id, per_page=2, max_depth=2, before=last.prev_cursor)
+        self.assertEqual([c.id for c in back.items], [c.id for c in page.items])
+        self.assertEqual([c.body for c in subtree(self.reply, 1)], ['reply', 'nested'])
+
+    def test_api_threads(self):
+        response = self.client.get(f'/api/v1/posts/{self.post.id}/threads/?depth=1', headers=self.headers())
+        data = response.get_json()
+        self.assertEqual(len(data['threads']), 5)
+        thread = data['threads'][3]
+        self.assertEqual(thread['body'], 'root 1')
+        self.assertEqual(thread['reply_count'], 2)
+        self.assertEqual([r['body'] for r in thread['replies']], ['reply', 'second reply'])
+        self.assertEqual(thread['replies'][0]['replies'], [])
+        response = self.client.get(f'/api/v1/comments/{self.reply.id}/replies/', headers=self.headers())
+        data = response.get_json()
+        self.assertEqual(data['replies'][0]['replies'][0]['body'], 'deepest')
+
+    def test_api_reply(self):
+        url = f'/api/v1/posts/{self.post.id}/comments/'
+        response = self.client.post(url, json={'body': 'answer', 'parent_id': self.second.id},
+                                    headers=self.headers())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['depth'], 2)
+        # Replies stay within their post
+        response = self.client.post(f'/api/v1/posts/{self.other.id}/comments/',
+                                    json={'body': 'answer', 'parent_id': self.second.id}, headers=self.headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_blog_details(self):
+        self.app.config['COMMENTS_PER_PAGE'] = 10
+        self.app.config['COMMENT_THREAD_DEPTH'] = 2
+        html = self.client.get(f'/en/blog/{self.post.id}/{self.post.slug}').get_data(as_text=True)
+        self.assertIn('nested', html)
+        self.assertNotIn('deepest', html)
+        self.assertIn(f'thread={self.nested.id}', html)
+        html = self.client.get(f'/en/blog/{self.post.id}/{self.post.slug}?thread={self.nested.id}').\
+            get_data(as_text=True)
+        self.assertIn('deepest', html)
+        self.assertNotIn('root 4', html)
@@ -0,0 +1,73 @@
+import unittest
+from app import create_app, db
+from app.counters import reconcile
+from models import Role, User, Post, Comment
+
+class CountersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(password='cat', username='abc', email='abc@email.com')
+        self.u2 = User(password='dog', username='def', email='def@email.com')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    """Define Tests"""
+
+    # Self follows are counted like the dynamic relationships count them
+    def test_new_user_counters(self):
+        self.assertEqual(self.u1.follower_count, 1)
+        self.assertEqual(self.u1.following_count, 1)
+        self.assertEqual(self.u1.post_count, 0)
+
+    def test_follow_counters(self):
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u2.follower_count, 2)
+        self.assertEqual(self.u1.following_count, 2)
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u2.follower_count, self.u2.followers.count())
+        self.assertEqual(self.u1.following_count, self.u1.followed.count())
+
+    def test_post_and_comment_counters(self):
+        post = Post(title='title', body_html='body', author=self.u1)
+        db.session.add(post)
+        db.session.add_all([Comment(body='c', post=post, author=self.u2) for _ in range(3)])
+        db.session.commit()
+        self.assertEqual(post.comment_count, 3)
+        self.assertEqual(self.u1.post_count, 1)
+        db.session.delete(post.comments.first())
+        db.session.commit()
+        self.assertEqual(post.comment_count, 2)
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(self.u1.post_count, 0)
+
+    # Counters are rolled back with the change they count
+    def test_counters_roll_back(self):
+        db.session.add(Post(title='title', body_html='body', author=self.u1))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.u1.post_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        db.session.add(Post(title='title', body_html='body', author=self.u1))
+        db.session.commit()
+        db.session.execute(User.__table__.update().values(post_count=7, follower_count=0))
+        db.session.commit()
+        repaired = reconcile(chunk_size=1)
+        self.assertEqual(repaired['users.post_count'], 2)
+        self.assertEqual(repaired['users.follower_count'], 2)
+        db.session.expire_all()
+        self.assertEqual(self.u1.post_count, 1)
+        self.assertEqual(self.u2.post_count, 0)
+        self.assertEqual(self.u1.follower_count, 1)
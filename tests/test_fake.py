@@ -0,0 +1,63 @@
+import unittest
+from app import create_app, db, recent_posts_index, search_index, timeline
+from app.main.utils import fake
+from models import Role, User, Post, Comment, Follow
+
+class FakeDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def generate(self, processes):
+        fake.fake_users(50, seed=3, chunk_size=20, processes=processes)
+        fake.fake_follows(5, seed=3, chunk_size=20, processes=processes)
+        fake.fake_posts(40, seed=3, chunk_size=15, processes=processes)
+        fake.fake_comments(60, seed=3, chunk_size=25, processes=processes)
+        fake.finish()
+        return (
+            [(user.username, user.follower_count, user.post_count) for user in User.query.order_by(User.id)],
+            sorted((follow.follower_id, follow.followed_id) for follow in Follow.query),
+            [(post.title, post.author_id, post.comment_count) for post in Post.query.order_by(Post.id)],
+            [(comment.body, comment.post_id) for comment in Comment.query.order_by(Comment.id)],
+        )
+
+    """Define Tests"""
+
+    # The same seed gives the same data, however many processes generate it
+    def test_deterministic(self):
+        first = self.generate(processes=1)
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        second = self.generate(processes=2)
+        self.assertEqual(first, second)
+        self.assertEqual([len(rows) for rows in first], [50, len(first[1]), 40, 60])
+        self.assertGreater(len(first[1]), 50)
+        self.assertTrue(User.query.get(1).verify_password(fake.FAKE_PASSWORD))
+        # Rows are written without the ORM defaults, so they carry their own update times
+        self.assertTrue(all(post.updated_at >= post.timestamp for post in Post.query))
+
+    # Bulk inserted posts reach the timelines and indexes built before them
+    def test_finish_refreshes_caches(self):
+        fake.fake_users(5, seed=3, processes=1)
+        author = User.query.first()
+        timeline.ensure_built(author.id)
+        self.assertEqual(recent_posts_index.get(), [])
+        self.assertEqual(search_index.search('anything', 'en').items, [])
+        fake.fake_posts(10, seed=3, processes=1)
+        fake.finish()
+        newest = Post.query.order_by(Post.timestamp.desc(), Post.id.desc())
+        self.assertEqual([post.id for post in recent_posts_index.get()],
+                         [post.id for post in newest.limit(5)])
+        self.assertEqual([post.id for post in timeline.page(author, per_page=20).items],
+                         [post.id for post in newest.filter_by(author_id=author.id)])
+        post = Post.query.first()
+        self.assertIn(post, search_index.search(post.title, 'en').items)
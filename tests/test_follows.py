@@ -0,0 +1,100 @@
+import base64
+import unittest
+from datetime import datetime, timedelta
+from flask import g
+from sqlalchemy import event
+from app import create_app, db
+from models import Role, User, Follow
+
+class FollowsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FOLLOWERS_PER_PAGE'] = 2
+        self.app.config['PAGE_CACHE_ENABLED'] = False
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.star = User(password='cat', username='star', email='star@email.com', confirmed=True)
+        self.users = [User(password='cat', username=f'user{i}', email=f'user{i}@email.com', confirmed=True)
+                      for i in range(5)]
+        db.session.add_all([self.star] + self.users)
+        db.session.commit()
+        start = datetime.utcnow() - timedelta(days=1)
+        # Followed in pairs at the same moment, so the id breaks the ties.
+        # Users follow themselves when created, which is the newest follow.
+        for i, user in enumerate(self.users):
+            db.session.add(Follow(follower_id=user.id, followed_id=self.star.id,
+                                  date_followed=start + timedelta(minutes=i // 2)))
+            if i % 2 == 0:
+                db.session.add(Follow(follower_id=self.star.id, followed_id=user.id,
+                                      date_followed=start + timedelta(minutes=i // 4)))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def headers(self):
+        return {'Authorization': 'Basic ' + base64.b64encode(b'star@email.com:cat').decode()}
+
+    # Usernames listed on every page walking forwards, checked against the
+    # pages walked back through the prev links
+    def walk(self, url, key):
+        pages = []
+        while url:
+            data = self.client.get(url, headers=self.headers()).get_json()
+            pages.append((data['prev'], [item['user']['username'] for item in data[key]]))
+            url = data['next']
+        for (prev, _), (_, names) in zip(pages[1:], pages):
+            data = self.client.get(prev, headers=self.headers()).get_json()
+            self.assertEqual([item['user']['username'] for item in data[key]], names)
+        self.assertIsNone(pages[0][0])
+        return [name for _, names in pages for name in names]
+
+    """Define Tests"""
+
+    def test_api_pages(self):
+        # (date_followed, follower_id) descending
+        self.assertEqual(self.walk(f'/api/v1/users/{self.star.id}/followers/', 'followers'),
+                         ['star', 'user4', 'user3', 'user2', 'user1', 'user0'])
+        self.assertEqual(self.walk(f'/api/v1/users/{self.star.id}/following/', 'following'),
+                         ['star', 'user4', 'user2', 'user0'])
+        data = self.client.get(f'/api/v1/users/{self.star.id}/followers/', headers=self.headers()).get_json()
+        self.assertEqual([item['followed_by_you'] for item in data['followers']], [True, True])
+        data = self.client.get(data['next'], headers=self.headers()).get_json()
+        self.assertEqual([item['followed_by_you'] for item in data['followers']], [False, True])
+
+    def test_malformed_cursor(self):
+        response = self.client.get(f'/api/v1/users/{self.star.id}/followers/?after=garbage', headers=self.headers())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/en/followers/star?before=e30').status_code, 400)
+        self.assertEqual(self.client.get('/en/following/star?after=!!').status_code, 400)
+
+    def test_html_pages(self):
+        html = self.client.get('/en/followers/star').get_data(as_text=True)
+        self.assertIn('user4', html)
+        self.assertNotIn('user3', html)
+        self.assertIn('after=', html)
+        html = self.client.get('/en/following/star').get_data(as_text=True)
+        self.assertIn('user4', html)
+        self.assertNotIn('user2', html)
+
+    def test_following_among(self):
+        ids = [user.id for user in self.users] + [999]
+        # Reload the committed user before counting
+        db.session.refresh(self.star)
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            followed = self.star.following_among(ids)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        self.assertEqual(followed, {self.users[0].id, self.users[2].id, self.users[4].id})
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(self.users[1].following_among(ids), {self.users[1].id})
+        self.assertEqual(self.star.following_among([]), set())
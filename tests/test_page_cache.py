@@ -0,0 +1,118 @@
+import unittest
+from flask import g
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy import event
+from app import create_app, db, page_cache
+from app.tags import set_tags
+from models import Role, User, Post, Comment, Follow
+
+class PageCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        self.other = User(password='dog', username='def', email='def@email.com', confirmed=True)
+        self.post = Post(title='one', body_html='body', author=self.user)
+        db.session.add_all([self.user, self.other, self.post])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    # Response to a GET of /en/blog and whether the view ran
+    def get_blog(self, **headers):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM posts' in statement:
+                statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            response = self.client.get('/en/blog', headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        return response, bool(statements)
+
+    def log_in(self):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.user.id)
+            session['_fresh'] = True
+        # Requests share the test's app context, drop the user loaded before
+        g.pop('_login_user', None)
+
+    """Define Tests"""
+
+    def test_anonymous_hit(self):
+        response, rendered = self.get_blog()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(rendered)
+        cached, rendered = self.get_blog()
+        self.assertFalse(rendered)
+        self.assertEqual(cached.get_data(), response.get_data())
+        self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+
+    def test_bypass(self):
+        self.get_blog()
+        self.log_in()
+        self.assertTrue(self.get_blog()[1])
+        self.assertTrue(self.get_blog()[1])
+        self.client.get('/auth/logout')
+        with self.client.session_transaction() as session:
+            session.pop('_flashes', None)
+            session['_flashes'] = [('info', 'hello')]
+        self.assertTrue(self.get_blog()[1])
+        with self.app.test_request_context('/en/blog', method='POST'):
+            self.assertTrue(page_cache.bypass())
+        with self.app.test_request_context('/en/blog'):
+            self.assertFalse(page_cache.bypass())
+
+    def test_conditional(self):
+        response, _ = self.get_blog()
+        etag = response.headers['ETag']
+        self.assertEqual(self.get_blog(**{'If-None-Match': etag})[0].status_code, 304)
+        since = response.headers['Last-Modified']
+        self.assertEqual(self.get_blog(**{'If-Modified-Since': since})[0].status_code, 304)
+        self.assertEqual(self.get_blog(**{'If-None-Match': '"other"'})[0].status_code, 200)
+
+    def test_invalidation(self):
+        changes = [
+            lambda: db.session.add(Post(title='two', body_html='body', author=self.user)),
+            lambda: db.session.add(Comment(body='hi', post=self.post, author=self.other)),
+            lambda: db.session.add(Follow(follower_id=self.other.id, followed_id=self.user.id)),
+            lambda: set_tags(self.post, ['news']),
+        ]
+        for change in changes:
+            before = page_cache.generation()
+            change()
+            db.session.commit()
+            self.assertEqual(page_cache.generation(), before + 1)
+        before = page_cache.generation()
+        db.session.add(Post(title='three', body_html='body', author=self.user))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(page_cache.generation(), before)
+        # A new generation means the page is rendered again
+        self.get_blog()
+        db.session.add(Post(title='four', body_html='body', author=self.user))
+        db.session.commit()
+        self.assertTrue(self.get_blog()[1])
+
+    # Pages with a CSRF token are rendered for every visitor
+    def test_csrf_pages(self):
+        pages = []
+        for client in (self.app.test_client(), self.app.test_client()):
+            g.pop('csrf_token', None)
+            response = client.get(f'/en/blog/{self.post.id}/{self.post.slug}')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(g.csrf_token, response.get_data(as_text=True))
+            pages.append(g.csrf_token)
+        self.assertNotEqual(pages[0], pages[1])
+        g.pop('csrf_token', None)
+        with self.app.test_request_context('/en/blog'):
+            self.assertFalse(page_cache.session_bound('<p>body</p>'))
+            self.assertTrue(page_cache.session_bound(f'<input value="{generate_csrf()}">'))
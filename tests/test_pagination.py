@@ -0,0 +1,53 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.exceptions import ValidationError
+from app.pagination import paginate_keyset
+from models import Role, User, Post
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user = User(password='cat', username='abc', email='abc@email.com')
+        now = datetime.utcnow()
+        # posts 3 and 4 share a timestamp to exercise the id tie breaker
+        for i in range(7):
+            timestamp = now - timedelta(minutes=3 if i in (3, 4) else i)
+            db.session.add(Post(title=f'post {i}', body_html='body', author=user, timestamp=timestamp))
+        db.session.add(user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def page(self, **kwargs):
+        return paginate_keyset(Post.query, (Post.timestamp, Post.id), per_page=3, **kwargs)
+
+    """Define Tests"""
+
+    def test_walk_forward_and_back(self):
+        first = self.page()
+        self.assertFalse(first.has_prev)
+        self.assertTrue(first.has_next)
+        second = self.page(after=first.next_cursor)
+        third = self.page(after=second.next_cursor)
+        self.assertFalse(third.has_next)
+        titles = [p.title for p in first.items + second.items + third.items]
+        self.assertEqual(titles, ['post 0', 'post 1', 'post 2', 'post 4', 'post 3', 'post 5', 'post 6'])
+
+        back = self.page(before=third.prev_cursor)
+        self.assertEqual(back.items, second.items)
+        self.assertTrue(back.has_prev)
+        back = self.page(before=back.prev_cursor)
+        self.assertEqual(back.items, first.items)
+        self.assertFalse(back.has_prev)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValidationError):
+            self.page(after='not-a-cursor')
@@ -0,0 +1,91 @@
+import base64
+import time
+import unittest
+from unittest import mock
+from app import create_app, db, passwords
+from app.kvstore import get_store
+from app.exceptions import ServiceBusy
+from models import Role, User
+
+class PasswordHashingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    """Define Tests"""
+
+    def test_configured_method(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        user = User(password='cat', username='abc', email='abc@email.com')
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:1000$'))
+        self.assertTrue(user.verify_password('cat'))
+        self.assertFalse(user.verify_password('dog'))
+
+    # Hashes made with an older method are upgraded by a successful login
+    def test_rehash_on_login(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(user)
+        db.session.commit()
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        response = self.client.post('/auth/login', data={'username': 'abc', 'password': 'cat'})
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        self.assertTrue(User.query.get(user.id).password_hash.startswith('pbkdf2:sha256:2000$'))
+
+    # Methods without explicit arguments match the hashes they produce
+    def test_default_cost_is_current(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256'
+        password_hash = passwords.hash_password('cat')
+        self.assertFalse(passwords.needs_rehash(password_hash))
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        self.assertTrue(passwords.needs_rehash(password_hash))
+
+    # Upgrading the hash on login keeps the user's API tokens valid
+    def test_rehash_keeps_tokens(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(user)
+        db.session.commit()
+        basic = {'Authorization': 'Basic ' + base64.b64encode(b'abc@email.com:cat').decode()}
+        token = self.client.post('/api/v1/tokens/', headers=basic).get_json()['token']
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        response = self.client.post('/auth/login', data={'username': 'abc', 'password': 'cat'})
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        self.assertTrue(User.query.get(user.id).password_hash.startswith('pbkdf2:sha256:2000$'))
+        bearer = {'Authorization': 'Basic ' + base64.b64encode(f'{token}:'.encode()).decode()}
+        self.assertEqual(self.client.get('/api/v1/posts/', headers=bearer).status_code, 200)
+
+    def test_login_slots(self):
+        with passwords.login_slot('10.0.0.1', 'abc'):
+            with self.assertRaises(ServiceBusy):
+                with passwords.login_slot('10.0.0.2', 'ABC'):
+                    pass
+            with passwords.login_slot('10.0.0.1', 'other'):
+                pass
+        with passwords.login_slot('10.0.0.2', 'abc'):
+            pass
+        self.assertEqual(get_store().exists('login:ip:10.0.0.1', 'login:user:abc'), 0)
+
+    # A slot that expired while held is not released below zero
+    def test_expired_login_slot(self):
+        with passwords.login_slot('10.0.0.1', 'abc'):
+            with mock.patch('app.kvstore.time.time', return_value=time.time() + 31):
+                with passwords.login_slot('10.0.0.2', 'abc'):
+                    pass
+        self.assertEqual(get_store().exists('login:ip:10.0.0.1', 'login:user:abc'), 0)
+        with passwords.login_slot('10.0.0.1', 'abc'):
+            with self.assertRaises(ServiceBusy):
+                with passwords.login_slot('10.0.0.2', 'abc'):
+                    pass
@@ -0,0 +1,67 @@
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from models import Role, User, Permission, load_user
+
+class PrincipalCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def load(self):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        db.session.remove()
+        engine = db.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        try:
+            user = load_user(str(self.user_id))
+            permissions = (user.username, user.image, user.confirmed,
+                           user.can(Permission.WRITE), user.is_administrator())
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_execute)
+        return user, permissions, len(statements)
+
+    """Define Tests"""
+
+    def test_cached_load_runs_no_queries(self):
+        _, first, _ = self.load()
+        user, second, count = self.load()
+        self.assertEqual(first, ('abc', 'default.jpg', True, True, False))
+        self.assertEqual(second, first)
+        self.assertEqual(count, 0)
+        # Columns outside the record are still loaded on demand
+        self.assertIsNone(user.bio)
+
+    def test_changes_bump_the_version(self):
+        self.load()
+        user = User.query.get(self.user_id)
+        user.image = 'new.jpg'
+        user.role = Role.query.filter_by(name='Administrator').first()
+        db.session.commit()
+        _, permissions, count = self.load()
+        self.assertEqual(permissions[1], 'new.jpg')
+        self.assertTrue(permissions[4])
+        self.assertEqual(count, 1)
+
+    def test_role_changes_bump_every_principal(self):
+        self.load()
+        role = Role.query.filter_by(name='User').first()
+        role.remove_permission(Permission.WRITE)
+        db.session.commit()
+        _, permissions, _ = self.load()
+        self.assertFalse(permissions[3])
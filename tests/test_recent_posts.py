@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db, recent_posts_index
+from models import Role, User, Post
+
+class RecentPostsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def add_post(self, title, minutes_ago):
+        post = Post(title=title, body_html=title, author=self.user,
+                    timestamp=datetime.utcnow() - timedelta(minutes=minutes_ago))
+        db.session.add(post)
+        db.session.commit()
+        return post
+
+    def count_queries(self, func):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        engine = db.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        try:
+            result = func()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_execute)
+        return result, len(statements)
+
+    """Define Tests"""
+
+    # Reads after seeding do not hit the database
+    def test_seeded_index_needs_no_queries(self):
+        for i in range(7):
+            self.add_post(f'post {i}', minutes_ago=i)
+        recent_posts_index.get()
+        posts, queries = self.count_queries(recent_posts_index.get)
+        self.assertEqual(queries, 0)
+        self.assertEqual([p.title for p in posts], ['post 0', 'post 1', 'post 2', 'post 3', 'post 4'])
+
+    # New, updated and deleted posts are reflected after commit
+    def test_index_follows_commits(self):
+        for i in range(6):
+            self.add_post(f'post {i}', minutes_ago=i + 1)
+        recent_posts_index.get()
+        self.add_post('newest', minutes_ago=0)
+        self.assertEqual(recent_posts_index.get()[0].title, 'newest')
+
+        post = Post.query.filter_by(title='post 0').first()
+        post.title = 'renamed'
+        db.session.commit()
+        self.assertIn('renamed', [p.title for p in recent_posts_index.get()])
+
+        db.session.delete(Post.query.filter_by(title='newest').first())
+        db.session.commit()
+        titles = [p.title for p in recent_posts_index.get()]
+        self.assertEqual(titles, ['renamed', 'post 1', 'post 2', 'post 3', 'post 4'])
+
+    # Rolled back changes never reach the index
+    def test_rollback_is_ignored(self):
+        self.add_post('kept', minutes_ago=1)
+        recent_posts_index.get()
+        db.session.add(Post(title='dropped', body_html='x', author=self.user))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual([p.title for p in recent_posts_index.get()], ['kept'])
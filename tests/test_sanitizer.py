@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+from app import create_app, db, sanitizer
+from models import Role, User, Post
+
+class SanitizerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    """Define Tests"""
+
+    def test_same_content_is_cleaned_once(self):
+        with mock.patch('app.sanitizer.clean', wraps=sanitizer.clean) as clean:
+            first = Post(title='one', body_html='<b>hi</b><script>x</script>', author=self.user)
+            second = Post(title='two', body_html='<b>hi</b><script>x</script>', author=self.user)
+        self.assertEqual(clean.call_count, 1)
+        self.assertEqual(first.body, '<b>hi</b>x')
+        self.assertEqual(second.body, first.body)
+
+    def test_async_mode(self):
+        self.app.config['SANITIZER_ASYNC'] = True
+        post = Post(title='one', body_html='<i>new</i><script>x</script>', author=self.user)
+        db.session.add(post)
+        db.session.commit()
+        self.assertTrue(post.body_pending)
+        self.assertIsNone(post.body)
+        sanitizer.dispatch(post)
+        db.session.expire_all()
+        self.assertFalse(post.body_pending)
+        self.assertEqual(post.body, '<i>new</i>x')
+
+    def test_resanitize_after_policy_change(self):
+        post = Post(title='one', body_html='<b>bold</b> <i>italic</i>', author=self.user)
+        db.session.add(post)
+        db.session.commit()
+        self.app.config['SANITIZER_ALLOWED_TAGS'] = ['b']
+        self.assertEqual(sanitizer.resanitize(processes=1), 1)
+        db.session.expire_all()
+        self.assertEqual(post.body, '<b>bold</b> italic')
+        self.assertEqual(sanitizer.resanitize(processes=1), 0)
+
+    def test_excerpt_is_balanced_and_cut_on_a_word(self):
+        post = Post(title='one', body_html='Some <b>bold words here</b> and more', author=self.user)
+        self.assertEqual(post.excerpt, 'Some <b>bold words here</b> and more')
+        self.assertEqual(sanitizer.make_excerpt(post.body, 12), 'Some <b>bold…</b>')
+
+    def test_blog_cards_do_not_load_bodies(self):
+        db.session.add(Post(title='one', body_html='<b>' + 'word ' * 100 + '</b>', author=self.user))
+        db.session.commit()
+        db.session.expunge_all()
+        post = Post.query.options(*Post.card_options()).first()
+        self.assertNotIn('body', post.__dict__)
+        self.assertNotIn('body_html', post.__dict__)
+        self.assertTrue(post.excerpt.endswith('word…</b>'))
+        response = self.app.test_client().get('/en/blog')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('word word…</b>', response.get_data(as_text=True))
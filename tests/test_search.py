@@ -0,0 +1,58 @@
+import unittest
+from app import create_app, db, search_index
+from models import Role, User, Post
+
+class SearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com')
+        db.session.add(self.user)
+        db.session.add_all([
+            Post(title='Baking bread', body_html='<p>Flour, water and salt</p>', author=self.user),
+            Post(title='Garden notes', body_html='<p>Bread crumbs for the birds</p>', author=self.user),
+            Post(title='Travel', body_html='<p>Trains and boats</p>', author=self.user),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def titles(self, query, **kwargs):
+        return [post.title for post in search_index.search(query, 'en', **kwargs).items]
+
+    """Define Tests"""
+
+    # Title matches rank above body matches
+    def test_ranking(self):
+        self.assertEqual(self.titles('bread'), ['Baking bread', 'Garden notes'])
+        self.assertEqual(self.titles('<p>'), [])
+
+    def test_index_follows_commits(self):
+        post = Post(title='Boats', body_html='<p>Sailing</p>', author=self.user)
+        db.session.add(post)
+        db.session.commit()
+        self.assertEqual(self.titles('sailing'), ['Boats'])
+        post.title = 'Ships'
+        db.session.commit()
+        self.assertEqual(self.titles('ships'), ['Ships'])
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(self.titles('sailing'), [])
+        post = Post(title='Rolled back', body_html='<p>Kayak</p>', author=self.user)
+        db.session.add(post)
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.titles('kayak'), [])
+
+    def test_pages(self):
+        first = search_index.search('bread', 'en', page=1, per_page=1)
+        second = search_index.search('bread', 'en', page=2, per_page=1)
+        self.assertTrue(first.has_next)
+        self.assertFalse(second.has_next)
+        self.assertEqual([post.title for post in second.items], ['Garden notes'])
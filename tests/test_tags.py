@@ -0,0 +1,99 @@
+import base64
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, tags
+from app.counters import reconcile
+from models import Role, User, Post, Tag
+
+class TagsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(password='cat', username='abc', email='abc@email.com', confirmed=True)
+        db.session.add(self.user)
+        # Post i is tagged a when i is even, b when divisible by 3, c when divisible by 5
+        start = datetime.utcnow() - timedelta(days=1)
+        self.posts = []
+        for i in range(60):
+            post = Post(title=f'post {i}', body_html='body', author=self.user,
+                        timestamp=start + timedelta(minutes=i // 2))
+            tags.set_tags(post, [name for name, step in (('a', 2), ('b', 3), ('c', 5)) if i % step == 0])
+            self.posts.append(post)
+        db.session.add_all(self.posts)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def headers(self):
+        return {'Authorization': 'Basic ' + base64.b64encode(b'abc@email.com:cat').decode()}
+
+    # Ids of every page of the posts carrying all of names, walked forwards
+    # then backwards
+    def walk(self, names, per_page):
+        found = tags.lookup('+'.join(names))
+        pages = [tags.page(found, per_page)]
+        while pages[-1].has_next:
+            pages.append(tags.page(found, per_page, after=pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_prev:
+            backwards.append(tags.page(found, per_page, before=backwards[-1].prev_cursor))
+        ids = [[post.id for post in page.items] for page in pages]
+        self.assertEqual([[post.id for post in page.items] for page in reversed(backwards)], ids)
+        return [id for page in ids for id in page]
+
+    def expected(self, *steps):
+        posts = [(post.timestamp, post.id) for i, post in enumerate(self.posts)
+                 if all(i % step == 0 for step in steps)]
+        return [id for _, id in sorted(posts, reverse=True)]
+
+    """Define Tests"""
+
+    def test_counts(self):
+        self.assertEqual({tag.name: tag.post_count for tag in Tag.query}, {'a': 30, 'b': 20, 'c': 12})
+        post = self.posts[0]
+        tags.set_tags(post, ['a', 'd'])
+        db.session.commit()
+        self.assertEqual([tag.name for tag in post.tags], ['a', 'd'])
+        db.session.delete(self.posts[2])
+        db.session.commit()
+        self.assertEqual({tag.name: tag.post_count for tag in Tag.query}, {'a': 29, 'b': 19, 'c': 11, 'd': 1})
+        self.assertFalse(any(reconcile().values()))
+
+    def test_pages(self):
+        self.assertEqual(self.walk(['a'], 7), self.expected(2))
+        # Small batches make the intersection seek past runs of unshared keys
+        self.app.config['TAG_SCAN_BATCH_SIZE'] = 3
+        self.assertEqual(self.walk(['a', 'b'], 4), self.expected(2, 3))
+        self.assertEqual(self.walk(['c', 'b', 'a'], 1), self.expected(2, 3, 5))
+        # Larger tags looked up rather than walked
+        self.app.config['TAG_MERGE_RATIO'] = 1
+        self.assertEqual(self.walk(['c', 'b', 'a'], 1), self.expected(2, 3, 5))
+        self.assertEqual(self.walk(['a', 'c'], 2), self.expected(2, 5))
+        self.assertIsNone(tags.lookup('a+missing'))
+
+    def test_api(self):
+        response = self.client.get('/api/v1/tags/b+a/posts/?fields=id,tags', headers=self.headers())
+        data = response.get_json()
+        self.assertEqual([post['id'] for post in data['posts']], self.expected(2, 3)[:9])
+        self.assertEqual(data['posts'][0]['tags'], ['a', 'b'])
+        self.assertEqual(self.client.get(data['next'], headers=self.headers()).get_json()['posts'][0]['id'],
+                         self.expected(2, 3)[9])
+        response = self.client.post('/api/v1/posts/', json={'title': 't', 'body': 'b', 'tags': ['New Tag', 'a']},
+                                    headers=self.headers())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Tag.query.filter_by(name='new-tag').one().post_count, 1)
+        response = self.client.get('/api/v1/tags/', headers=self.headers())
+        self.assertEqual([tag['name'] for tag in response.get_json()['tags']], ['a', 'b', 'c', 'new-tag'])
+
+    def test_tag_page(self):
+        response = self.client.get('/en/tags/a+c')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('post 50', response.get_data(as_text=True))
+        self.assertEqual(self.client.get('/en/tags/missing').status_code, 404)
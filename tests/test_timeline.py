@@ -0,0 +1,113 @@
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from app import create_app, db, timeline
+from app.kvstore import get_store
+from models import Role, User, Post
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.reader = User(password='cat', username='reader', email='reader@email.com')
+        self.writer = User(password='cat', username='writer', email='writer@email.com')
+        self.star = User(password='cat', username='star', email='star@email.com')
+        self.stranger = User(password='cat', username='stranger', email='stranger@email.com')
+        db.session.add_all([self.reader, self.writer, self.star, self.stranger])
+        db.session.commit()
+        self.reader.follow(self.writer)
+        self.reader.follow(self.star)
+        db.session.commit()
+        self.now = datetime.utcnow()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    def publish(self, author, title, minutes_ago):
+        post = Post(title=title, body_html=title, author=author,
+                    timestamp=self.now - timedelta(minutes=minutes_ago))
+        db.session.add(post)
+        db.session.commit()
+        timeline.fanout_post.delay(post.id)
+        return post
+
+    def titles(self, pagination):
+        return [post.title for post in pagination.items]
+
+    """Define Tests"""
+
+    def test_fanout_reaches_followers_only(self):
+        timeline.ensure_built(self.reader.id)
+        timeline.ensure_built(self.stranger.id)
+        self.publish(self.writer, 'hello', minutes_ago=1)
+        self.assertEqual(self.titles(timeline.page(self.reader, per_page=5)), ['hello'])
+        self.assertEqual(self.titles(timeline.page(self.stranger, per_page=5)), [])
+
+    # Authors above the fan-out limit are merged in at read time
+    def test_high_follower_authors_are_pulled(self):
+        self.app.config['TIMELINE_FANOUT_LIMIT'] = 1
+        self.publish(self.writer, 'pushed', minutes_ago=2)
+        self.publish(self.star, 'pulled', minutes_ago=1)
+        self.assertEqual(self.titles(timeline.page(self.reader, per_page=5)), ['pulled', 'pushed'])
+
+    def test_keyset_pages(self):
+        for i in range(5):
+            self.publish(self.writer if i % 2 else self.star, f'post {i}', minutes_ago=i)
+        first = timeline.page(self.reader, per_page=2)
+        second = timeline.page(self.reader, per_page=2, after=first.next_cursor)
+        third = timeline.page(self.reader, per_page=2, after=second.next_cursor)
+        self.assertEqual(self.titles(first) + self.titles(second) + self.titles(third),
+                         ['post 0', 'post 1', 'post 2', 'post 3', 'post 4'])
+        self.assertFalse(third.has_next)
+        back = timeline.page(self.reader, per_page=2, before=second.prev_cursor)
+        self.assertEqual(self.titles(back), ['post 0', 'post 1'])
+
+    def test_deleted_posts_are_skipped(self):
+        post = self.publish(self.writer, 'gone', minutes_ago=1)
+        timeline.page(self.reader, per_page=5)
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(self.titles(timeline.page(self.reader, per_page=5)), [])
+
+    def test_rebuild_after_follow(self):
+        self.publish(self.stranger, 'late', minutes_ago=1)
+        timeline.page(self.reader, per_page=5)
+        self.reader.follow(self.stranger)
+        db.session.commit()
+        timeline.invalidate(self.reader.id)
+        self.assertEqual(self.titles(timeline.page(self.reader, per_page=5)), ['late'])
+
+    # Past the posts kept in a trimmed timeline, pages come from the database
+    def test_pages_past_the_trimmed_window(self):
+        self.app.config['TIMELINE_MAX_LENGTH'] = 3
+        timeline.ensure_built(self.reader.id)
+        for i in range(7):
+            self.publish(self.writer, f'post {i}', minutes_ago=i)
+        pages = [timeline.page(self.reader, per_page=2)]
+        while pages[-1].has_next:
+            pages.append(timeline.page(self.reader, per_page=2, after=pages[-1].next_cursor))
+        self.assertEqual([title for page in pages for title in self.titles(page)], [f'post {i}' for i in range(7)])
+        back = [pages[-1]]
+        while back[-1].has_prev:
+            back.append(timeline.page(self.reader, per_page=2, before=back[-1].prev_cursor))
+        self.assertEqual([self.titles(page) for page in reversed(back)], [self.titles(page) for page in pages])
+
+    # Built timelines expire; unbuilt ones are not pushed to
+    def test_timelines_expire(self):
+        self.app.config['TIMELINE_TTL'] = 60
+        self.publish(self.writer, 'old', minutes_ago=2)
+        timeline.ensure_built(self.reader.id)
+        store = get_store()
+        keys = [timeline.timeline_key(self.reader.id), timeline.built_key(self.reader.id)]
+        self.assertEqual(store.exists(*keys), 2)
+        with mock.patch('app.kvstore.time.time', return_value=time.time() + 61):
+            self.assertEqual(store.exists(*keys), 0)
+            self.publish(self.writer, 'new', minutes_ago=1)
+            self.assertEqual(store.exists(*keys), 0)
+            self.assertEqual(self.titles(timeline.page(self.reader, per_page=5)), ['new', 'old'])
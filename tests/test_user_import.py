@@ -0,0 +1,76 @@
+import io
+import json
+import unittest
+from unittest import mock
+from sqlalchemy.exc import DataError
+from app import create_app, db
+from app import user_import
+from app.user_import import UserImporter, read_rows
+from models import Role, User
+
+class UserImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        db.session.add(User(password='cat', username='taken', email='taken@email.com'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    """Define Tests"""
+
+    def test_import_jsonl(self):
+        rows = [{'username': f'user{i}', 'email': f'user{i}@email.com', 'password': 'cat'} for i in range(5)]
+        rows += [{'username': 'taken', 'email': 'new@email.com', 'password': 'cat'},
+                 {'username': 'other', 'email': 'USER1@email.com', 'password': 'cat'},
+                 {'username': 'admin', 'email': 'admin@email.com', 'password': 'cat', 'role': 'Administrator'}]
+        stream = io.StringIO('\n'.join(json.dumps(row) for row in rows) + '\n{oops\n')
+        result = UserImporter(chunk_size=3, processes=1).run(read_rows(stream, 'jsonl'))
+        self.assertEqual(result.imported, 6)
+        self.assertEqual([error.line for error in result.errors], [6, 7, 9])
+        user = User.query.filter_by(username='user3').first()
+        self.assertTrue(user.verify_password('cat'))
+        self.assertTrue(user.is_following(user))
+        self.assertEqual((user.follower_count, user.following_count), (1, 1))
+        self.assertIsNotNone(user.updated_at)
+        self.assertTrue(User.query.filter_by(username='admin').first().is_administrator())
+
+    def test_import_csv(self):
+        stream = io.StringIO('username,email,password,first_name\nann,ann@email.com,cat,Ann\n')
+        result = UserImporter(processes=1).run(read_rows(stream, 'csv'))
+        self.assertEqual((result.imported, result.errors), (1, []))
+        self.assertEqual(User.query.filter_by(username='ann').first().first_name, 'Ann')
+
+    # Values of the wrong type or too long for their column are reported per row
+    def test_invalid_values(self):
+        rows = [{'username': 'ann', 'email': 'ann@email.com', 'password': 'cat'},
+                {'username': 123, 'email': 'bob@email.com', 'password': 'cat'},
+                {'username': 'cid', 'email': 'cid@email.com', 'password': ['cat']},
+                {'username': 'dee', 'email': 'dee@email.com', 'password': 'cat', 'mobile_no': '1' * 21}]
+        stream = io.StringIO('\n'.join(json.dumps(row) for row in rows))
+        result = UserImporter(processes=1).run(read_rows(stream, 'jsonl'))
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(result.errors, [(2, 'username must be a string'), (3, 'password must be a string'),
+                                         (4, 'mobile_no is longer than 20 characters')])
+
+    # Rows the database refuses are isolated instead of aborting the import
+    def test_data_error(self):
+        copy_rows = user_import.copy_rows
+        def refuse(connection, table, rows):
+            if any(row.get('username') == 'bad' for row in rows):
+                raise DataError('COPY users', None, Exception('value out of range'))
+            copy_rows(connection, table, rows)
+        stream = io.StringIO('username,email,password\nann,ann@email.com,cat\nbad,bad@email.com,cat\n'
+                             'bob,bob@email.com,cat\n')
+        with mock.patch('app.user_import.copy_rows', side_effect=refuse):
+            result = UserImporter(processes=1).run(read_rows(stream, 'csv'))
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.errors, [(3, 'invalid value: value out of range')])
+        self.assertIsNone(User.query.filter_by(username='bad').first())
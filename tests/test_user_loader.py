@@ -0,0 +1,72 @@
+import unittest
+from flask import g
+from sqlalchemy import event
+from app import create_app, db
+from app.user_loader import user_loader
+from models import Role, User, Post, Comment
+
+class UserLoaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['PAGE_CACHE_ENABLED'] = False
+        self.app.app_context = self.app.app_context()
+        self.app.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.users = [User(password='cat', username=f'user{i}', email=f'user{i}@email.com', confirmed=True)
+                      for i in range(4)]
+        self.posts = [Post(title=f'post {i}', body_html='body', author=self.users[i % 4]) for i in range(8)]
+        self.comments = [Comment(body=f'comment {i}', post=self.posts[0], author=self.users[i % 4])
+                         for i in range(8)]
+        db.session.add_all(self.users + self.posts + self.comments)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app.app_context.pop()
+
+    # Statements reading users while function runs, starting from an empty
+    # session and loader
+    def user_queries(self, function):
+        db.session.expunge_all()
+        g.pop('user_loader', None)
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM users' in statement:
+                statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_execute)
+        try:
+            function()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_execute)
+        return len(statements)
+
+    """Define Tests"""
+
+    def test_pages(self):
+        def get(url):
+            return lambda: self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.user_queries(get('/en/blog')), 1)
+        # The page's user, then the authors of its posts
+        self.assertLessEqual(self.user_queries(get('/en/user_posts/user1')), 2)
+
+    def test_to_json(self):
+        with self.app.test_request_context():
+            posts = Post.query.all()
+            comments = Comment.query.all()
+            def serialize():
+                user_loader().prime(item.author_id for item in posts + comments)
+                [post.to_json() for post in posts]
+                [comment.to_json() for comment in comments]
+            self.assertEqual(self.user_queries(serialize), 1)
+
+    def test_missing_author(self):
+        with self.app.test_request_context():
+            post = Post(title='orphan', body_html='body')
+            comment = Comment(body='orphan', post=self.posts[0], author_id=999)
+            db.session.add_all([post, comment])
+            db.session.commit()
+            self.assertIsNone(post.to_json()['author'])
+            self.assertIsNone(comment.to_json()['author'])